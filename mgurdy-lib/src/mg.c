@@ -13,6 +13,10 @@
 #include "output.h"
 #include "output_fluid.h"
 #include "output_midi.h"
+#include "output_null.h"
+#include "replay.h"
+#include "sensors.h"
+#include "simulate.h"
 
 
 static struct mg_core mg_core;
@@ -135,6 +139,8 @@ int mg_initialize()
 
     mg_state_init(&mg_core.state);
 
+    mg_core.worker_interval_us = WORKER_INTERVAL_US;
+
     mg_core.initialized = 1;
 
     return 0;
@@ -336,6 +342,54 @@ exit:
     return ret;
 }
 
+/* Send a list of commands to the synth while holding the core lock, so that
+ * they can't be interleaved with the synth writes of the worker. All commands
+ * are sent, even if some of them fail. Returns 0 on success, otherwise the
+ * 1-based index of the first failed command or -1 if the lock couldn't be
+ * acquired. */
+int mg_synth_send(fluid_synth_t *fluid, const struct mg_synth_cmd *cmds, int count)
+{
+    int i;
+    int ret;
+    int failed = 0;
+    const struct mg_synth_cmd *cmd;
+
+    if (mg_core_lock()) {
+        return -1;
+    }
+
+    for (i = 0; i < count; i++) {
+        cmd = &cmds[i];
+
+        switch (cmd->type) {
+            case MG_SYNTH_CC:
+                ret = fluid_synth_cc(fluid, cmd->channel, cmd->data1, cmd->data2);
+                break;
+            case MG_SYNTH_PITCH_WHEEL_SENS:
+                ret = fluid_synth_pitch_wheel_sens(fluid, cmd->channel, cmd->data1);
+                break;
+            case MG_SYNTH_PROGRAM_SELECT:
+                ret = fluid_synth_program_select(fluid, cmd->channel, cmd->data1,
+                        cmd->data2 / 128, cmd->data2 % 128);
+                break;
+            case MG_SYNTH_UNSET_PROGRAM:
+                ret = fluid_synth_unset_program(fluid, cmd->channel);
+                break;
+            default:
+                fprintf(stderr, "Invalid synth command: %d\n", cmd->type);
+                ret = FLUID_FAILED;
+        }
+
+        if (ret != FLUID_OK && !failed) {
+            failed = i + 1;
+        }
+    }
+
+    mg_core_unlock();
+
+    return failed;
+}
+
 int mg_add_midi_output(const char *device)
 {
     int ret;
@@ -514,6 +568,40 @@ int mg_halt_outputs(int halted)
 }
 
 
+/* Apply the string configs and switch all outputs that support channel banks
+ * to the given bank in a single step, so that the worker never sees the new
+ * string settings on the old channels or vice versa. configs may be NULL. */
+int mg_switch_channel_bank(int bank, struct mg_string_config *configs)
+{
+    int i;
+    int err;
+    struct mg_output *output;
+
+    err = mg_core_lock();
+    if (err) {
+        return err;
+    }
+
+    if (configs != NULL) {
+        err = mg_set_string(configs);
+        if (err) {
+            goto exit;
+        }
+    }
+
+    for (i = 0; i < mg_core.output_count; i++) {
+        output = mg_core.outputs[i];
+        if (output->channel_banks > 1) {
+            mg_output_set_channel_bank(output, bank);
+        }
+    }
+
+exit:
+    mg_core_unlock();
+    return err;
+}
+
+
 int mg_get_mapping(struct mg_map *dst, int idx)
 {
     struct mg_map *src = mg_state_get_mapping(&mg_core.state, idx);
@@ -558,6 +646,58 @@ int mg_reset_mapping_ranges(int idx)
     return mg_set_mapping(src, idx);
 }
 
+
+/**
+ * Copy the first count mappings, indexed by enum mg_map_enum, into dst
+ * while holding the state lock.
+ */
+int mg_get_mappings(struct mg_map *dst, int count)
+{
+    int i;
+    struct mg_map *src;
+
+    if (count < 0 || count > MG_MAP_COUNT)
+        return -1;
+
+    if (mg_state_lock(&mg_core.state))
+        return -1;
+
+    for (i = 0; i < count; i++) {
+        src = mg_state_get_mapping(&mg_core.state, i);
+        dst[i].count = src->count;
+        memcpy(dst[i].ranges, src->ranges, sizeof(src->ranges));
+    }
+
+    return mg_state_unlock(&mg_core.state);
+}
+
+
+/**
+ * Set the first count mappings, indexed by enum mg_map_enum, in a single
+ * state lock. Mappings with a count of 0 are left unchanged.
+ */
+int mg_set_mappings(const struct mg_map *src, int count)
+{
+    int i;
+    struct mg_map *dst;
+
+    if (count < 0 || count > MG_MAP_COUNT)
+        return -1;
+
+    if (mg_state_lock(&mg_core.state))
+        return -1;
+
+    for (i = 0; i < count; i++) {
+        if (src[i].count < 1)
+            continue;
+        dst = mg_state_get_mapping(&mg_core.state, i);
+        dst->count = MIN(src[i].count, MG_MAP_MAX_RANGES);
+        memcpy(dst->ranges, src[i].ranges, sizeof(src[i].ranges));
+    }
+
+    return mg_state_unlock(&mg_core.state);
+}
+
 int mg_calibrate_set_key(int key, float pressure_adjust, float velocity_adjust)
 {
     struct mg_key_calib *key_calib;
@@ -590,6 +730,363 @@ int mg_calibrate_get_key(int key, float *pressure_adjust, float *velocity_adjust
     return 0;
 }
 
+
+/**
+ * Copy the calibration of the first count keys into data, as pairs of
+ * pressure and velocity adjust values.
+ */
+int mg_calibrate_get_keys(float *data, int count)
+{
+    int i;
+    struct mg_key_calib *key_calib;
+
+    if (count < 0 || count > KEY_COUNT)
+        return -1;
+
+    if (mg_state_lock(&mg_core.state))
+        return -1;
+
+    for (i = 0; i < count; i++) {
+        key_calib = &mg_core.state.key_calib[i];
+        data[i * 2] = key_calib->pressure_adjust;
+        data[i * 2 + 1] = key_calib->velocity_adjust;
+    }
+
+    return mg_state_unlock(&mg_core.state);
+}
+
+
+/**
+ * Set the calibration of the first count keys from pairs of pressure and
+ * velocity adjust values in a single state lock.
+ */
+int mg_calibrate_set_keys(const float *data, int count)
+{
+    int i;
+    struct mg_key_calib *key_calib;
+
+    if (count < 0 || count > KEY_COUNT)
+        return -1;
+
+    if (mg_state_lock(&mg_core.state))
+        return -1;
+
+    for (i = 0; i < count; i++) {
+        key_calib = &mg_core.state.key_calib[i];
+        key_calib->pressure_adjust = data[i * 2];
+        key_calib->velocity_adjust = data[i * 2 + 1];
+    }
+
+    return mg_state_unlock(&mg_core.state);
+}
+
+
+/**
+ * Copy the worker loop timing statistics to dst. The worker updates them
+ * without locking, so the copy is retried while the sequence number shows
+ * that the worker changed them in between, see struct mg_worker_stats.
+ *
+ * Returns 0 on success, -1 if no consistent copy could be made.
+ */
+int mg_read_worker_stats(struct mg_worker_stats *dst)
+{
+    int i;
+    unsigned int seq;
+    struct mg_worker_stats *stats = &mg_core.worker_stats;
+
+    for (i = 0; i < 100; i++) {
+        seq = stats->seq;
+        __sync_synchronize();
+        if (seq & 1) {
+            continue;
+        }
+        memcpy(dst, stats, sizeof(struct mg_worker_stats));
+        __sync_synchronize();
+        if (stats->seq == seq) {
+            return 0;
+        }
+    }
+    return -1;
+}
+
+
+/**
+ * Clear the worker loop timing statistics. Takes effect with the next tick
+ * of the worker.
+ */
+void mg_reset_worker_stats(void)
+{
+    mg_core.worker_stats.reset_requested = 1;
+}
+
+
+
+/**
+ * Start recording the raw key and wheel events read by the worker, into a
+ * buffer for up to max_events events. Events beyond that are dropped.
+ */
+int mg_record_start(int max_events)
+{
+    int err;
+    struct mg_recorder *recorder;
+
+    recorder = mg_recorder_new(max_events);
+    if (recorder == NULL) {
+        return -1;
+    }
+
+    err = mg_core_lock();
+    if (err) {
+        mg_recorder_delete(recorder);
+        return err;
+    }
+
+    if (mg_core.recorder != NULL) {
+        fprintf(stderr, "Sensor recording already running\n");
+        mg_recorder_delete(recorder);
+        err = -1;
+        goto exit;
+    }
+
+    mg_core.recorder = recorder;
+
+exit:
+    mg_core_unlock();
+    return err;
+}
+
+
+/**
+ * Stop recording and write the recorded events to the file, unless filename
+ * is NULL. Returns the number of recorded events or -1 on error.
+ */
+int mg_record_stop(const char *filename)
+{
+    int ret;
+    struct mg_recorder *recorder;
+
+    ret = mg_core_lock();
+    if (ret) {
+        return ret;
+    }
+    recorder = mg_core.recorder;
+    mg_core.recorder = NULL;
+    mg_core_unlock();
+
+    if (recorder == NULL) {
+        fprintf(stderr, "No sensor recording running\n");
+        return -1;
+    }
+
+    if (recorder->dropped) {
+        fprintf(stderr, "Sensor recording buffer full, %d events dropped\n",
+                recorder->dropped);
+    }
+
+    ret = recorder->count;
+
+    /* no need to hold the core lock while writing the detached recording */
+    if (filename != NULL && mg_recording_write(filename, recorder->events, recorder->count)) {
+        ret = -1;
+    }
+
+    mg_recorder_delete(recorder);
+
+    return ret;
+}
+
+
+/**
+ * Replay a sensor recording instead of reading the input devices. Speed is
+ * in percent of realtime, up to REPLAY_MAX_SPEED. If null_output is set, the modelling output goes
+ * to an output that only counts the messages, instead of the outputs of the
+ * core.
+ *
+ * Keys, wheel and outputs are reset before the replay starts, so that a
+ * recording always produces the same output.
+ */
+int mg_replay_start(const char *filename, int speed, int null_output)
+{
+    int err;
+    int count;
+    struct mg_sensor_event *events;
+    struct mg_replay *replay;
+
+    if (speed <= 0) {
+        return -1;
+    }
+    speed = MIN(speed, REPLAY_MAX_SPEED);
+
+    events = mg_recording_read(filename, &count);
+    if (events == NULL) {
+        return -1;
+    }
+
+    replay = mg_replay_new(events, count, speed);
+    if (replay == NULL) {
+        free(events);
+        return -1;
+    }
+
+    if (null_output) {
+        replay->output = new_null_output(&mg_core, &replay->counts);
+        if (replay->output == NULL) {
+            mg_replay_delete(replay);
+            return -1;
+        }
+    }
+
+    err = mg_core_lock();
+    if (err) {
+        mg_replay_delete(replay);
+        return err;
+    }
+
+    if (mg_core.replay != NULL) {
+        fprintf(stderr, "Sensor replay already running\n");
+        mg_replay_delete(replay);
+        err = -1;
+        goto exit;
+    }
+
+    mg_sensors_reset(&mg_core);
+    mg_output_all_reset(&mg_core);
+
+    mg_core.replay = replay;
+    mg_core.worker_interval_us = WORKER_INTERVAL_US * 100 / speed;
+
+exit:
+    mg_core_unlock();
+    return err;
+}
+
+
+/**
+ * Stop the replay and return to reading the input devices
+ */
+int mg_replay_stop(void)
+{
+    int err;
+    struct mg_replay *replay;
+
+    err = mg_core_lock();
+    if (err) {
+        return err;
+    }
+
+    replay = mg_core.replay;
+    mg_core.replay = NULL;
+    mg_core.worker_interval_us = WORKER_INTERVAL_US;
+
+    if (replay != NULL) {
+        mg_sensors_reset(&mg_core);
+        mg_output_all_reset(&mg_core);
+    }
+
+    mg_core_unlock();
+
+    if (replay == NULL) {
+        fprintf(stderr, "No sensor replay running\n");
+        return -1;
+    }
+
+    mg_replay_delete(replay);
+
+    return 0;
+}
+
+
+int mg_replay_get_status(struct mg_replay_status *status)
+{
+    int err;
+    struct mg_replay *replay;
+
+    err = mg_core_lock();
+    if (err) {
+        return err;
+    }
+
+    memset(status, 0, sizeof(struct mg_replay_status));
+
+    replay = mg_core.replay;
+    if (replay != NULL) {
+        status->active = 1;
+        status->done = mg_replay_done(replay);
+        status->speed = replay->speed;
+        status->null_output = replay->output != NULL;
+        status->tick = replay->tick;
+        status->ticks = replay->ticks;
+        status->events = replay->count;
+        status->events_played = replay->pos;
+        status->counts = replay->counts;
+    }
+
+    return mg_core_unlock();
+}
+
+
+
+/**
+ * Run the worker tick as fast as possible for the given number of ticks,
+ * with the sensor events instead of the input devices. Events have to be
+ * ordered by tick. If null_output is set, the modelling output goes to an
+ * output that only counts the messages, instead of the outputs of the core.
+ *
+ * Only possible while the core is not started. Keys, wheel and outputs are
+ * reset before and after the simulation.
+ */
+int mg_simulate(int ticks, const struct mg_sensor_event *events, int count,
+        int null_output, struct mg_sim_result *result)
+{
+    int err;
+    struct mg_output *output = NULL;
+
+    memset(result, 0, sizeof(struct mg_sim_result));
+
+    if (ticks < 0 || count < 0) {
+        return -1;
+    }
+
+    if (null_output) {
+        output = new_null_output(&mg_core, &result->counts);
+        if (output == NULL) {
+            return -1;
+        }
+    }
+
+    err = mg_core_lock();
+    if (err) {
+        mg_output_delete(output);
+        return err;
+    }
+
+    if (mg_core.started) {
+        fprintf(stderr, "Unable to simulate while the core is running\n");
+        err = -1;
+        goto exit;
+    }
+
+    err = mg_state_lock(&mg_core.state);
+    if (err) {
+        goto exit;
+    }
+
+    mg_sensors_reset(&mg_core);
+    mg_output_all_reset(&mg_core);
+
+    err = mg_simulate_run(&mg_core, output, ticks, events, count, result);
+
+    mg_sensors_reset(&mg_core);
+    mg_output_all_reset(&mg_core);
+
+    mg_state_unlock(&mg_core.state);
+
+exit:
+    mg_core_unlock();
+    mg_output_delete(output);
+    return err;
+}
+
 /* End public API */
 
 
@@ -3,6 +3,7 @@
 
 #include <poll.h>
 #include <pthread.h>
+#include <stdint.h>
 #include <sys/prctl.h>
 
 #include <fluidsynth.h>
@@ -11,6 +12,7 @@
 
 
 #define KEY_COUNT (24)
+#define MG_KEY_COUNT KEY_COUNT
 #define NUM_NOTES (128)
 #define MG_MAP_MAX_RANGES (20)
 
@@ -37,6 +39,9 @@
 #define MG_OUTPUT_STREAM_MAX (10)
 #define MG_STREAM_SENDER_MAX (10)
 
+/* Number of channels used by one set of strings on outputs with channel banks */
+#define MG_CHANNEL_BANK_SIZE (10)
+
 
 #define MG_CC_VOLUME (7)
 #define MG_CC_PANNING (8)  // uses balance control
@@ -226,6 +231,139 @@ struct mg_wheel {
 };
 
 
+/* Input device of a recorded sensor event */
+enum mg_sensor_device {
+    MG_SENSOR_KEYS,
+    MG_SENSOR_WHEEL,
+};
+
+/* A raw key or wheel input event, as stored in sensor recordings. The tick is
+ * the number of the worker tick in which the event was read, counted from the
+ * start of the recording. */
+struct mg_sensor_event {
+    uint32_t tick;
+    uint8_t device;
+    uint8_t type;
+    uint16_t code;
+    int32_t value;
+};
+
+/* Records the sensor events read by the worker into a preallocated buffer */
+struct mg_recorder {
+    struct mg_sensor_event *events;
+    int max_events;
+    int count;
+
+    /* events that didn't fit into the buffer */
+    int dropped;
+
+    uint32_t tick;
+};
+
+/* Messages counted by the null output */
+struct mg_output_counts {
+    unsigned int noteon;
+    unsigned int noteoff;
+    unsigned int reset;
+    unsigned int messages;
+};
+
+/* Feeds recorded sensor events to the worker instead of the input devices */
+struct mg_replay {
+    struct mg_sensor_event *events;
+    int count;
+    int pos;
+
+    uint32_t tick;
+    uint32_t ticks;
+
+    /* replay speed in percent of realtime */
+    int speed;
+
+    /* if set, the modelling output is sent to this output instead of the
+     * outputs of the core */
+    struct mg_output *output;
+    struct mg_output_counts counts;
+};
+
+struct mg_replay_status {
+    int active;
+    int done;
+    int speed;
+    int null_output;
+    uint32_t tick;
+    uint32_t ticks;
+    int events;
+    int events_played;
+    struct mg_output_counts counts;
+};
+
+
+/* Result of a simulation run, durations of the tick stages are summed up
+ * over all ticks */
+struct mg_sim_result {
+    int ticks;
+    int events;
+    uint64_t total_ns;
+
+    /* feeding the sensor events */
+    uint64_t sensors_ns;
+
+    /* key debouncing and wheel speed */
+    uint64_t synth_ns;
+
+    /* updating the output models */
+    uint64_t model_ns;
+
+    /* syncing the outputs */
+    uint64_t sync_ns;
+
+    struct mg_output_counts counts;
+};
+
+
+/* Number of buckets of the worker latency histograms. Bucket 0 counts
+ * durations below 1us, bucket n durations from 2^(n-1)us to below 2^n us,
+ * the last bucket all longer durations. */
+#define MG_STATS_HIST_SIZE (16)
+
+/* Duration statistics of one step of the worker loop, all in microseconds */
+struct mg_duration_stats {
+    unsigned long long total;
+    unsigned int max;
+    unsigned int hist[MG_STATS_HIST_SIZE];
+};
+
+/* Timing statistics of the worker loop. Only written by the worker thread,
+ * readers use the sequence number to get a consistent copy: it is odd
+ * while the worker updates the stats and changes with every update. Other
+ * threads read them with mg_read_worker_stats(). */
+struct mg_worker_stats {
+    volatile unsigned int seq;
+
+    /* set by other threads to have the worker clear the stats */
+    volatile int reset_requested;
+
+    unsigned int ticks;
+
+    /* ticks that did not finish before the next tick was due */
+    unsigned int deadline_misses;
+
+    /* delay between the scheduled and actual start of a tick */
+    struct mg_duration_stats wakeup;
+
+    /* time from the start until the end of a tick */
+    struct mg_duration_stats tick;
+
+    /* time spent waiting for the core and state locks */
+    struct mg_duration_stats core_lock;
+    struct mg_duration_stats state_lock;
+
+    /* time spent synchronizing the outputs */
+    struct mg_duration_stats sync;
+};
+
+
 /* Internal structure of the current state and configuration of the core.
  * Gets passed to all threads.
  * */
@@ -267,6 +405,17 @@ struct mg_core {
     /* keyboard sensor data */
     struct mg_keyboard keyboard;
 
+    /* worker loop timing statistics */
+    struct mg_worker_stats worker_stats;
+
+    /* interval of the worker loop, shorter while replaying faster than
+     * realtime */
+    int worker_interval_us;
+
+    /* active sensor recording and replay, if any */
+    struct mg_recorder *recorder;
+    struct mg_replay *replay;
+
     int initialized;
 };
 
@@ -337,6 +486,12 @@ struct mg_output {
     /* Optional callback to close an output and do any cleanup tasks */
     mg_output_close_t *close;
 
+    /* Number of channel banks the output supports and the currently active bank.
+     * Bank n uses the channels n * MG_CHANNEL_BANK_SIZE to
+     * (n + 1) * MG_CHANNEL_BANK_SIZE - 1 */
+    int channel_banks;
+    int channel_bank;
+
     void *data; /* optional output private data */
 };
 
@@ -344,6 +499,10 @@ struct mg_output {
 #define WORKER_PRIO (50)
 #define WORKER_INTERVAL_US (1000)
 
+/* fastest sensor replay in percent of realtime, which keeps the worker
+ * interval at 100us or more */
+#define REPLAY_MAX_SPEED (1000)
+
 #define MIDI_DEBUG 0
 
 #define EMPTY_NOTE_DELAY 50
@@ -409,6 +568,8 @@ enum mg_map_enum {
     MG_MAP_KEYVEL_TO_TANGENT,
     MG_MAP_KEYVEL_TO_KEYNOISE,
     MG_MAP_CHIEN_THRESHOLD_TO_RANGE,
+
+    MG_MAP_COUNT,
 };
 
 enum mg_feature {
@@ -422,12 +583,27 @@ struct mg_string_config {
     int val;
 };
 
+enum mg_synth_cmd_enum {
+    MG_SYNTH_CC,                /* data1: controller, data2: value */
+    MG_SYNTH_PITCH_WHEEL_SENS,  /* data1: semitones */
+    MG_SYNTH_PROGRAM_SELECT,    /* data1: font id, data2: bank * 128 + program */
+    MG_SYNTH_UNSET_PROGRAM,
+};
+
+struct mg_synth_cmd {
+    int channel;
+    int type;
+    int data1;
+    int data2;
+};
+
 extern int mg_initialize();
 
 extern int mg_start(void);
 extern int mg_stop(void);
 
 extern int mg_halt_outputs(int halted);
+extern int mg_switch_channel_bank(int bank, struct mg_string_config *configs);
 
 extern int mg_set_pitchbend_factor(float factor);
 extern int mg_set_key_on_debounce(int num);
@@ -439,8 +615,11 @@ extern int mg_get_wheel_gain(void);
 extern int mg_get_mapping(struct mg_map *dst, int idx);
 extern int mg_set_mapping(const struct mg_map *src, int idx);
 extern int mg_reset_mapping_ranges(int idx);
+extern int mg_get_mappings(struct mg_map *dst, int count);
+extern int mg_set_mappings(const struct mg_map *src, int count);
 
 extern int mg_add_fluid_output(fluid_synth_t *fluid);
+extern int mg_synth_send(fluid_synth_t *fluid, const struct mg_synth_cmd *cmds, int count);
 
 extern int mg_add_midi_output(const char *device);
 extern int mg_config_midi_output(int output_id, int melody_ch, int drone_ch, int trompette_ch, int prog_change, int speed);
@@ -499,6 +678,20 @@ extern void mg_image_get_data(struct mg_image *img, char *buffer);
 
 extern int mg_calibrate_set_key(int key, float pressure_adjust, float velocity_adjust);
 extern int mg_calibrate_get_key(int key, float *pressure_adjust, float *velocity_adjust);
+extern int mg_calibrate_get_keys(float *data, int count);
+extern int mg_calibrate_set_keys(const float *data, int count);
+
+extern int mg_read_worker_stats(struct mg_worker_stats *dst);
+extern void mg_reset_worker_stats(void);
+
+extern int mg_record_start(int max_events);
+extern int mg_record_stop(const char *filename);
+extern int mg_replay_start(const char *filename, int speed, int null_output);
+extern int mg_replay_stop(void);
+extern int mg_replay_get_status(struct mg_replay_status *status);
+
+extern int mg_simulate(int ticks, const struct mg_sensor_event *events, int count,
+        int null_output, struct mg_sim_result *result);
 
 int mg_core_lock(void);
 int mg_core_unlock(void);
@@ -114,6 +114,20 @@ void mg_output_all_sync(struct mg_core *mg)
     }
 }
 
+/* Update and sync a single output that is not in the output list of the
+ * core, like the null output used while replaying sensor recordings. Update
+ * requires the state lock, sync doesn't. */
+void mg_output_update(struct mg_core *mg, struct mg_output *output)
+{
+    output->update(output, &mg->state, &mg->wheel, &mg->keyboard);
+}
+
+void mg_output_tick_sync(struct mg_output *output)
+{
+    mg_output_add_tokens(output);
+    mg_output_sync(output);
+}
+
 void mg_output_all_reset(struct mg_core *mg)
 {
     int i;
@@ -193,6 +207,37 @@ void mg_output_set_channel(struct mg_output *output, struct mg_string *string, i
     mg_output_calc_stream_tokens_per_tick(output);
 }
 
+/* Move all streams of the output to the channels of the given bank. Notes still
+ * playing on the previous channels get a note off, so that they can release
+ * naturally. All stream state is sent to the new channels on the next sync. */
+void mg_output_set_channel_bank(struct mg_output *output, int bank)
+{
+    int i, k;
+    struct mg_stream *stream;
+
+    if (bank < 0 || bank >= output->channel_banks || bank == output->channel_bank) {
+        return;
+    }
+
+    for (i = 0; i < output->stream_count; i++) {
+        stream = output->stream[i];
+        if (stream->channel < 0) {
+            continue;
+        }
+
+        if (output->enabled) {
+            for (k = 0; k < stream->dst.note_count; k++) {
+                output->noteoff(output, stream->channel, stream->dst.active_notes[k]);
+            }
+        }
+        mg_state_reset_output_voice(&stream->dst);
+
+        stream->channel = (stream->channel % MG_CHANNEL_BANK_SIZE) + bank * MG_CHANNEL_BANK_SIZE;
+    }
+
+    output->channel_bank = bank;
+}
+
 /* Private functions */
 
 static int mg_output_sync(struct mg_output *output)
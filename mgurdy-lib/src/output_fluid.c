@@ -37,6 +37,7 @@ struct mg_output *new_fluid_output(struct mg_core *mg, fluid_synth_t *fluid)
     output->noteoff = mg_output_fluid_noteoff;
     output->reset = mg_output_fluid_reset;
     output->tokens_per_tick = 0; /* no rate limiting for internal synth */
+    output->channel_banks = 2; /* allows preparing the next preset on idle channels */
 
     if (!(add_melody_stream(output, &mg->state.melody[0], 0) &&
           add_melody_stream(output, &mg->state.melody[1], 1) &&
@@ -145,7 +146,7 @@ static int mg_output_fluid_noteoff(struct mg_output *output, int channel, int no
 {
     /* Don't send note off events for the keynoise channel. Samples on that channel are never supposed
      * to loop anyway */
-    if (channel != MG_KEYNOISE) {
+    if (channel % MG_CHANNEL_BANK_SIZE != MG_KEYNOISE) {
         fluid_synth_noteoff((fluid_synth_t *)output->data, channel, note);
     }
     return 0;
@@ -0,0 +1,191 @@
+/* An output that runs the same modelling as the FluidSynth output, but only
+ * counts the messages instead of sending them. Used to benchmark the
+ * modelling without a synth. */
+
+#include "output.h"
+#include "output_null.h"
+#include "model_fluid.h"
+
+static int add_stream(struct mg_output *output, struct mg_string *string, int channel,
+        mg_output_send_t *senders[], int sender_count);
+
+static void mg_output_null_update(struct mg_output *output, const struct mg_state *state,
+        const struct mg_wheel *wheel, const struct mg_keyboard *keyboard);
+
+static int mg_output_null_noteon(struct mg_output *output, int channel, int note, int velocity);
+static int mg_output_null_noteoff(struct mg_output *output, int channel, int note);
+static int mg_output_null_reset(struct mg_output *output, int channel);
+
+static int mg_output_null_expression(struct mg_output *output, struct mg_stream *stream);
+static int mg_output_null_volume(struct mg_output *output, struct mg_stream *stream);
+static int mg_output_null_pitch(struct mg_output *output, struct mg_stream *stream);
+static int mg_output_null_channel_pressure(struct mg_output *output, struct mg_stream *stream);
+static int mg_output_null_balance(struct mg_output *output, struct mg_stream *stream);
+
+
+/* the same messages per stream as the FluidSynth output */
+static mg_output_send_t *melody_senders[] = {
+    mg_output_null_expression,
+    mg_output_null_pitch,
+    mg_output_null_channel_pressure,
+    mg_output_null_volume,
+    mg_output_null_balance,
+};
+
+static mg_output_send_t *trompette_senders[] = {
+    mg_output_null_expression,
+    mg_output_null_channel_pressure,
+    mg_output_null_volume,
+    mg_output_null_balance,
+};
+
+static mg_output_send_t *drone_senders[] = {
+    mg_output_null_expression,
+    mg_output_null_volume,
+    mg_output_null_balance,
+};
+
+static mg_output_send_t *keynoise_senders[] = {
+    mg_output_null_volume,
+    mg_output_null_balance,
+    mg_output_null_channel_pressure,
+};
+
+#define SENDERS(s) s, (sizeof(s) / sizeof(s[0]))
+
+
+struct mg_output *new_null_output(struct mg_core *mg, struct mg_output_counts *counts)
+{
+    struct mg_output *output;
+
+    output = mg_output_new();
+    if (output == NULL) {
+        return NULL;
+    }
+
+    output->data = counts;
+    output->update = mg_output_null_update;
+    output->noteon = mg_output_null_noteon;
+    output->noteoff = mg_output_null_noteoff;
+    output->reset = mg_output_null_reset;
+    output->tokens_per_tick = 0;
+    output->channel_banks = 1;
+
+    /* same stream order as the FluidSynth output, the models rely on it */
+    if (!(add_stream(output, &mg->state.melody[0], 0, SENDERS(melody_senders)) &&
+          add_stream(output, &mg->state.melody[1], 1, SENDERS(melody_senders)) &&
+          add_stream(output, &mg->state.melody[2], 2, SENDERS(melody_senders)) &&
+          add_stream(output, &mg->state.trompette[0], 6, SENDERS(trompette_senders)) &&
+          add_stream(output, &mg->state.trompette[1], 7, SENDERS(trompette_senders)) &&
+          add_stream(output, &mg->state.trompette[2], 8, SENDERS(trompette_senders)) &&
+          add_stream(output, &mg->state.drone[0], 3, SENDERS(drone_senders)) &&
+          add_stream(output, &mg->state.drone[1], 4, SENDERS(drone_senders)) &&
+          add_stream(output, &mg->state.drone[2], 5, SENDERS(drone_senders)) &&
+          add_stream(output, &mg->state.keynoise, 9, SENDERS(keynoise_senders))))
+    {
+        mg_output_delete(output);
+        return NULL;
+    }
+
+    output->enabled = 1;
+
+    return output;
+}
+
+
+static int add_stream(struct mg_output *output, struct mg_string *string, int channel,
+        mg_output_send_t *senders[], int sender_count)
+{
+    int i;
+    struct mg_stream *stream = mg_output_stream_new(string, 0, channel);
+    if (stream == NULL) {
+        return 0;
+    }
+
+    for (i = 0; i < sender_count; i++) {
+        stream->sender[stream->sender_count++] = senders[i];
+    }
+
+    output->stream[output->stream_count++] = stream;
+
+    return 1;
+}
+
+static void mg_output_null_update(struct mg_output *output, const struct mg_state *state,
+        const struct mg_wheel *wheel, const struct mg_keyboard *keyboard)
+{
+    model_fluid_update_melody_streams(output, state, wheel, keyboard);
+    model_fluid_update_trompette_streams(output, state, wheel);
+    model_fluid_update_drone_streams(output, state, wheel);
+
+    model_fluid_update_keynoise_stream(output, state, wheel, keyboard);
+}
+
+static int mg_output_null_noteon(struct mg_output *output, int channel, int note, int velocity)
+{
+    (void) channel;
+    (void) note;
+    (void) velocity;
+    ((struct mg_output_counts *)output->data)->noteon++;
+    return 0;
+}
+
+static int mg_output_null_noteoff(struct mg_output *output, int channel, int note)
+{
+    (void) channel;
+    (void) note;
+    ((struct mg_output_counts *)output->data)->noteoff++;
+    return 0;
+}
+
+static int mg_output_null_reset(struct mg_output *output, int channel)
+{
+    (void) channel;
+    ((struct mg_output_counts *)output->data)->reset++;
+    return 0;
+}
+
+static int mg_output_null_expression(struct mg_output *output, struct mg_stream *stream)
+{
+    if (stream->dst.expression != stream->model.expression) {
+        ((struct mg_output_counts *)output->data)->messages++;
+        stream->dst.expression = stream->model.expression;
+    }
+    return 0;
+}
+
+static int mg_output_null_volume(struct mg_output *output, struct mg_stream *stream)
+{
+    if (stream->dst.volume != stream->model.volume) {
+        ((struct mg_output_counts *)output->data)->messages++;
+        stream->dst.volume = stream->model.volume;
+    }
+    return 0;
+}
+
+static int mg_output_null_pitch(struct mg_output *output, struct mg_stream *stream)
+{
+    if (stream->dst.pitch != stream->model.pitch) {
+        ((struct mg_output_counts *)output->data)->messages++;
+        stream->dst.pitch = stream->model.pitch;
+    }
+    return 0;
+}
+
+static int mg_output_null_channel_pressure(struct mg_output *output, struct mg_stream *stream)
+{
+    if (stream->dst.pressure != stream->model.pressure) {
+        ((struct mg_output_counts *)output->data)->messages++;
+        stream->dst.pressure = stream->model.pressure;
+    }
+    return 0;
+}
+
+static int mg_output_null_balance(struct mg_output *output, struct mg_stream *stream)
+{
+    if (stream->dst.panning != stream->model.panning) {
+        ((struct mg_output_counts *)output->data)->messages++;
+        stream->dst.panning = stream->model.panning;
+    }
+    return 0;
+}
@@ -0,0 +1,9 @@
+#ifndef _MG_OUTPUT_NULL_H_
+#define _MG_OUTPUT_NULL_H_
+
+#include "output.h"
+
+
+struct mg_output *new_null_output(struct mg_core *mg, struct mg_output_counts *counts);
+
+#endif
@@ -0,0 +1,208 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "mg.h"
+#include "output.h"
+#include "replay.h"
+#include "sensors.h"
+
+
+/* Allocate a recorder for up to max_events events. The buffer is allocated
+ * up front, so that the worker never allocates memory while recording. */
+struct mg_recorder *mg_recorder_new(int max_events)
+{
+    struct mg_recorder *recorder;
+
+    if (max_events <= 0) {
+        return NULL;
+    }
+
+    recorder = malloc(sizeof(struct mg_recorder));
+    if (recorder == NULL) {
+        fprintf(stderr, "Out of memory!\n");
+        return NULL;
+    }
+    memset(recorder, 0, sizeof(struct mg_recorder));
+
+    recorder->events = malloc(sizeof(struct mg_sensor_event) * max_events);
+    if (recorder->events == NULL) {
+        fprintf(stderr, "Out of memory!\n");
+        free(recorder);
+        return NULL;
+    }
+    recorder->max_events = max_events;
+
+    return recorder;
+}
+
+
+void mg_recorder_delete(struct mg_recorder *recorder)
+{
+    if (recorder == NULL) return;
+
+    free(recorder->events);
+    free(recorder);
+}
+
+
+void mg_recorder_add(struct mg_recorder *recorder, int device, int type, int code, int value)
+{
+    struct mg_sensor_event *ev;
+
+    if (recorder->count >= recorder->max_events) {
+        recorder->dropped++;
+        return;
+    }
+
+    ev = &recorder->events[recorder->count++];
+    ev->tick = recorder->tick;
+    ev->device = device;
+    ev->type = type;
+    ev->code = code;
+    ev->value = value;
+}
+
+
+/* Called by the worker after reading the sensors of a tick */
+void mg_recorder_tick(struct mg_recorder *recorder)
+{
+    recorder->tick++;
+}
+
+
+/* Create a replay of the events, taking ownership of the events buffer.
+ * Speed is in percent of realtime. */
+struct mg_replay *mg_replay_new(struct mg_sensor_event *events, int count, int speed)
+{
+    struct mg_replay *replay;
+
+    replay = malloc(sizeof(struct mg_replay));
+    if (replay == NULL) {
+        fprintf(stderr, "Out of memory!\n");
+        return NULL;
+    }
+    memset(replay, 0, sizeof(struct mg_replay));
+
+    replay->events = events;
+    replay->count = count;
+    replay->ticks = count > 0 ? events[count - 1].tick + 1 : 0;
+    replay->speed = speed;
+
+    return replay;
+}
+
+
+void mg_replay_delete(struct mg_replay *replay)
+{
+    if (replay == NULL) return;
+
+    mg_output_delete(replay->output);
+    free(replay->events);
+    free(replay);
+}
+
+
+/* Feed the recorded events of the current tick to the sensors. Called by the
+ * worker instead of reading the input devices. */
+int mg_replay_read(struct mg_core *mg)
+{
+    struct mg_replay *replay = mg->replay;
+    int start = replay->pos;
+
+    while (replay->pos < replay->count &&
+            replay->events[replay->pos].tick <= replay->tick) {
+        replay->pos++;
+    }
+
+    if (replay->tick < replay->ticks) {
+        replay->tick++;
+    }
+    else {
+        /* nothing left to replay, go back to the normal worker interval */
+        mg->worker_interval_us = WORKER_INTERVAL_US;
+    }
+
+    return mg_sensors_feed(mg, &replay->events[start], replay->pos - start);
+}
+
+
+int mg_replay_done(const struct mg_replay *replay)
+{
+    return replay->tick >= replay->ticks;
+}
+
+
+/* Write the events to a recording file. Returns 0 on success. */
+int mg_recording_write(const char *filename, const struct mg_sensor_event *events, int count)
+{
+    FILE *f;
+    int err = 0;
+    struct mg_recording_header header;
+
+    memcpy(header.magic, MG_RECORDING_MAGIC, sizeof(header.magic));
+    header.version = MG_RECORDING_VERSION;
+    header.count = count;
+
+    f = fopen(filename, "wb");
+    if (f == NULL) {
+        perror("Unable to open recording file");
+        return -1;
+    }
+
+    if (fwrite(&header, sizeof(header), 1, f) != 1 ||
+            (count > 0 && fwrite(events, sizeof(struct mg_sensor_event), count, f) != (size_t) count)) {
+        perror("Unable to write recording file");
+        err = -1;
+    }
+
+    if (fclose(f)) {
+        perror("Unable to close recording file");
+        err = -1;
+    }
+
+    return err;
+}
+
+
+/* Read the events of a recording file into a newly allocated buffer, which
+ * the caller has to free. Returns NULL on error. */
+struct mg_sensor_event *mg_recording_read(const char *filename, int *count)
+{
+    FILE *f;
+    struct mg_recording_header header;
+    struct mg_sensor_event *events = NULL;
+
+    f = fopen(filename, "rb");
+    if (f == NULL) {
+        perror("Unable to open recording file");
+        return NULL;
+    }
+
+    if (fread(&header, sizeof(header), 1, f) != 1 ||
+            memcmp(header.magic, MG_RECORDING_MAGIC, sizeof(header.magic)) ||
+            header.version != MG_RECORDING_VERSION) {
+        fprintf(stderr, "Invalid recording file: %s\n", filename);
+        goto exit;
+    }
+
+    /* always allocate at least one event, so that empty recordings are valid */
+    events = malloc(sizeof(struct mg_sensor_event) * (header.count ? header.count : 1));
+    if (events == NULL) {
+        fprintf(stderr, "Out of memory!\n");
+        goto exit;
+    }
+
+    if (fread(events, sizeof(struct mg_sensor_event), header.count, f) != header.count) {
+        fprintf(stderr, "Truncated recording file: %s\n", filename);
+        free(events);
+        events = NULL;
+        goto exit;
+    }
+
+    *count = header.count;
+
+exit:
+    fclose(f);
+    return events;
+}
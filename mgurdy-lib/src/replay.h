@@ -0,0 +1,30 @@
+#ifndef _MG_REPLAY_H_
+#define _MG_REPLAY_H_
+
+#include "mg.h"
+
+/* Sensor recording files start with this header, followed by the events as
+ * struct mg_sensor_event in native byte order. */
+#define MG_RECORDING_MAGIC "MGSR"
+#define MG_RECORDING_VERSION (1)
+
+struct mg_recording_header {
+    char magic[4];
+    uint32_t version;
+    uint32_t count;
+};
+
+struct mg_recorder *mg_recorder_new(int max_events);
+void mg_recorder_delete(struct mg_recorder *recorder);
+void mg_recorder_add(struct mg_recorder *recorder, int device, int type, int code, int value);
+void mg_recorder_tick(struct mg_recorder *recorder);
+
+struct mg_replay *mg_replay_new(struct mg_sensor_event *events, int count, int speed);
+void mg_replay_delete(struct mg_replay *replay);
+int mg_replay_read(struct mg_core *mg);
+int mg_replay_done(const struct mg_replay *replay);
+
+int mg_recording_write(const char *filename, const struct mg_sensor_event *events, int count);
+struct mg_sensor_event *mg_recording_read(const char *filename, int *count);
+
+#endif
@@ -9,13 +9,36 @@
 #include <errno.h>
 
 #include "mg.h"
+#include "replay.h"
 #include "sensors.h"
 #include "utils.h"
 
 
-static int mg_sensors_read_keys(int fd, struct mg_key keys[],
-        const struct mg_key_calib key_calib[]);
-static int mg_sensors_read_wheel(int fd, struct mg_wheel *wheel);
+#define DIST_UNSET (-99999)
+
+/* Wheel distance and time of the position reading in progress. Only
+ * processed once we get a sync event, which could be delayed until the next
+ * tick.
+ *
+ * TODO: check if this is really possible or if we always get a complete
+ * event set including sync.
+ */
+static int wheel_pending_dist = DIST_UNSET;
+static int wheel_pending_us = 0;
+
+/* wheel readings accumulated over all events read in a single tick */
+struct wheel_readings {
+    int distance;
+    int total_us;
+};
+
+static int mg_sensors_read_keys(struct mg_core *mg, int fd);
+static int mg_sensors_read_wheel(struct mg_core *mg, int fd);
+static int key_event(struct mg_key keys[], const struct mg_key_calib key_calib[],
+        int type, int code, int value);
+static int wheel_event(struct mg_wheel *wheel, struct wheel_readings *readings,
+        int type, int code, int value);
+static void wheel_update(struct mg_wheel *wheel, const struct wheel_readings *readings);
 
 /* Setup the pollfd entries for keyboard and wheel input devices. Caller is
  * responsible for calling mg_sensors_cleanup() in case this function returns
@@ -45,9 +68,17 @@ int mg_sensors_init(struct mg_core *mg)
     mg->sensor_fds[1].events = POLLIN;
     mg->sensor_fd_count++;
 
-    /* initialize the keys to default values */
-    memset(mg->keyboard.keys, 0, sizeof(struct mg_key) * KEY_COUNT);
-    mg->keyboard.inactive_count = 0;
+    mg_sensors_reset(mg);
+
+    return 0;
+}
+
+
+/* Set the keys and the wheel to their initial state */
+void mg_sensors_reset(struct mg_core *mg)
+{
+    /* initialize the keys to default values, no key active */
+    memset(&mg->keyboard, 0, sizeof(struct mg_keyboard));
 
     /* initialize wheel to default values */
     mg->wheel.position = 0;
@@ -57,7 +88,8 @@ int mg_sensors_init(struct mg_core *mg)
     mg->wheel.raw_speed = 0;
     mg->wheel.speed = 0;
 
-    return 0;
+    wheel_pending_dist = DIST_UNSET;
+    wheel_pending_us = 0;
 }
 
 
@@ -82,6 +114,11 @@ int mg_sensors_read(struct mg_core *mg)
     int ret;
     int count = 0;
 
+    /* while replaying, the recorded events replace the input devices */
+    if (mg->replay != NULL) {
+        return mg_replay_read(mg);
+    }
+
     ret = poll(mg->sensor_fds, mg->sensor_fd_count, 0);
     if (ret < 0) {
         perror("Error polling sensor input devices");
@@ -89,7 +126,7 @@ int mg_sensors_read(struct mg_core *mg)
     }
 
     if (mg->sensor_fds[0].revents & POLLIN) {
-        ret = mg_sensors_read_keys(mg->sensor_fds[0].fd, mg->keyboard.keys, mg->state.key_calib);
+        ret = mg_sensors_read_keys(mg, mg->sensor_fds[0].fd);
         if (ret < 0) {
             fprintf(stderr, "Error reading key events!\n");
             return ret;
@@ -98,7 +135,7 @@ int mg_sensors_read(struct mg_core *mg)
     }
 
     if (mg->sensor_fds[1].revents & POLLIN) {
-        ret = mg_sensors_read_wheel(mg->sensor_fds[1].fd, &mg->wheel);
+        ret = mg_sensors_read_wheel(mg, mg->sensor_fds[1].fd);
         if (ret < 0) {
             fprintf(stderr, "Error reading wheel events!\n");
             return ret;
@@ -106,22 +143,49 @@ int mg_sensors_read(struct mg_core *mg)
         count += ret;
     }
 
+    if (mg->recorder != NULL) {
+        mg_recorder_tick(mg->recorder);
+    }
+
     return count;
 }
 
 
+/* Process the key and wheel events of a single tick from a recording or a
+ * simulation, in the same way as events read from the input devices.
+ * Returns the number of key pressure changes and wheel updates. */
+int mg_sensors_feed(struct mg_core *mg, const struct mg_sensor_event *events, int count)
+{
+    int i;
+    int ret = 0;
+    struct wheel_readings readings = {0, 0};
+    const struct mg_sensor_event *ev;
+
+    for (i = 0; i < count; i++) {
+        ev = &events[i];
+        if (ev->device == MG_SENSOR_KEYS) {
+            ret += key_event(mg->keyboard.keys, mg->state.key_calib,
+                    ev->type, ev->code, ev->value);
+        }
+        else if (ev->device == MG_SENSOR_WHEEL) {
+            ret += wheel_event(&mg->wheel, &readings, ev->type, ev->code, ev->value);
+        }
+    }
+
+    wheel_update(&mg->wheel, &readings);
+
+    return ret;
+}
+
+
 /* Read the keyboard sensor input device and return the number of key pressure
  * changes received or a negative value on error.
  */
-static int mg_sensors_read_keys(int fd, struct mg_key keys[],
-        const struct mg_key_calib key_calib[])
+static int mg_sensors_read_keys(struct mg_core *mg, int fd)
 {
     int count = 0;
     int rd, num, i;
     struct input_event ev[10];
-    struct mg_key *key;
-    int val;
-    int idx;
 
     for(;;) {
         rd = read(fd, ev, sizeof(ev));
@@ -138,35 +202,46 @@ static int mg_sensors_read_keys(int fd, struct mg_key keys[],
 
         num = rd / sizeof(struct input_event);
         for (i=0; i < num; i++) {
-            if (ev[i].type != 3 || ev[i].code >= KEY_COUNT)
-                continue;
+            if (mg->recorder != NULL) {
+                mg_recorder_add(mg->recorder, MG_SENSOR_KEYS,
+                        ev[i].type, ev[i].code, ev[i].value);
+            }
+            count += key_event(mg->keyboard.keys, mg->state.key_calib,
+                    ev[i].type, ev[i].code, ev[i].value);
+        }
+    }
 
-            idx = ev[i].code;
+    return count;
+}
 
-            key = &keys[idx];
 
-            val = ev[i].value * key_calib[idx].pressure_adjust;
+/* Apply a single key input event, returns 1 if it changed a key pressure */
+static int key_event(struct mg_key keys[], const struct mg_key_calib key_calib[],
+        int type, int code, int value)
+{
+    struct mg_key *key;
+    int val;
 
-            key->raw_pressure = ev[i].value;
-            key->pressure = val;
-            key->max_pressure = MAX(val, key->max_pressure);
-            key->smoothed_pressure = mg_smooth(val, key->smoothed_pressure, 0.9);
+    if (type != 3 || code < 0 || code >= KEY_COUNT)
+        return 0;
 
-            count++;
-        }
-    }
+    key = &keys[code];
 
-    return count;
-}
+    val = value * key_calib[code].pressure_adjust;
 
+    key->raw_pressure = value;
+    key->pressure = val;
+    key->max_pressure = MAX(val, key->max_pressure);
+    key->smoothed_pressure = mg_smooth(val, key->smoothed_pressure, 0.9);
 
-#define DIST_UNSET (-99999)
+    return 1;
+}
 
 
 /* Read the wheel sensor input device and return the number of position and/or
  * gain value updated received or a negative value on error.
  */
-static int mg_sensors_read_wheel(int fd, struct mg_wheel *wheel)
+static int mg_sensors_read_wheel(struct mg_core *mg, int fd)
 {
     int count = 0;
     int rd, num, i;
@@ -175,18 +250,7 @@ static int mg_sensors_read_wheel(int fd, struct mg_wheel *wheel)
     /* if we get more than one position reading, we accumulate the times so we
      * can calculate the speed accordingly.
      */
-    int total_us = 0;
-    int distance = 0;
-
-    /* need to save the values for next call as we only want to process
-     * those values if we get a sync event (which could be delayed until the
-     * next call to this function)
-     *
-     * TODO: check if this is really possible or if we always get a complete
-     * event set including sync.
-     */
-    static int _dist = DIST_UNSET;
-    static int _us = 0;
+    struct wheel_readings readings = {0, 0};
 
     for(;;) {
         rd = read(fd, ev, sizeof(ev));
@@ -202,54 +266,74 @@ static int mg_sensors_read_wheel(int fd, struct mg_wheel *wheel)
         }
 
         num = rd / sizeof(struct input_event);
-
-        /* The wheel driver returns three event types:
-         *   - position (0 - 16383)
-         *   - distance travelled since last update
-         *   - elapsed time since last position in microseconds
-         *   - virtual gain of sensor chip (diagnostic data)
-         *
-         * Position and time are always sent together and only if
-         * position actually changed.
-         *
-         * Gain can be sent separately, but also only if it has changed
-         */
         for (i=0; i < num; i++) {
-            /* position */
-            if (ev[i].type == 3 && ev[i].code == 0) {
-                wheel->position = (16383 - ev[i].value);
-            }
-            /* distance */
-            else if (ev[i].type == 3 && ev[i].code == 1) {
-                _dist = ev[i].value;
-            }
-            /* time since last reading */
-            else if (ev[i].type == 4 && ev[i].code == 1) {
-                _us = ev[i].value;
-            }
-            /* sync event */
-            else if (ev[i].type == 0 && ev[i].code == 0 &&
-                    ev[i].value == 0) {
-                if (_dist != DIST_UNSET) {
-                    distance += _dist;
-                    total_us += _us;
-                    _us = 0;
-                    _dist = DIST_UNSET;
-                }
-                count++;
-            }
-            /* gain */
-            else if (ev[i].type == 3 && ev[i].code == 2) {
-                wheel->gain = ev[i].value;
-                count++;
+            if (mg->recorder != NULL) {
+                mg_recorder_add(mg->recorder, MG_SENSOR_WHEEL,
+                        ev[i].type, ev[i].code, ev[i].value);
             }
+            count += wheel_event(&mg->wheel, &readings,
+                    ev[i].type, ev[i].code, ev[i].value);
         }
     }
 
-    if (total_us > 0) {
-        wheel->distance = distance;
-        wheel->elapsed_us = total_us;
-   }
+    wheel_update(&mg->wheel, &readings);
 
     return count;
 }
+
+
+/* Apply a single wheel input event. Returns 1 on sync and gain events.
+ *
+ * The wheel driver returns these event types:
+ *   - position (0 - 16383)
+ *   - distance travelled since last update
+ *   - elapsed time since last position in microseconds
+ *   - virtual gain of sensor chip (diagnostic data)
+ *
+ * Position and time are always sent together and only if
+ * position actually changed.
+ *
+ * Gain can be sent separately, but also only if it has changed
+ */
+static int wheel_event(struct mg_wheel *wheel, struct wheel_readings *readings,
+        int type, int code, int value)
+{
+    /* position */
+    if (type == 3 && code == 0) {
+        wheel->position = (16383 - value);
+    }
+    /* distance */
+    else if (type == 3 && code == 1) {
+        wheel_pending_dist = value;
+    }
+    /* time since last reading */
+    else if (type == 4 && code == 1) {
+        wheel_pending_us = value;
+    }
+    /* sync event */
+    else if (type == 0 && code == 0 && value == 0) {
+        if (wheel_pending_dist != DIST_UNSET) {
+            readings->distance += wheel_pending_dist;
+            readings->total_us += wheel_pending_us;
+            wheel_pending_us = 0;
+            wheel_pending_dist = DIST_UNSET;
+        }
+        return 1;
+    }
+    /* gain */
+    else if (type == 3 && code == 2) {
+        wheel->gain = value;
+        return 1;
+    }
+
+    return 0;
+}
+
+
+static void wheel_update(struct mg_wheel *wheel, const struct wheel_readings *readings)
+{
+    if (readings->total_us > 0) {
+        wheel->distance = readings->distance;
+        wheel->elapsed_us = readings->total_us;
+    }
+}
@@ -9,6 +9,9 @@
 int mg_sensors_init(struct mg_core *mg);
 void mg_sensors_cleanup(struct mg_core *mg);
 
+void mg_sensors_reset(struct mg_core *mg);
+
 int mg_sensors_read(struct mg_core *mg);
+int mg_sensors_feed(struct mg_core *mg, const struct mg_sensor_event *events, int count);
 
 #endif
@@ -0,0 +1,85 @@
+/* Runs the sensor, synth and output stages of the worker tick back-to-back,
+ * without sleeping and without input devices, to measure the throughput of
+ * the modelling code on any machine. */
+
+#include <string.h>
+#include <time.h>
+
+#include "mg.h"
+#include "output.h"
+#include "sensors.h"
+#include "simulate.h"
+#include "synth.h"
+
+
+static uint64_t elapsed_ns(const struct timespec *start, const struct timespec *end);
+
+
+/* Run the given number of ticks, feeding the events to the sensors at their
+ * tick. If output is given, it replaces the outputs of the core. The caller
+ * must hold the core and state locks. */
+int mg_simulate_run(struct mg_core *mg, struct mg_output *output, int ticks,
+        const struct mg_sensor_event *events, int count, struct mg_sim_result *result)
+{
+    int tick;
+    int pos = 0;
+    int start;
+    struct timespec t0, t1, t2, t3, t4;
+    struct timespec begin, end;
+
+    clock_gettime(CLOCK_MONOTONIC, &begin);
+
+    for (tick = 0; tick < ticks; tick++) {
+        clock_gettime(CLOCK_MONOTONIC, &t0);
+
+        start = pos;
+        while (pos < count && events[pos].tick <= (uint32_t) tick) {
+            pos++;
+        }
+        mg_sensors_feed(mg, &events[start], pos - start);
+
+        clock_gettime(CLOCK_MONOTONIC, &t1);
+
+        mg_synth_update_sensors(&mg->wheel, &mg->keyboard, &mg->state);
+
+        clock_gettime(CLOCK_MONOTONIC, &t2);
+
+        if (output != NULL) {
+            mg_output_update(mg, output);
+        }
+        else {
+            mg_output_all_update(mg);
+        }
+
+        clock_gettime(CLOCK_MONOTONIC, &t3);
+
+        if (output != NULL) {
+            mg_output_tick_sync(output);
+        }
+        else if (!mg->halt_outputs) {
+            mg_output_all_sync(mg);
+        }
+
+        clock_gettime(CLOCK_MONOTONIC, &t4);
+
+        result->sensors_ns += elapsed_ns(&t0, &t1);
+        result->synth_ns += elapsed_ns(&t1, &t2);
+        result->model_ns += elapsed_ns(&t2, &t3);
+        result->sync_ns += elapsed_ns(&t3, &t4);
+    }
+
+    clock_gettime(CLOCK_MONOTONIC, &end);
+
+    result->ticks = ticks;
+    result->events = pos;
+    result->total_ns = elapsed_ns(&begin, &end);
+
+    return 0;
+}
+
+
+static uint64_t elapsed_ns(const struct timespec *start, const struct timespec *end)
+{
+    return (uint64_t) (end->tv_sec - start->tv_sec) * 1000000000ULL +
+        end->tv_nsec - start->tv_nsec;
+}
@@ -0,0 +1,9 @@
+#ifndef _MG_SIMULATE_H_
+#define _MG_SIMULATE_H_
+
+#include "mg.h"
+
+int mg_simulate_run(struct mg_core *mg, struct mg_output *output, int ticks,
+        const struct mg_sensor_event *events, int count, struct mg_sim_result *result);
+
+#endif
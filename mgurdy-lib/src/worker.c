@@ -16,7 +16,17 @@
 
 #define MAX_SAFE_STACK (8*1024)
 
-static int mg_worker_run(struct mg_core *mg);
+/* durations in microseconds measured during a single tick */
+struct mg_tick_times {
+    int core_lock;
+    int state_lock;
+    int sync;
+};
+
+static int mg_worker_run(struct mg_core *mg, struct mg_tick_times *times);
+static void mg_worker_record_stats(struct mg_worker_stats *stats, int interval,
+        int wakeup, int tick, const struct mg_tick_times *times);
+static void duration_stats_add(struct mg_duration_stats *stats, int us);
 
 static void stack_prefault(void);
 static void position_to_websockets(void);
@@ -44,6 +54,10 @@ void *mg_worker_thread(void *args)
 {
     struct sched_param param;
     struct timespec t;
+    struct timespec now;
+    struct timespec end;
+    struct mg_tick_times times;
+    int wakeup;
     struct mg_core *mg = args;
 
     prctl(PR_SET_NAME, "mgcore-worker\0", NULL, NULL, NULL);
@@ -67,21 +81,26 @@ void *mg_worker_thread(void *args)
     }
 
     clock_gettime(CLOCK_MONOTONIC, &t);
-    mg_timespec_add_us(&t, WORKER_INTERVAL_US);
+    mg_timespec_add_us(&t, mg->worker_interval_us);
 
     while(!mg->should_stop) {
         if (clock_nanosleep(CLOCK_MONOTONIC, TIMER_ABSTIME, &t, NULL)) {
             perror("Error while sleeping in worker thread");
             goto cleanup;
         }
-        clock_gettime(CLOCK_MONOTONIC, &t);
-        mg_timespec_add_us(&t, WORKER_INTERVAL_US);
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        wakeup = duration_us(t, now);
+        t = now;
+        mg_timespec_add_us(&t, mg->worker_interval_us);
 
         if (mg->started) {
-            if (mg_worker_run(mg)) {
+            if (mg_worker_run(mg, &times)) {
                 fprintf(stderr, "Fatal error, terminating worker\n");
                 goto cleanup;
             }
+            clock_gettime(CLOCK_MONOTONIC, &end);
+            mg_worker_record_stats(&mg->worker_stats, mg->worker_interval_us,
+                    wakeup, duration_us(now, end), &times);
         }
     }
 
@@ -91,20 +110,29 @@ cleanup:
     return NULL;
 }
 
-static int mg_worker_run(struct mg_core *mg)
+static int mg_worker_run(struct mg_core *mg, struct mg_tick_times *times)
 {
     int ret;
     int err;
+    struct timespec t0;
+    struct timespec t1;
+    struct mg_output *replay_output;
 
     struct mg_state *state = &mg->state;
     struct mg_wheel *wheel = &mg->wheel;
     struct mg_keyboard *keyboard = &mg->keyboard;
 
+    /* phases skipped by a failed tick are recorded as zero */
+    memset(times, 0, sizeof(struct mg_tick_times));
+
     /* grab the core lock while we are working */
+    clock_gettime(CLOCK_MONOTONIC, &t0);
     err = mg_core_lock();
     if (err) {
         return err;
     }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    times->core_lock = duration_us(t0, t1);
 
     /* read any pending sensor values */
     ret = mg_sensors_read(mg);
@@ -114,14 +142,24 @@ static int mg_worker_run(struct mg_core *mg)
     }
 
     /* grab the state lock to update the output models */
+    clock_gettime(CLOCK_MONOTONIC, &t0);
     err = mg_state_lock(state);
     if (err) {
         goto exit;
     }
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    times->state_lock = duration_us(t0, t1);
 
     mg_synth_update_sensors(wheel, keyboard, state);
 
-    mg_output_all_update(mg);
+    /* a replay with null output replaces all outputs */
+    replay_output = mg->replay != NULL ? mg->replay->output : NULL;
+    if (replay_output != NULL) {
+        mg_output_update(mg, replay_output);
+    }
+    else {
+        mg_output_all_update(mg);
+    }
 
     /* release state lock, nothing below will touch the state again */
     err = mg_state_unlock(state);
@@ -130,8 +168,17 @@ static int mg_worker_run(struct mg_core *mg)
     }
 
     /* synchronize internal state with outputs */
-    if (!mg->halt_outputs) {
+    if (replay_output != NULL) {
+        clock_gettime(CLOCK_MONOTONIC, &t0);
+        mg_output_tick_sync(replay_output);
+        clock_gettime(CLOCK_MONOTONIC, &t1);
+        times->sync = duration_us(t0, t1);
+    }
+    else if (!mg->halt_outputs) {
+        clock_gettime(CLOCK_MONOTONIC, &t0);
         mg_output_all_sync(mg);
+        clock_gettime(CLOCK_MONOTONIC, &t1);
+        times->sync = duration_us(t0, t1);
     }
 
     mg_server_record_wheel_data(wheel->position, wheel->speed);
@@ -150,6 +197,65 @@ exit:
 }
 
 
+/* Add the timings of a tick to the stats. The sequence number is odd while
+ * the stats are updated, so that readers in other threads can detect and
+ * retry inconsistent copies without taking a lock. */
+static void mg_worker_record_stats(struct mg_worker_stats *stats, int interval,
+        int wakeup, int tick, const struct mg_tick_times *times)
+{
+    stats->seq++;
+    __sync_synchronize();
+
+    if (stats->reset_requested) {
+        stats->ticks = 0;
+        stats->deadline_misses = 0;
+        memset(&stats->wakeup, 0, sizeof(stats->wakeup));
+        memset(&stats->tick, 0, sizeof(stats->tick));
+        memset(&stats->core_lock, 0, sizeof(stats->core_lock));
+        memset(&stats->state_lock, 0, sizeof(stats->state_lock));
+        memset(&stats->sync, 0, sizeof(stats->sync));
+        stats->reset_requested = 0;
+    }
+
+    stats->ticks++;
+    /* the next tick is scheduled from the actual wakeup, so a late wakeup
+     * alone doesn't delay it */
+    if (tick > interval) {
+        stats->deadline_misses++;
+    }
+    duration_stats_add(&stats->wakeup, wakeup);
+    duration_stats_add(&stats->tick, tick);
+    duration_stats_add(&stats->core_lock, times->core_lock);
+    duration_stats_add(&stats->state_lock, times->state_lock);
+    duration_stats_add(&stats->sync, times->sync);
+
+    __sync_synchronize();
+    stats->seq++;
+}
+
+
+static void duration_stats_add(struct mg_duration_stats *stats, int us)
+{
+    int bucket = 0;
+    unsigned int val;
+
+    if (us < 0) {
+        us = 0;
+    }
+
+    stats->total += us;
+    if ((unsigned int) us > stats->max) {
+        stats->max = us;
+    }
+
+    /* log2 buckets, see MG_STATS_HIST_SIZE */
+    for (val = us; val && bucket < MG_STATS_HIST_SIZE - 1; val >>= 1) {
+        bucket++;
+    }
+    stats->hist[bucket]++;
+}
+
+
 /* Report the current position to any connected websocket listeners, but only
  * every MG_WHEEL_REPORT_INTERVAL call */
 static void position_to_websockets(void)
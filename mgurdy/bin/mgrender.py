@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+"""
+Renders the presets offline, without audio hardware, with the same synth
+settings and effects as on the instrument, and reports the render time per
+second of audio for each preset. Useful as a CPU cost benchmark, e.g.
+
+    mgrender.py --config mg.conf --seconds 10 --wav-dir /tmp/render
+"""
+
+import argparse
+import os
+import sys
+
+from mg.conf import settings
+from mg.fluidsynth.render import PresetRenderer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--wav-dir', help='write the rendered audio of each preset to this directory')
+    parser.add_argument('--no-effects', action='store_true', help='render without the LADSPA effects')
+    parser.add_argument('presets', type=int, nargs='*', help='preset numbers, default all')
+    args = parser.parse_args()
+
+    if args.config:
+        settings.load(args.config)
+
+    from mg import db
+    db.initialize(os.path.join(settings.data_dir, 'mg.db'))
+    presets = db.Preset.select().order_by(db.Preset.number)
+    if args.presets:
+        presets = presets.where(db.Preset.number << args.presets)
+
+    if args.wav_dir:
+        os.makedirs(args.wav_dir, exist_ok=True)
+
+    try:
+        renderer = PresetRenderer(settings.sound_dir, effects=not args.no_effects)
+    except Exception as e:
+        sys.stderr.write('{}\n'.format(e))
+        sys.exit(1)
+
+    costs = []
+    for preset in presets:
+        filename = None
+        if args.wav_dir:
+            filename = os.path.join(args.wav_dir, 'preset-{:03d}.wav'.format(preset.number))
+        try:
+            cost = renderer.render_preset(preset.get_data(), args.seconds, filename)
+        except Exception as e:
+            sys.stderr.write('Preset {}: {}\n'.format(preset.number, e))
+            continue
+        costs.append(cost)
+        print('{:3d} {:30s} {:7.1f} ms per second of audio ({:.1f}% CPU)'.format(
+            preset.number, preset.name or '', cost * 1000, cost * 100))
+
+    renderer.stop()
+
+    if costs:
+        print('{} presets, average {:.1f} ms, max {:.1f} ms per second of audio'.format(
+            len(costs), sum(costs) * 1000 / len(costs), max(costs) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/python
+
+"""
+Writes a SoundFont that only contains the given presets and the instruments
+and samples they use. Presets are given as bank:program, e.g.
+
+    mgsf2subset.py FluidR3_GM.sf2 fiddle.sf2 0:40 0:110
+"""
+
+import argparse
+import os
+import sys
+
+from mg.sf2 import write_subset
+
+
+def preset(value):
+    try:
+        bank, program = value.split(':')
+        return int(bank), int(program)
+    except ValueError:
+        raise argparse.ArgumentTypeError('Invalid preset {}, use bank:program'.format(value))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src')
+    parser.add_argument('dest')
+    parser.add_argument('presets', type=preset, nargs='+')
+    args = parser.parse_args()
+
+    try:
+        written = write_subset(args.src, args.dest, args.presets)
+    except Exception as e:
+        sys.stderr.write('{}\n'.format(e))
+        sys.exit(1)
+
+    missing = set(args.presets) - set(written)
+    for bank, program in sorted(missing):
+        sys.stderr.write('Preset {}:{} not found\n'.format(bank, program))
+
+    src_size = os.path.getsize(args.src)
+    dest_size = os.path.getsize(args.dest)
+    print('{} presets, {} -> {} bytes ({:.1f}%)'.format(
+        len(written), src_size, dest_size, dest_size * 100 / src_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,8 @@ setup(
         'bin/mgurdy.py',
         'bin/mgmessage.py',
         'bin/mgsysinfo.py',
+        'bin/mgsf2subset.py',
+        'bin/mgrender.py',
     ],
     install_requires=[
         'marshmallow',
@@ -35,5 +37,6 @@ setup(
         "src/mg/mglib/mglib_build.py:ffibuilder",
         "src/mg/fluidsynth/fluidsynth_build.py:ffibuilder",
         "src/mg/alsa/alsa_build.py:ffibuilder",
+        "src/mg/inotify/inotify_build.py:ffibuilder",
     ],
 )
@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+
+from mg.conf import settings
+from mg.utils import PeriodicTimer
+
+
+log = logging.getLogger('bypass')
+
+
+class EffectBypass(object):
+    """
+    Bypasses the LADSPA effects while the instrument is silent, to save CPU
+    and battery between tunes. The effects are bypassed once no voice has
+    been active for the tail time, so that the reverb and sympathetic
+    strings can decay, and resumed as soon as a voice is active again.
+
+    Voices are polled every INTERVAL seconds, which is also the maximum
+    delay until the effects are resumed. As the effects only process the
+    reverb send, which builds up slowly, this delay is not audible.
+
+    The CPU saved is estimated from the synth load while silent with and
+    without the effects.
+    """
+    INTERVAL = 0.02
+
+    def __init__(self):
+        self.fluid = None
+        self.timer = None
+        self.tail = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def setup(self, fluid, tail=None):
+        self.fluid = fluid
+        self.tail = settings.effects_idle_tail if tail is None else tail
+
+    def start(self):
+        self.stop()
+        self.timer = PeriodicTimer(self.INTERVAL, self.check)
+        self.timer.start()
+
+    def stop(self):
+        if self.timer:
+            self.timer.stop()
+            self.timer = None
+        with self._lock:
+            if self.bypassed_since is not None:
+                self.resume(time.monotonic())
+
+    def reset(self):
+        with self._lock:
+            self.silent_since = None
+            self.bypassed_since = None
+            self.bypass_count = 0
+            self.bypassed_time = 0.0
+            # sum and count of load samples while silent, with and without effects
+            self.silent_load = [0.0, 0]
+            self.bypassed_load = [0.0, 0]
+
+    def check(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        try:
+            voices = self.fluid.get_active_voice_count()
+            load = self.fluid.get_cpu_load()
+            with self._lock:
+                if self.bypassed_since is not None:
+                    if voices:
+                        self.resume(now)
+                    else:
+                        add_load(self.bypassed_load, load)
+                elif voices:
+                    self.silent_since = None
+                elif self.silent_since is None:
+                    self.silent_since = now
+                elif now - self.silent_since >= self.tail:
+                    self.bypass(now)
+                else:
+                    add_load(self.silent_load, load)
+        except Exception:
+            log.exception('Unable to check for silence')
+
+    def bypass(self, now):
+        self.fluid.ladspa.bypass()
+        self.bypassed_since = now
+        self.bypass_count += 1
+
+    def resume(self, now):
+        self.fluid.ladspa.resume()
+        self.bypassed_time += now - self.bypassed_since
+        self.bypassed_since = None
+        self.silent_since = None
+
+    def get_stats(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            bypassed_time = self.bypassed_time
+            if self.bypassed_since is not None:
+                bypassed_time += now - self.bypassed_since
+            silent_load = mean_load(self.silent_load)
+            bypassed_load = mean_load(self.bypassed_load)
+            return {
+                'bypassed': self.bypassed_since is not None,
+                'bypass_count': self.bypass_count,
+                'bypassed_time': round(bypassed_time, 2),
+                'silent_cpu_load': round(silent_load, 1),
+                'bypassed_cpu_load': round(bypassed_load, 1),
+                # CPU seconds saved
+                'cpu_saved': round(max(0.0, silent_load - bypassed_load) / 100 * bypassed_time, 2),
+            }
+
+
+def add_load(loads, load):
+    loads[0] += load
+    loads[1] += 1
+
+
+def mean_load(loads):
+    return loads[0] / loads[1] if loads[1] else 0.0
+
+
+bypass = EffectBypass()
@@ -7,8 +7,18 @@ SETTINGS = (
     ('core', 'sound_dir', 'str', '/data/sounds'),
     ('core', 'config_dir', 'str', '/data/config'),
     ('core', 'upload_dir', 'str', '/data/uploads'),
+    ('core', 'cache_dir', 'str', '/data/cache'),
     ('core', 'input_config', 'str', 'input.json'),
 
+    ('synth', 'font_cache_size', 'int', 32),
+    ('synth', 'telemetry_interval', 'float', 0.25),
+    ('synth', 'telemetry_size', 'int', 1200),
+    ('synth', 'ladspa_dir', 'str', '/usr/lib/ladspa'),
+    ('synth', 'effects_idle_bypass', 'boolean', True),
+    ('synth', 'effects_idle_tail', 'float', 5.0),
+    ('synth', 'adaptive_polyphony', 'boolean', True),
+    ('synth', 'min_polyphony', 'int', 24),
+
     ('server', 'http_port', 'int', 80),
     ('server', 'webroot_dir', 'str', '/srv/www'),
 
@@ -43,7 +53,7 @@ class Settings:
             setattr(self, key, default)
 
     def create_dirs(self):
-        for path in (self.sound_dir, self.config_dir, self.upload_dir):
+        for path in (self.sound_dir, self.config_dir, self.upload_dir, self.cache_dir):
             if not os.path.exists(path):
                 os.makedirs(path)
 
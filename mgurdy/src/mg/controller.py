@@ -1,12 +1,16 @@
+import copy
 import json
 import logging
+import threading
 
 import alsaaudio
 
 from mg.conf import find_config_file
+from mg.fluidsynth.config import voice_interpolation
 from mg.mglib import mgcore
 from mg.signals import EventListener
 from mg.input.midi import MidiInput
+from mg.subsets import subsets
 
 from . import utils
 
@@ -47,6 +51,7 @@ class SynthController(EventListener):
         'active:preset:voice:polyphonic:changed',
         'active:preset:voice:panning:changed',
         'active:preset:voice:finetune:changed',
+        'active:preset:voice:interpolation:changed',
         'active:preset:voice:chien_threshold:changed',
         'active:preset:preload',
         'clear:preload',
@@ -56,6 +61,9 @@ class SynthController(EventListener):
     def __init__(self, fluid, state):
         self.fluid = fluid
         self.state = state
+        self.channel_bank = 0
+        self._bank_lock = threading.RLock()
+        self._prepare_id = 0
 
     def synth_gain_changed(self, gain, **kwargs):
         self.set_synth_gain(gain)
@@ -82,10 +90,10 @@ class SynthController(EventListener):
         mgcore.set_string_params(self.string_mute_configs())
 
     def reverb_volume_changed(self, reverb_volume, **kwargs):
-        self.set_reverb_volume(reverb_volume)
+        self.apply_effects()
 
     def reverb_panning_changed(self, reverb_panning, **kwargs):
-        self.set_reverb_panning(reverb_panning)
+        self.apply_effects()
 
     def active_preset_voice_muted_changed(self, **kwargs):
         mgcore.set_string_params(self.string_mute_configs())
@@ -122,86 +130,189 @@ class SynthController(EventListener):
         mgcore.set_string_params(self.base_note_configs())
 
     def fine_tune_changed(self, **kwargs):
-        for voice in self.state.preset.voices:
-            self.set_voice_fine_tune(voice)
+        self.fluid.send_commands(self.fine_tune_commands())
 
     def active_preset_voice_finetune_changed(self, sender, **kwargs):
         self.set_voice_fine_tune(sender)
 
+    def active_preset_voice_interpolation_changed(self, sender, **kwargs):
+        self.set_voice_interpolation(sender)
+
+    def set_voice_interpolation(self, voice, bank=None):
+        self.fluid.set_interp_method(self.voice_channel(voice, bank),
+                                     voice_interpolation(voice.type, voice.interpolation))
+
     def set_voice_fine_tune(self, voice):
         fine_tune = voice.finetune + self.state.fine_tune
-        self.fluid.set_channel_fine_tune(voice.channel, fine_tune)
+        self.fluid.set_channel_fine_tune(self.voice_channel(voice), fine_tune)
+
+    def fine_tune_commands(self, bank=None):
+        commands = []
+        for voice in self.state.preset.voices:
+            fine_tune = voice.finetune + self.state.fine_tune
+            commands.extend(self.fluid.fine_tune_commands(self.voice_channel(voice, bank), fine_tune))
+        return commands
 
     def active_preset_changed(self, **kwargs):
         self.configure_all_voices()
         self.set_synth_gain(self.state.synth.gain)
         mgcore.set_pitchbend_range(self.state.pitchbend_range)
         mgcore.set_string_params(self.chien_threshold_configs())
-        self.set_reverb_volume(self.state.reverb_volume)
-        self.set_reverb_panning(self.state.reverb_panning)
+        self.apply_effects()
 
     def sound_changed(self, id, **kwargs):
         # if the changed sound is currently in use, clear all sounds
         # and then do a complete reconfiguration of the synth
-        if id in self.fluid.get_loaded_fonts():
+        if id in self.get_loaded_font_ids():
             self.configure_all_voices(clear_sounds=True)
 
     def sound_deleted(self, id, **kwargs):
         # if the deleted sound is currently in use, clear all sounds
         # and then do a complete reconfiguration of the synth
-        if id in self.fluid.get_loaded_fonts():
+        if id in self.get_loaded_font_ids():
             self.configure_all_voices(clear_sounds=True)
 
+    def get_loaded_font_ids(self):
+        return set(subsets.source_id(name) for name in self.fluid.get_loaded_fonts())
+
+    def get_font_names(self):
+        """
+        Return a dict of SoundFont id to the name of the font file that should
+        be loaded into FluidSynth for the voices of the current preset. That is
+        a subset of the SoundFont if there is one that contains all sounds of the
+        preset, otherwise the SoundFont itself.
+        """
+        return subsets.resolve_all((voice.soundfont_id, voice.bank, voice.program)
+                                   for voice in self.state.preset.voices
+                                   if voice.soundfont_id)
+
     def active_preset_preload(self, **kwargs):
+        fonts = self.get_font_names()
         for voice in self.state.preset.voices:
             if not voice.get_sound():
                 continue
-            self.fluid.pin_sound(voice.soundfont_id, voice.bank, voice.program)
+            self.fluid.pin_sound(fonts[voice.soundfont_id], voice.bank, voice.program, owner='preload')
 
     def clear_preload(self, *kwargs):
-        self.fluid.unpin_all_sounds()
+        self.fluid.unpin_all_sounds(owner='preload')
+        self.fluid.trim_soundfonts()
 
     def configure_all_voices(self, clear_sounds=False):
-        mgcore.halt_outputs()
-        try:
-            if clear_sounds:
-                self.fluid.clear_all_channel_sounds()
-                self.fluid.unload_unused_soundfonts()
+        """
+        Prepare the sounds of the current preset on the idle channel bank and
+        switch the core over to it as soon as all sounds are ready. The old
+        preset keeps playing on the active bank until then, so there is no gap
+        between the two.
+        """
+        if clear_sounds:
+            self.fluid.clear_all_channel_sounds()
+            self.fluid.unload_unused_soundfonts()
 
-            configs = []
+        with self._bank_lock:
+            self._prepare_id += 1
+            prepare_id = self._prepare_id
+            bank = 1 - self.channel_bank
 
-            for voice in self.state.preset.voices:
-                string = voice.string
+            loading = []
+            fonts = self.get_font_names()
 
+            for voice in self.state.preset.voices:
+                channel = self.voice_channel(voice, bank)
+                self.set_voice_interpolation(voice, bank)
                 if voice.get_sound():
-                    self.fluid.set_channel_sound(
-                        voice.channel,
-                        voice.soundfont_id,
+                    # the SoundFonts are loaded in the background
+                    loading.append(self.fluid.set_channel_sound(
+                        channel,
+                        fonts[voice.soundfont_id],
                         voice.bank,
-                        voice.program)
-                    muted = voice.muted or voice.number > self.state.string_count
-                    configs.append((string, 'mute', int(muted)))
-                    configs.append((string, 'bank', voice.bank))
-                    configs.append((string, 'program', voice.program))
+                        voice.program,
+                        wait=False))
                 else:
-                    self.fluid.clear_channel_sound(voice.channel)
-                    configs.append((string, 'mute', 1))
+                    self.fluid.clear_channel_sound(channel)
 
-                configs.append((string, 'volume', voice.volume))
-                configs.append((string, 'panning', voice.panning))
-                configs.append((string, 'mode', VOICE_MODES.index(voice.get_mode())))
+            self.fluid.send_commands(self.fine_tune_commands(bank))
 
-                configs.append((string, 'base_note', self.get_effective_base_note(voice)))
+            if not loading:
+                self.switch_channel_bank(prepare_id, bank)
 
-                if voice.type == 'melody':
-                    configs.append((string, 'capo', voice.capo))
-                    configs.append((string, 'polyphonic', int(voice.polyphonic)))
+            waiting = set(loading)
 
-            mgcore.set_string_params(configs)
+            def sound_ready(ready):
+                if not ready.cancelled() and ready.exception():
+                    log.error('Unable to set channel sound: {}'.format(ready.exception()))
+                with self._bank_lock:
+                    waiting.discard(ready)
+                    if not waiting:
+                        self.switch_channel_bank(prepare_id, bank)
 
-            self.fluid.unload_unused_soundfonts()
-        finally:
-            mgcore.resume_outputs()
+            for ready in loading:
+                ready.add_done_callback(sound_ready)
+
+    def switch_channel_bank(self, prepare_id, bank):
+        with self._bank_lock:
+            # a newer preset is being prepared already
+            if prepare_id != self._prepare_id:
+                return
+            self.channel_bank = bank
+            mgcore.switch_channel_bank(bank, self.string_configs())
+
+            # the sounds of the previous preset would keep their fonts in
+            # use, so they could never be trimmed
+            idle = (1 - bank) * mgcore.CHANNEL_BANK_SIZE
+            for channel in range(idle, idle + mgcore.CHANNEL_BANK_SIZE):
+                self.fluid.clear_channel_sound(channel)
+
+        # keep recently used fonts loaded, so that switching back and
+        # forth between presets doesn't reload them every time
+        self.fluid.trim_soundfonts()
+
+    def string_configs(self):
+        configs = []
+        for voice in self.state.preset.voices:
+            string = voice.string
+
+            if voice.get_sound():
+                configs.append((string, 'mute', int(self.is_voice_muted(voice))))
+                configs.append((string, 'bank', voice.bank))
+                configs.append((string, 'program', voice.program))
+            else:
+                configs.append((string, 'mute', 1))
+
+            configs.append((string, 'volume', voice.volume))
+            configs.append((string, 'panning', voice.panning))
+            configs.append((string, 'mode', VOICE_MODES.index(voice.get_mode())))
+
+            configs.append((string, 'base_note', self.get_effective_base_note(voice)))
+
+            if voice.type == 'melody':
+                configs.append((string, 'capo', voice.capo))
+                configs.append((string, 'polyphonic', int(voice.polyphonic)))
+        return configs
+
+    def voice_channel(self, voice, bank=None):
+        """
+        Return the FluidSynth channel of the voice on the given channel bank,
+        by default the active one
+        """
+        if bank is None:
+            bank = self.channel_bank
+        return voice.channel + bank * mgcore.CHANNEL_BANK_SIZE
+
+    def channel_sound_ready(self, ready):
+        """
+        Called from the SoundFont loader when the sound of a channel has been
+        selected (or failed to load), unmutes the strings that are ready.
+        """
+        if ready.cancelled():
+            return
+        if ready.exception():
+            log.error('Unable to set channel sound: {}'.format(ready.exception()))
+            return
+        mgcore.set_string_params(self.string_mute_configs())
+
+    def is_voice_muted(self, voice):
+        return (voice.muted or voice.number > self.state.string_count or
+                self.fluid.is_channel_pending(self.voice_channel(voice)))
 
     def melody_capo_configs(self):
         configs = []
@@ -216,8 +327,7 @@ class SynthController(EventListener):
             if not voice.get_sound():
                 configs.append((string, 'mute', 1))
             else:
-                muted = voice.muted or voice.number > self.state.string_count
-                configs.append((string, 'mute', int(muted)))
+                configs.append((string, 'mute', int(self.is_voice_muted(voice))))
         return configs
 
     def base_note_configs(self):
@@ -244,34 +354,47 @@ class SynthController(EventListener):
         mgcore.set_string_params([(voice.string, 'mute', 1)])
         sound = voice.get_sound()
         if not sound:
-            self.fluid.clear_channel_sound(voice.channel)
+            self.fluid.clear_channel_sound(self.voice_channel(voice))
             return
-        self.fluid.set_channel_sound(voice.channel, sound.soundfont.filename,
-                                     voice.bank, voice.program)
+        font_name = self.get_font_names()[sound.soundfont.id]
+        ready = self.fluid.set_channel_sound(self.voice_channel(voice), font_name,
+                                             voice.bank, voice.program, wait=False)
         configs = [
             (voice.string, 'mode', VOICE_MODES.index(voice.get_mode())),
             (voice.string, 'bank', voice.bank),
             (voice.string, 'program', voice.program),
         ]
 
-        muted = voice.muted or voice.number > self.state.string_count
-        if not muted:
+        if not self.is_voice_muted(voice):
             configs.append((voice.string, 'mute', 0))
         mgcore.set_string_params(configs)
+        ready.add_done_callback(self.channel_sound_ready)
         self.set_voice_fine_tune(voice)
-
-    def set_reverb_volume(self, volume):
-        level = utils.scale(volume, 0, 100, 0.01, 1.0)
-        if not volume:
-            self.fluid.ladspa.deactivate()
-        else:
-            self.fluid.ladspa.mix_effect('sympa', level)
-            if not self.fluid.ladspa.is_active():
-                self.fluid.ladspa.activate()
-
-    def set_reverb_panning(self, panning):
-        self.fluid.ladspa.set_control('sympa', 'Wet Left', utils.balance2amp(panning, 'left'))
-        self.fluid.ladspa.set_control('sympa', 'Wet Right', utils.balance2amp(panning, 'right'))
+        self.set_voice_interpolation(voice)
+
+    def apply_effects(self, graph=None):
+        """
+        Apply the effect graph, or the currently applied one if graph is None,
+        with the reverb volume and panning of the state. Only the differences
+        are sent to FluidSynth, see LADSPA.apply().
+        """
+        graph = graph or self.fluid.ladspa.graph
+        if graph:
+            self.fluid.ladspa.apply(self.effect_graph(graph))
+
+    def effect_graph(self, graph):
+        graph = copy.deepcopy(graph)
+        for effect in graph['effects']:
+            if effect['name'] != graph.get('reverb'):
+                continue
+            volume = self.state.reverb_volume
+            panning = self.state.reverb_panning
+            # silence the reverb instead of deactivating all effects
+            effect['mix_gain'] = utils.scale(volume, 0, 100, 0.01, 1.0) if volume else 0.0
+            controls = effect.setdefault('controls', {})
+            controls['Wet Left'] = utils.balance2amp(panning, 'left')
+            controls['Wet Right'] = utils.balance2amp(panning, 'right')
+        return graph
 
     def set_voice_volume(self, voice, volume):
         mgcore.set_string_params([(voice.string, 'volume', volume)])
@@ -109,6 +109,20 @@ def load_mapping_ranges(name):
         log.exception('Unable to read mapping "%s" from database', name)
 
 
+def load_all_mapping_ranges(names):
+    """
+    Return a dict of the stored ranges of the named mappings, read in a
+    single query. Mappings without stored ranges are not included.
+    """
+    result = {}
+    for entry in Config.select().where(Config.name.in_(list(names))):
+        try:
+            result[entry.name] = schema.MappingSchema().loads(entry.data).data['ranges']
+        except Exception:
+            log.exception('Unable to read mapping "%s" from database', entry.name)
+    return result
+
+
 def save_mapping_ranges(name, ranges):
     entry, _created = Config.get_or_create(name=name)
     try:
@@ -187,6 +201,70 @@ def save_misc_config(config):
         raise
 
 
+def load_audio_config():
+    try:
+        entry = Config.get(Config.name == 'audio')
+    except Config.DoesNotExist:
+        return None
+    try:
+        return schema.AudioConfigSchema().loads(entry.data).data
+    except Exception:
+        log.exception('Unable to read audio config')
+
+
+def save_audio_config(config):
+    entry, _created = Config.get_or_create(name='audio')
+    try:
+        entry.data = schema.AudioConfigSchema().dumps(config).data
+    except Exception:
+        log.exception('Unable to serialize audio config')
+        raise
+    try:
+        entry.save()
+    except Exception:
+        log.exception('Unable to write audio config')
+        raise
+
+
+def delete_audio_config():
+    try:
+        Config.delete().where(Config.name == 'audio').execute()
+    except Exception:
+        log.exception('Unable to delete audio config')
+
+
+def load_effects():
+    try:
+        entry = Config.get(Config.name == 'effects')
+    except Config.DoesNotExist:
+        return None
+    try:
+        return schema.EffectGraphSchema().loads(entry.data).data
+    except Exception:
+        log.exception('Unable to read effects')
+
+
+def save_effects(graph):
+    entry, _created = Config.get_or_create(name='effects')
+    try:
+        entry.data = schema.EffectGraphSchema().dumps(graph).data
+    except Exception:
+        log.exception('Unable to serialize effects')
+        raise
+    try:
+        entry.save()
+    except Exception:
+        log.exception('Unable to write effects')
+        raise
+
+
+def delete_effects():
+    try:
+        Config.delete().where(Config.name == 'effects').execute()
+    except Exception:
+        log.exception('Unable to delete effects')
+
+
 def load_midi_config(port_id):
     config_key = 'midi:{}'.format(port_id)[0:255]
     try:
@@ -1,5 +1,12 @@
+import array
+import collections
+import concurrent.futures
+import copy
 import logging
 import os
+import sys
+import threading
+import wave
 
 from ._fluidsynth import lib, ffi
 
@@ -20,19 +27,42 @@ def fs_log(level, message, _ignored):
     method(ffi.string(message))
 
 
+INTERP_METHODS = {
+    'none': lib.FLUID_INTERP_NONE,
+    'linear': lib.FLUID_INTERP_LINEAR,
+    '4th': lib.FLUID_INTERP_4THORDER,
+    '7th': lib.FLUID_INTERP_7THORDER,
+}
+
+
 class FluidSynthError(Exception):
     pass
 
 
 class FluidSynth(object):
-    def __init__(self, soundfont_dir=None, config=None):
+    def __init__(self, soundfont_dir=None, config=None, font_cache_size=0):
         self.adriver = None
         self.synth = None
         self._ladspa = None
         self.soundfont_dir = soundfont_dir
-        self.soundfonts = {}
+        # loaded fonts in least recently used order
+        self.soundfonts = collections.OrderedDict()
+        self.font_sizes = {}
+        self.font_cache_size = font_cache_size
+        self.font_cache_stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+        }
         self.channels = {}
         self.pinned_sounds = []
+        self._lock = threading.RLock()
+        self._loader = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='mg-fontload')
+        self._loading = {}
+        self._pending_channels = {}
+        # sends the commands through the core if set, see send_commands()
+        self.command_sender = None
         self.settings = lib.new_fluid_settings()
         self.configure(config or {})
         self.reverb = {
@@ -70,73 +100,245 @@ class FluidSynth(object):
     def load_font(self, filename):
         """
         Load a SoundFont file into FluidSynth and return the internal ID that
-        FluidSynth uses to identify this font.
+        FluidSynth uses to identify this font. Blocks until the font is loaded.
+        """
+        return self.load_font_async(filename).result()
+
+    def load_font_async(self, filename):
         """
-        if filename not in self.soundfonts:
-            path = os.path.join(self.soundfont_dir, filename)
+        Load a SoundFont file into FluidSynth in the background. Returns a
+        Future that resolves to the internal ID of the font, or raises a
+        FluidSynthError if the font could not be loaded.
+
+        Concurrent requests for the same font share a single load.
+        """
+        with self._lock:
+            if filename in self.soundfonts:
+                self.soundfonts.move_to_end(filename)
+                self.font_cache_stats['hits'] += 1
+                future = concurrent.futures.Future()
+                future.set_result(self.soundfonts[filename])
+                return future
+            future = self._loading.get(filename)
+            if future is None:
+                self.font_cache_stats['misses'] += 1
+                future = self._loader.submit(self._load_font, filename)
+                self._loading[filename] = future
+            return future
+
+    def _load_font(self, filename):
+        path = os.path.join(self.soundfont_dir, filename)
+        try:
             sfid = lib.fluid_synth_sfload(self.synth, path.encode(), 0)
             if sfid < 0:
                 raise FluidSynthError('Unable to load soundfont "%s"' % path)
-            self.soundfonts[filename] = sfid
-        return self.soundfonts[filename]
+            with self._lock:
+                self.soundfonts[filename] = sfid
+                try:
+                    self.font_sizes[filename] = os.path.getsize(path)
+                except OSError:
+                    self.font_sizes[filename] = 0
+            return sfid
+        finally:
+            with self._lock:
+                del self._loading[filename]
 
     def unload_font(self, filename):
-        sfid = self.soundfonts[filename]
-        ret = lib.fluid_synth_sfunload(self.synth, sfid, 0)
-        if ret != lib.FLUID_OK:
-            raise FluidSynthError('Unable to unload soundfont %s' % filename)
-        del self.soundfonts[filename]
-        self.pinned_sounds = [e for e in self.pinned_sounds if e['font_id'] != sfid]
+        with self._lock:
+            sfid = self.soundfonts[filename]
+            ret = lib.fluid_synth_sfunload(self.synth, sfid, 0)
+            if ret != lib.FLUID_OK:
+                raise FluidSynthError('Unable to unload soundfont %s' % filename)
+            del self.soundfonts[filename]
+            del self.font_sizes[filename]
+            self.pinned_sounds = [e for e in self.pinned_sounds if e['font_id'] != sfid]
 
     def get_loaded_fonts(self):
         """
         Return a dict with key being the loaded soundfont filename,
         value the number of channels that this font is currently used on
         """
-        used_ids = list(self.channels.values())
-        return {filename: used_ids.count(sfid)
-                for filename, sfid in self.soundfonts.items()}
+        with self._lock:
+            used_ids = list(self.channels.values())
+            return {filename: used_ids.count(sfid)
+                    for filename, sfid in self.soundfonts.items()}
 
     def unload_unused_soundfonts(self):
+        with self._lock:
+            for filename in self._unused_fonts():
+                self.unload_font(filename)
+        log.info('%d soundfonts left after unloading' % lib.fluid_synth_sfcount(self.synth))
+
+    def trim_soundfonts(self):
+        """
+        Unload the least recently used fonts that are not used on any channel
+        and have no pinned presets, until the total size of the loaded fonts
+        fits into font_cache_size (in bytes). The size of a font is estimated
+        by its file size.
+        """
+        with self._lock:
+            total = sum(self.font_sizes.values())
+            for filename in self._unused_fonts():
+                if total <= self.font_cache_size:
+                    break
+                total -= self.font_sizes[filename]
+                self.unload_font(filename)
+                self.font_cache_stats['evictions'] += 1
+                log.info('Evicted soundfont %s from cache' % filename)
+        log.debug('Font cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, '
+                  '%(fonts)d fonts, %(size)d of %(max_size)d bytes' % self.get_font_cache_stats())
+
+    def get_font_cache_stats(self):
+        """
+        Return the hit, miss and eviction counts of the font cache, together
+        with the current and maximum size of the loaded fonts in bytes
+        """
+        with self._lock:
+            stats = dict(self.font_cache_stats)
+            stats['fonts'] = len(self.soundfonts)
+            stats['size'] = sum(self.font_sizes.values())
+            stats['max_size'] = self.font_cache_size
+            return stats
+
+    def _unused_fonts(self):
+        """
+        Return the loaded fonts that are not used on any channel and have
+        no pinned presets, least recently used first
+        """
         used_font_ids = set(self.channels.values())
         for entry in self.pinned_sounds:
             used_font_ids.add(entry['font_id'])
-        for filename, sfid in list(self.soundfonts.items()):
-            if sfid not in used_font_ids:
-                self.unload_font(filename)
-        log.info('%d soundfonts left after unloading' % lib.fluid_synth_sfcount(self.synth))
+        pending_fonts = set(filename for filename, _ready in self._pending_channels.values())
+        return [filename for filename, sfid in self.soundfonts.items()
+                if sfid not in used_font_ids and filename not in pending_fonts]
+
+    def set_channel_sound(self, channel, font_filename, bank, program, wait=True):
+        """
+        Select the sound on the channel, loading the SoundFont first if
+        necessary.
+
+        With wait=False the SoundFont is loaded in the background and the
+        sound is selected as soon as the font is ready. Returns a Future
+        that resolves to the font ID once the sound has been selected. The
+        Future is cancelled if another sound is set on the channel (or the
+        channel is cleared) before the font has finished loading.
+        """
+        ready = concurrent.futures.Future()
+        future = self.load_font_async(font_filename)
+        with self._lock:
+            previous = self._pending_channels.pop(channel, None)
+            self._pending_channels[channel] = (font_filename, ready)
+        if previous:
+            previous[1].cancel()
+
+        if wait:
+            try:
+                future.result()
+            finally:
+                self._select_channel_sound(channel, ready, bank, program, future)
+            return ready.result()
+
+        future.add_done_callback(
+            lambda f: self._select_channel_sound(channel, ready, bank, program, f))
+        return ready
+
+    def _select_channel_sound(self, channel, ready, bank, program, future):
+        with self._lock:
+            pending = self._pending_channels.get(channel)
+            if pending is None or pending[1] is not ready:
+                return
+            del self._pending_channels[channel]
+            try:
+                sfid = future.result()
+                self.select_program(channel, sfid, bank, program)
+                self.channels[channel] = sfid
+            except Exception as e:
+                ready.set_exception(e)
+                return
+        ready.set_result(sfid)
+
+    def is_channel_pending(self, channel):
+        """
+        Return True if the sound of the channel is waiting for its
+        SoundFont to be loaded
+        """
+        with self._lock:
+            return channel in self._pending_channels
 
-    def set_channel_sound(self, channel, font_filename, bank, program):
-        sfid = self.load_font(font_filename)
-        self.select_program(channel, sfid, bank, program)
-        self.channels[channel] = sfid
+    def _cancel_pending_channel(self, channel):
+        with self._lock:
+            pending = self._pending_channels.pop(channel, None)
+        if pending:
+            pending[1].cancel()
 
     def clear_channel_sound(self, channel):
-        if channel not in self.channels:
-            return
-        ret = lib.fluid_synth_unset_program(self.synth, channel)
-        if ret != lib.FLUID_OK:
-            raise FluidSynthError('Unable to clear channel')
-        del self.channels[channel]
-
-    def pin_sound(self, font_filename, bank, program):
-        font_id = self.load_font(font_filename)
-        entry = self._find_pinned_preset(font_id, bank, program)
-        if not entry:
-            ret = lib.fluid_synth_pin_preset(self.synth, font_id, bank, program)
+        self._cancel_pending_channel(channel)
+        with self._lock:
+            if channel not in self.channels:
+                return
+            ret = lib.fluid_synth_unset_program(self.synth, channel)
             if ret != lib.FLUID_OK:
-                raise FluidSynthError('Unable to unload soundfont %s' % font_filename)
-            self.pinned_sounds.append({
-                'font_id': font_id,
-                'bank': bank,
-                'program': program,
-            })
-        return True
-
-    def unpin_all_sounds(self):
-        for entry in self.pinned_sounds:
-            lib.fluid_synth_unpin_preset(self.synth, entry['font_id'], entry['bank'], entry['program'])
-        self.pinned_sounds = []
+                raise FluidSynthError('Unable to clear channel')
+            del self.channels[channel]
+
+    def pin_sound(self, font_filename, bank, program, owner=None):
+        """
+        Pin the preset, so that its samples stay loaded even if it isn't used
+        on any channel. A sound can be pinned by several owners and stays
+        pinned until all of them have unpinned it.
+        """
+        while True:
+            font_id = self.load_font(font_filename)
+            with self._lock:
+                # the font might have been evicted while waiting for it
+                if self.soundfonts.get(font_filename) != font_id:
+                    continue
+                entry = self._find_pinned_preset(font_id, bank, program)
+                if not entry:
+                    ret = lib.fluid_synth_pin_preset(self.synth, font_id, bank, program)
+                    if ret != lib.FLUID_OK:
+                        raise FluidSynthError('Unable to unload soundfont %s' % font_filename)
+                    entry = {
+                        'font_id': font_id,
+                        'bank': bank,
+                        'program': program,
+                        'owners': set(),
+                    }
+                    self.pinned_sounds.append(entry)
+                entry['owners'].add(owner)
+                return True
+
+    def unpin_sound(self, font_filename, bank, program, owner=None):
+        """
+        Remove the pin of the owner. Returns True if the preset is not pinned
+        by anyone else and has been unpinned.
+        """
+        with self._lock:
+            font_id = self.soundfonts.get(font_filename)
+            entry = self._find_pinned_preset(font_id, bank, program)
+            if not entry or owner not in entry['owners']:
+                return False
+            entry['owners'].discard(owner)
+            if entry['owners']:
+                return False
+            lib.fluid_synth_unpin_preset(self.synth, font_id, bank, program)
+            self.pinned_sounds.remove(entry)
+            return True
+
+    def unpin_all_sounds(self, owner=None):
+        """
+        Remove all pins of the owner, or all pins of everyone if owner is None
+        """
+        with self._lock:
+            pinned = []
+            for entry in self.pinned_sounds:
+                if owner is not None:
+                    entry['owners'].discard(owner)
+                    if entry['owners']:
+                        pinned.append(entry)
+                        continue
+                lib.fluid_synth_unpin_preset(self.synth, entry['font_id'], entry['bank'], entry['program'])
+            self.pinned_sounds = pinned
 
     def _find_pinned_preset(self, font_id, bank=None, program=None):
         for entry in self.pinned_sounds:
@@ -146,16 +348,26 @@ class FluidSynth(object):
                 return entry
 
     def clear_all_channel_sounds(self):
-        for channel, _sfid in self.channels.items():
-            ret = lib.fluid_synth_unset_program(self.synth, channel)
-            if ret != lib.FLUID_OK:
-                log.error('Unable to clear channel sound %s', channel)
-        self.channels = {}
+        for channel in list(self._pending_channels):
+            self._cancel_pending_channel(channel)
+        with self._lock:
+            for channel, _sfid in self.channels.items():
+                ret = lib.fluid_synth_unset_program(self.synth, channel)
+                if ret != lib.FLUID_OK:
+                    log.error('Unable to clear channel sound %s', channel)
+            self.channels = {}
 
     def set_channel_fine_tune(self, channel, value):
         """
         value range is +-100 (cent)
         """
+        self.send_commands(self.fine_tune_commands(channel, value))
+
+    def fine_tune_commands(self, channel, value):
+        """
+        Return the commands to set the fine tune of the channel, see
+        send_commands()
+        """
         fine_tune = int((2**14 / 200.0) * (value + 100))
         if fine_tune < 0:
             fine_tune = 0
@@ -165,13 +377,57 @@ class FluidSynth(object):
         msb = fine_tune >> 7
         lsb = fine_tune & 0x7F
 
-        # set RPN to fine tune
-        lib.fluid_synth_cc(self.synth, channel, 101, 0)
-        lib.fluid_synth_cc(self.synth, channel, 100, 1)
+        return [
+            # set RPN to fine tune
+            self.cc_command(channel, 101, 0),
+            self.cc_command(channel, 100, 1),
+
+            # send data
+            self.cc_command(channel, 6, msb),
+            self.cc_command(channel, 38, lsb),
+        ]
 
-        # send data
-        lib.fluid_synth_cc(self.synth, channel, 6, msb)
-        lib.fluid_synth_cc(self.synth, channel, 38, lsb)
+    def cc_command(self, channel, ctrl, val):
+        return (channel, 'cc', ctrl, val)
+
+    def program_select_command(self, channel, font_id, bank, preset):
+        return (channel, 'program_select', font_id, bank * 128 + preset)
+
+    def send_commands(self, commands):
+        """
+        Send a list of (channel, type, data1, data2) commands, as returned by
+        the *_command() methods, to the synth.
+
+        If a command_sender is set (see MGCore.send_synth_commands), the
+        commands are applied in a single native call without the core worker
+        writing to the synth in between. Otherwise, e.g. when rendering
+        offline without the core, they are sent to the synth one by one.
+        """
+        if not commands:
+            return
+        if self.command_sender:
+            failed = self.command_sender(self.synth, commands)
+        else:
+            failed = self._send_commands_direct(commands)
+        if failed:
+            raise FluidSynthError('Synth command %s failed' % (commands[failed - 1],))
+
+    def _send_commands_direct(self, commands):
+        failed = 0
+        for i, (channel, cmd_type, data1, data2) in enumerate(commands):
+            if cmd_type == 'cc':
+                ret = lib.fluid_synth_cc(self.synth, channel, data1, data2)
+            elif cmd_type == 'pitch_wheel_sens':
+                ret = lib.fluid_synth_pitch_wheel_sens(self.synth, channel, data1)
+            elif cmd_type == 'program_select':
+                ret = lib.fluid_synth_program_select(self.synth, channel, data1, data2 // 128, data2 % 128)
+            elif cmd_type == 'unset_program':
+                ret = lib.fluid_synth_unset_program(self.synth, channel)
+            else:
+                ret = lib.FLUID_FAILED
+            if ret != lib.FLUID_OK and not failed:
+                failed = i + 1
+        return failed
 
     def select_program(self, channel, font_id, bank, preset):
         ret = lib.fluid_synth_program_select(self.synth, channel, font_id, bank, preset)
@@ -185,10 +441,31 @@ class FluidSynth(object):
                                    args['width'], args['level'])
 
     def set_channel_volume(self, channel, volume):
-        self._send_cc(channel, 7, volume)
+        self.send_commands([self.cc_command(channel, 7, volume)])
 
     def set_channel_panning(self, channel, panning):
-        self._send_cc(channel, 8, panning)
+        self.send_commands([self.cc_command(channel, 8, panning)])
+
+    def noteon(self, channel, key, velocity):
+        ret = lib.fluid_synth_noteon(self.synth, channel, key, velocity)
+        if ret != lib.FLUID_OK:
+            raise FluidSynthError('Unable to start note %s on channel %s' % (key, channel))
+
+    def noteoff(self, channel, key):
+        lib.fluid_synth_noteoff(self.synth, channel, key)
+
+    def set_interp_method(self, channel, method):
+        """
+        Set the sample interpolation of the channel, one of INTERP_METHODS.
+        Lower orders need less CPU per voice.
+        """
+        try:
+            interp = INTERP_METHODS[method]
+        except KeyError:
+            raise FluidSynthError('Invalid interpolation method %s' % method)
+        ret = lib.fluid_synth_set_interp_method(self.synth, channel, interp)
+        if ret != lib.FLUID_OK:
+            raise FluidSynthError('Unable to set interpolation of channel %s' % channel)
 
     def set_pitch_bend_range(self, channel, semitones):
         ret = lib.fluid_synth_pitch_wheel_sens(self.synth, channel, semitones)
@@ -198,21 +475,77 @@ class FluidSynth(object):
     def get_cpu_load(self):
         return lib.fluid_synth_get_cpu_load(self.synth)
 
+    def get_active_voice_count(self):
+        return lib.fluid_synth_get_active_voice_count(self.synth)
+
+    def get_polyphony(self):
+        return lib.fluid_synth_get_polyphony(self.synth)
+
+    def set_polyphony(self, polyphony):
+        ret = lib.fluid_synth_set_polyphony(self.synth, int(polyphony))
+        if ret != lib.FLUID_OK:
+            raise FluidSynthError('Unable to set polyphony to %s' % polyphony)
+
+    def set_important_channels(self, channels):
+        """
+        Set the channels whose voices are kept longest when the synth runs
+        out of voices
+        """
+        self.configure({
+            'synth.overflow.important-channels': ','.join(str(c) for c in sorted(channels)),
+        })
+
     def get_gain(self):
         return lib.fluid_synth_get_gain(self.synth)
 
     def set_gain(self, gain):
         lib.fluid_synth_set_gain(self.synth, float(gain))
 
-    def start(self):
+    def get_sample_rate(self):
+        value = ffi.new('double *')
+        if lib.fluid_settings_getnum(self.settings, b'synth.sample-rate', value) != lib.FLUID_OK:
+            raise FluidSynthError('Unable to get sample rate')
+        return value[0]
+
+    def start(self, audio=True):
+        """
+        Create the synthesizer and the audio driver. With audio=False, no audio
+        driver is created and the output has to be rendered with render().
+        """
         if self.synth:
             raise FluidSynthError('Already started!')
         self.synth = lib.new_fluid_synth(self.settings)
         if not self.synth:
             raise FluidSynthError('Unable to create synthesizer')
-        self.start_audio_driver()
+        if audio:
+            self.start_audio_driver()
+
+    def render(self, frames, block_size=64):
+        """
+        Render the given number of stereo frames as fast as possible and return
+        them as interleaved float samples in an array('f'). The synth is run in
+        blocks of block_size frames, which should match the audio period size
+        to get the same effects and CPU cost as with an audio driver.
+
+        Only possible if the synth was started without audio driver.
+        """
+        if not self.synth:
+            raise FluidSynthError('Not started!')
+        if self.adriver:
+            raise FluidSynthError('Unable to render while the audio driver is running')
+        samples = array.array('f', [0.0]) * (frames * 2)
+        buf = ffi.cast('float *', ffi.from_buffer(samples))
+        for offset in range(0, frames, block_size):
+            length = min(block_size, frames - offset)
+            ret = lib.fluid_synth_write_float(self.synth, length,
+                                              buf, offset * 2, 2,
+                                              buf, offset * 2 + 1, 2)
+            if ret != lib.FLUID_OK:
+                raise FluidSynthError('Unable to render audio')
+        return samples
 
     def stop(self):
+        self._loader.shutdown(wait=True)
         self.stop_audio_driver()
 
         if self.synth:
@@ -235,11 +568,6 @@ class FluidSynth(object):
         lib.delete_fluid_audio_driver(self.adriver)
         self.adriver = None
 
-    def _send_cc(self, channel, ctrl, val):
-        ret = lib.fluid_synth_cc(self.synth, channel, ctrl, val)
-        if ret != lib.FLUID_OK:
-            raise FluidSynthError('Unable to set cc')
-
     @property
     def ladspa(self):
         if not self._ladspa:
@@ -253,13 +581,123 @@ class FluidSynth(object):
         self.stop()
 
 
+def graph_structure(graph):
+    """
+    Return the parts of an effect graph that can't be changed while the
+    effects are active
+    """
+    return (
+        tuple(graph.get('buffers', [])),
+        tuple((effect['name'], effect['library'], effect.get('plugin'), bool(effect.get('mix')),
+               tuple(effect.get('links', {}).items()), tuple(sorted(effect.get('controls', {}))))
+              for effect in graph['effects']),
+    )
+
+
+def write_wav(filename, samples, sample_rate):
+    """
+    Write interleaved stereo float samples, as returned by FluidSynth.render(),
+    to a 16-bit WAV file
+    """
+    pcm = array.array('h', (int(max(-1.0, min(1.0, sample)) * 32767) for sample in samples))
+    if sys.byteorder == 'big':
+        pcm.byteswap()
+    with wave.open(filename, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(int(sample_rate))
+        f.writeframes(pcm.tobytes())
+
+
 class LADSPA:
     def __init__(self, fx):
         self.fx = fx
+        # the last effect graph passed to apply()
+        self.graph = None
+        self.bypassed = False
+        self._was_active = False
+        self._lock = threading.RLock()
+
+    def apply(self, graph):
+        """
+        Apply an effect graph, described as data (see
+        mg.fluidsynth.config.DEFAULT_EFFECTS). Only the differences to the
+        previously applied graph are sent to FluidSynth: changed controls and
+        mix gains are set on the running effects.
+
+        Adding or removing effects, controls, links or buffers requires
+        rebuilding the whole graph, as FluidSynth can only change those while
+        the effects are inactive. Returns True if the graph was rebuilt.
+        """
+        with self._lock:
+            try:
+                if self.graph is None or graph_structure(graph) != graph_structure(self.graph):
+                    self._build(graph)
+                    rebuilt = True
+                else:
+                    self._update(graph)
+                    rebuilt = False
+            except Exception:
+                # state of the effects is unknown, rebuild on the next apply
+                self.graph = None
+                raise
+            self.graph = copy.deepcopy(graph)
+            return rebuilt
+
+    def _build(self, graph):
+        self.reset()
+        for name in graph.get('buffers', []):
+            self.add_buffer(name)
+        for effect in graph['effects']:
+            name = effect['name']
+            self.add_effect(name, effect['library'], effect.get('plugin'),
+                            effect.get('mix', False), effect.get('mix_gain', 1.0))
+            for port, target in effect.get('links', {}).items():
+                self.link_effect(name, port, target)
+            for port, value in effect.get('controls', {}).items():
+                self.set_control(name, port, value)
+        if graph['effects']:
+            if self.bypassed:
+                self._was_active = True
+            else:
+                self.activate()
+
+    def _update(self, graph):
+        previous = {effect['name']: effect for effect in self.graph['effects']}
+        for effect in graph['effects']:
+            name = effect['name']
+            prev = previous[name]
+            for port, value in effect.get('controls', {}).items():
+                if prev['controls'][port] != value:
+                    self.set_control(name, port, value)
+            gain = effect.get('mix_gain', 1.0)
+            if effect.get('mix') and gain != prev.get('mix_gain', 1.0):
+                self.mix_effect(name, gain)
 
     def is_active(self):
         return lib.fluid_ladspa_is_active(self.fx)
 
+    def bypass(self):
+        """
+        Stop processing the effects, e.g. while the synth is silent. The
+        effect graph and all control values are kept for resume().
+        """
+        with self._lock:
+            if self.bypassed:
+                return
+            self._was_active = bool(self.is_active())
+            if self._was_active:
+                self.deactivate()
+            self.bypassed = True
+
+    def resume(self):
+        with self._lock:
+            if not self.bypassed:
+                return
+            self.bypassed = False
+            if self._was_active:
+                self.activate()
+
     def activate(self):
         ret = lib.fluid_ladspa_activate(self.fx)
         if ret != lib.FLUID_OK:
@@ -0,0 +1,92 @@
+"""
+The FluidSynth settings and effects used on the MidiGurdy. Shared by the
+main process and the offline renderer, so that both produce the same sound
+at the same CPU cost.
+"""
+
+SYNTH_CONFIG = {
+    'audio.driver': 'alsa',
+    'audio.periods': 2,
+    'audio.period-size': 64,
+    'audio.realtime-prio': 51,
+    'synth.reverb.active': 0,
+    'synth.chorus.active': 0,
+    'synth.ladspa.active': 1,
+    'synth.overflow.important': 50000,
+    # the strings use two banks of ten channels, see SynthController
+    'synth.midi-channels': 32,
+    'synth.overflow.important-channels': '4,5,6,7,8,9,14,15,16,17,18,19',
+    'synth.min-note-length': 0,
+    'synth.verbose': 0,
+    'synth.polyphony': 64,
+    'synth.dynamic-sample-loading': 1,
+}
+
+
+# Sample interpolation of the voices set to 'auto'. The sustained drone and
+# trompette sounds don't need more than linear interpolation, which saves
+# CPU for the melody strings.
+INTERPOLATION_DEFAULTS = {
+    'melody': '7th',
+    'drone': 'linear',
+    'trompette': 'linear',
+    'keynoise': 'linear',
+}
+
+
+def voice_interpolation(voice_type, interpolation):
+    """
+    Return the interpolation method to use for a voice
+    """
+    if not interpolation or interpolation == 'auto':
+        return INTERPOLATION_DEFAULTS[voice_type]
+    return interpolation
+
+
+# The LADSPA effect graph. Links map effect ports to FluidSynth's audio
+# nodes or to the extra buffers. Reverb names the effect that is controlled
+# by the reverb volume and panning settings.
+DEFAULT_EFFECTS = {
+    'buffers': [],
+    'effects': [
+        {
+            'name': 'e1',
+            'library': '/usr/lib/ladspa/filter.so',
+            'plugin': 'hpf',
+            'mix': False,
+            'mix_gain': 1.0,
+            'links': {
+                'Input': 'Reverb:Send',
+                'Output': 'Reverb:Send',
+            },
+            'controls': {
+                'Cutoff': 220,
+            },
+        },
+        {
+            'name': 'sympa',
+            'library': '/usr/lib/ladspa/sympathetic.so',
+            'plugin': None,
+            'mix': True,
+            'mix_gain': 1.0,
+            'links': {
+                'Input': 'Reverb:Send',
+                'Output Left': 'Main:L',
+                'Output Right': 'Main:R',
+            },
+            'controls': {
+                'Damping': 0.06,
+                'Wet Left': 1.0,
+                'Wet Right': 1.0,
+            },
+        },
+    ],
+    'reverb': 'sympa',
+}
+
+
+def add_effects(synth, graph=None):
+    """
+    Set up and activate the LADSPA effects on the started synth
+    """
+    synth.ladspa.apply(graph or DEFAULT_EFFECTS)
@@ -45,6 +45,7 @@ int fluid_settings_get_type(fluid_settings_t* settings, const char *name);
 int fluid_settings_setstr(fluid_settings_t* settings, const char *name, const char *str);
 int fluid_settings_setnum(fluid_settings_t* settings, const char *name, double val);
 int fluid_settings_setint(fluid_settings_t* settings, const char *name, int val);
+int fluid_settings_getnum(fluid_settings_t* settings, const char *name, double* val);
 
 int fluid_synth_noteon(fluid_synth_t* synth, int chan, int key, int vel);
 int fluid_synth_noteoff(fluid_synth_t* synth, int chan, int key);
@@ -67,6 +68,23 @@ void fluid_synth_set_gain(fluid_synth_t* synth, float gain);
 float fluid_synth_get_gain(fluid_synth_t* synth);
 
 double fluid_synth_get_cpu_load(fluid_synth_t* synth);
+int fluid_synth_get_active_voice_count(fluid_synth_t* synth);
+int fluid_synth_get_polyphony(fluid_synth_t* synth);
+int fluid_synth_set_polyphony(fluid_synth_t* synth, int polyphony);
+
+enum fluid_interp {
+  FLUID_INTERP_NONE,
+  FLUID_INTERP_LINEAR,
+  FLUID_INTERP_4THORDER,
+  FLUID_INTERP_7THORDER,
+  ...
+};
+
+int fluid_synth_set_interp_method(fluid_synth_t* synth, int chan, int interp_method);
+
+int fluid_synth_write_float(fluid_synth_t* synth, int len,
+                            void* lout, int loff, int lincr,
+                            void* rout, int roff, int rincr);
 
 
 typedef int (*handle_midi_event_func_t)(void* data, fluid_midi_event_t* event);
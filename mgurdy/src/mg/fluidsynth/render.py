@@ -0,0 +1,82 @@
+import time
+
+from .api import FluidSynth, write_wav
+from .config import SYNTH_CONFIG, add_effects, voice_interpolation
+
+
+# first synth channel of each voice type, see State
+VOICE_CHANNELS = {
+    'melody': 0,
+    'drone': 3,
+    'trompette': 6,
+}
+
+
+class PresetRenderer(object):
+    """
+    Renders presets offline, as fast as FluidSynth can, with the same synth
+    settings and effects as on the instrument. All unmuted melody, drone and
+    trompette voices of a preset play their base note for the given time.
+
+    The render time per second of audio is the CPU cost of the preset: 1.0
+    means the preset only just plays in realtime on this machine.
+    """
+    def __init__(self, soundfont_dir, effects=True, config=None):
+        self.fluid = FluidSynth(soundfont_dir, config=dict(SYNTH_CONFIG, **(config or {})))
+        self.fluid.start(audio=False)
+        if effects:
+            add_effects(self.fluid)
+        self.sample_rate = self.fluid.get_sample_rate()
+        self.block_size = int(SYNTH_CONFIG['audio.period-size'])
+        self.channels = []
+
+    def stop(self):
+        self.fluid.stop()
+
+    def set_voices(self, voices):
+        """
+        Configure and start the voices of the preset data 'voices' dict
+        """
+        self.silence()
+        for voice_type, start_channel in VOICE_CHANNELS.items():
+            for i, voice in enumerate(voices.get(voice_type, [])):
+                if not voice.get('soundfont') or voice.get('muted', True):
+                    continue
+                channel = start_channel + i
+                self.fluid.set_channel_sound(channel, voice['soundfont'],
+                                             voice['bank'], voice['program'])
+                self.fluid.set_channel_volume(channel, voice.get('volume', 100))
+                self.fluid.set_channel_panning(channel, voice.get('panning', 64))
+                self.fluid.set_interp_method(channel, voice_interpolation(voice_type, voice.get('interpolation')))
+                self.fluid.noteon(channel, voice.get('note', 60), 127)
+                self.channels.append(channel)
+
+    def silence(self):
+        # all sound off, so that no voices of the previous preset remain
+        self.fluid.send_commands([self.fluid.cc_command(channel, 120, 0)
+                                  for channel in self.channels])
+        self.fluid.clear_all_channel_sounds()
+        self.channels = []
+
+    def render(self, seconds):
+        """
+        Render the given number of seconds and return a tuple of the samples
+        and the render time per second of audio
+        """
+        frames = int(seconds * self.sample_rate)
+        started = time.perf_counter()
+        samples = self.fluid.render(frames, self.block_size)
+        elapsed = time.perf_counter() - started
+        return samples, elapsed / (frames / self.sample_rate)
+
+    def render_preset(self, data, seconds, filename=None):
+        """
+        Render the preset data and return the render time per second of audio.
+        Writes the audio to a WAV file if filename is given.
+        """
+        self.set_voices(data.get('voices', {}))
+        samples, cost = self.render(seconds)
+        self.silence()
+        if filename:
+            write_wav(filename, samples, self.sample_rate)
+        return cost
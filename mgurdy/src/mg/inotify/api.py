@@ -0,0 +1,65 @@
+import collections
+import os
+import select
+import struct
+
+from ._inotify import lib, ffi
+
+
+EVENT_HEADER = struct.Struct('iIII')
+
+Event = collections.namedtuple('Event', ['wd', 'mask', 'cookie', 'name'])
+
+
+class INotify:
+    """
+    Thin wrapper around the Linux inotify API
+    """
+    def __init__(self):
+        self.fd = lib.inotify_init1(lib.IN_CLOEXEC | lib.IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ffi.errno, 'Unable to initialize inotify: {}'.format(
+                os.strerror(ffi.errno)))
+
+    def add_watch(self, path, mask):
+        wd = lib.inotify_add_watch(self.fd, path.encode(), mask)
+        if wd < 0:
+            raise OSError(ffi.errno, 'Unable to watch {}: {}'.format(
+                path, os.strerror(ffi.errno)))
+        return wd
+
+    def rm_watch(self, wd):
+        if lib.inotify_rm_watch(self.fd, wd) < 0:
+            raise OSError(ffi.errno, 'Unable to remove watch {}: {}'.format(
+                wd, os.strerror(ffi.errno)))
+
+    def read(self, timeout=None):
+        """
+        Wait up to timeout seconds for events and return them as a list
+        of Event tuples. Returns an empty list on timeout.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, size = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = data[pos:pos + size].rstrip(b'\0').decode(errors='replace')
+            pos += size
+            events.append(Event(wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def fileno(self):
+        return self.fd
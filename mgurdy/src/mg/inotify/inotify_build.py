@@ -0,0 +1,44 @@
+import cffi
+
+ffibuilder = cffi.FFI()
+
+ffibuilder.set_source(
+    "mg.inotify._inotify", r"""
+
+    #include <sys/inotify.h>
+
+    """)
+
+
+ffibuilder.cdef(r"""
+    #define IN_NONBLOCK ...
+    #define IN_CLOEXEC ...
+
+    #define IN_ACCESS ...
+    #define IN_MODIFY ...
+    #define IN_ATTRIB ...
+    #define IN_CLOSE_WRITE ...
+    #define IN_CLOSE_NOWRITE ...
+    #define IN_OPEN ...
+    #define IN_MOVED_FROM ...
+    #define IN_MOVED_TO ...
+    #define IN_CREATE ...
+    #define IN_DELETE ...
+    #define IN_DELETE_SELF ...
+    #define IN_MOVE_SELF ...
+
+    #define IN_UNMOUNT ...
+    #define IN_Q_OVERFLOW ...
+    #define IN_IGNORED ...
+
+    #define IN_ONLYDIR ...
+    #define IN_ISDIR ...
+
+    int inotify_init1(int flags);
+    int inotify_add_watch(int fd, const char *pathname, uint32_t mask);
+    int inotify_rm_watch(int fd, int wd);
+""")
+
+
+if __name__ == "__main__":
+    ffibuilder.compile(verbose=True)
@@ -0,0 +1,224 @@
+import logging
+import threading
+import time
+
+from mg import db
+from mg.fluidsynth.api import FluidSynthError
+from mg.fluidsynth.config import SYNTH_CONFIG
+
+
+log = logging.getLogger('latency')
+
+
+# period sizes tried by the calibration, from lowest to highest latency
+PERIOD_SIZES = (32, 64, 128, 256)
+
+# channels not used by the string channel banks, see SynthController
+STRESS_CHANNELS = range(20, 32)
+
+
+def default_config():
+    return {
+        'periods': SYNTH_CONFIG['audio.periods'],
+        'period_size': SYNTH_CONFIG['audio.period-size'],
+    }
+
+
+def synth_config(config):
+    """
+    Return the FluidSynth settings for the audio config
+    """
+    return {
+        'audio.periods': config['periods'],
+        'audio.period-size': config['period_size'],
+    }
+
+
+class LatencyTuner(object):
+    """
+    Finds the smallest audio period size that plays a stress load without
+    xruns and with enough CPU headroom, and stores it as audio config that is
+    used on the next boots.
+
+    The stress load plays a chord with each sound of the active preset on the
+    channels that are not used by the strings, which saturates the polyphony.
+    As FluidSynth doesn't report xruns, a CPU load sample of 100% or more
+    counts as xrun (see mg.telemetry).
+    """
+    # seconds to let the load settle after restarting the audio driver
+    SETTLE_TIME = 0.5
+
+    def __init__(self):
+        self.fluid = None
+        self.state = None
+        self.config = default_config()
+        self.results = []
+        # outcome of the last background calibration
+        self.calibrated = None
+        self.error = None
+        self.thread = None
+        self.running = threading.Lock()
+
+    def setup(self, fluid, state, config=None):
+        self.fluid = fluid
+        self.state = state
+        self.config = config or default_config()
+
+    def stress_sounds(self):
+        sounds = []
+        for voice in self.state.preset.voices:
+            if voice.soundfont_id:
+                sounds.append((voice.soundfont_id, voice.bank, voice.program))
+        return sounds
+
+    def calibrate(self, duration=5.0, headroom=20.0, periods=2, notes_per_channel=4):
+        """
+        Measure all period sizes until a stable one is found, then apply and
+        save it. A period size the audio driver can't be started with counts
+        as unstable. Returns the new config, or None if no period size was
+        stable and the previous config was kept.
+
+        Blocks for duration plus SETTLE_TIME seconds per measured period
+        size, see start_calibration() to run it in the background.
+        """
+        sounds = self._begin()
+        try:
+            return self._calibrate(sounds, duration, headroom, periods, notes_per_channel)
+        finally:
+            self.running.release()
+
+    def start_calibration(self, **kwargs):
+        """
+        Run calibrate() in a background thread. The progress and outcome are
+        reported by to_dict().
+        """
+        sounds = self._begin()
+        self.thread = threading.Thread(target=self._calibrate_in_background,
+                                       args=(sounds,), kwargs=kwargs, name='mg-calibration')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _begin(self):
+        if not self.running.acquire(blocking=False):
+            raise RuntimeError('Calibration already running')
+        sounds = self.stress_sounds()
+        if not sounds:
+            self.running.release()
+            raise RuntimeError('The active preset has no sounds')
+        self.results = []
+        self.calibrated = None
+        self.error = None
+        return sounds
+
+    def _calibrate_in_background(self, sounds, **kwargs):
+        try:
+            self._calibrate(sounds, **kwargs)
+        except Exception as e:
+            log.exception('Audio calibration failed')
+            self.error = str(e)
+        finally:
+            self.running.release()
+
+    def _calibrate(self, sounds, duration=5.0, headroom=20.0, periods=2, notes_per_channel=4):
+        previous = self.config
+        best = None
+        self.start_stress(sounds, notes_per_channel)
+        try:
+            for period_size in PERIOD_SIZES:
+                config = {'periods': periods, 'period_size': period_size}
+                try:
+                    result = self.measure(config, duration)
+                except FluidSynthError as e:
+                    log.warning('Period size {} failed: {}'.format(period_size, e))
+                    self.results.append(dict(config, error=str(e), stable=False))
+                    continue
+                result['stable'] = not result['xruns'] and result['max_cpu_load'] <= 100 - headroom
+                self.results.append(result)
+                log.info('Period size {}: {}'.format(period_size, result))
+                if result['stable']:
+                    best = config
+                    break
+        finally:
+            try:
+                self.stop_stress()
+            finally:
+                # the driver runs with the last measured config, which is
+                # only kept if it was stable
+                if best is None:
+                    self.apply(previous)
+        if best is None:
+            log.warning('No stable audio period size found, keeping {}'.format(previous))
+            self.calibrated = False
+            return None
+        db.save_audio_config(best)
+        self.calibrated = True
+        return best
+
+    def measure(self, config, duration, interval=0.05):
+        self.apply(config)
+        time.sleep(self.SETTLE_TIME)
+        loads = []
+        end = time.time() + duration
+        while time.time() < end:
+            loads.append(self.fluid.get_cpu_load())
+            time.sleep(interval)
+        return {
+            'periods': config['periods'],
+            'period_size': config['period_size'],
+            'latency': round(self.latency(config), 2),
+            'max_cpu_load': round(max(loads), 1),
+            'mean_cpu_load': round(sum(loads) / len(loads), 1),
+            'xruns': sum(1 for load in loads if load >= 100),
+        }
+
+    def latency(self, config):
+        """
+        Return the output latency of the audio config in milliseconds
+        """
+        return config['periods'] * config['period_size'] * 1000.0 / self.fluid.get_sample_rate()
+
+    def apply(self, config):
+        """
+        Restart the audio driver with the audio config
+        """
+        self.fluid.stop_audio_driver()
+        self.fluid.configure(synth_config(config))
+        self.fluid.start_audio_driver()
+        self.config = dict(config)
+
+    def reset(self):
+        if not self.running.acquire(blocking=False):
+            raise RuntimeError('Calibration running')
+        try:
+            db.delete_audio_config()
+            self.apply(default_config())
+        finally:
+            self.running.release()
+
+    def start_stress(self, sounds, notes_per_channel):
+        for i, channel in enumerate(STRESS_CHANNELS):
+            font, bank, program = sounds[i % len(sounds)]
+            self.fluid.set_channel_sound(channel, font, bank, program)
+            for note in range(notes_per_channel):
+                self.fluid.noteon(channel, 48 + i + note * 7, 100)
+
+    def stop_stress(self):
+        # all sound off, then remove the stress sounds again
+        self.fluid.send_commands([self.fluid.cc_command(channel, 120, 0)
+                                  for channel in STRESS_CHANNELS])
+        for channel in STRESS_CHANNELS:
+            self.fluid.clear_channel_sound(channel)
+
+    def to_dict(self):
+        return {
+            'config': self.config,
+            'latency': round(self.latency(self.config), 2) if self.fluid else None,
+            'default': default_config(),
+            'calibrating': self.running.locked(),
+            'calibrated': self.calibrated,
+            'error': self.error,
+            'results': self.results,
+        }
+
+
+tuner = LatencyTuner()
@@ -51,7 +51,14 @@ def start(args):
 
     menu, input_manager, event_handler = start_ui(state, settings, args.debug)
 
-    fluid = FluidSynth(settings.sound_dir)
+    fluid = FluidSynth(settings.sound_dir,
+                       font_cache_size=settings.font_cache_size * 1024 * 1024)
+
+    # listens before the synth controller, so that its pins of a replaced
+    # SoundFont are gone when the controller unloads the unused fonts
+    from mg.predictor import PresetPredictor
+    predictor = PresetPredictor(fluid, state)
+    predictor.start_listening()
 
     synth_ctrl = SynthController(fluid, state)
     synth_ctrl.start_listening()
@@ -66,18 +73,6 @@ def start(args):
     midi_ctrl = MIDIController(input_manager)
     midi_ctrl.start_listening()
 
-    menu.message('Starting synthesizer')
-    start_fluidsynth(
-        fluid,
-        dump_midi=args.dump_midi,
-        debug=args.debug_fs)
-
-    menu.message('Starting core')
-    from mg.mglib import mgcore
-    mgcore.start()
-    mgcore.add_fluid_output(fluid.synth)
-    mgcore.enable_fluid_output()
-
     menu.message('Opening database')
     from mg import db
     import logging
@@ -89,16 +84,36 @@ def start(args):
         log.exception('Unable to initialize database!')
     db.migrate(db_path)
 
+    # the audio config found by the latency calibration, if any
+    audio_config = db.load_audio_config()
+    effects = db.load_effects()
+
+    menu.message('Starting synthesizer')
+    audio_config = start_fluidsynth(
+        fluid,
+        dump_midi=args.dump_midi,
+        debug=args.debug_fs,
+        audio_config=audio_config,
+        effects=effects)
+
+    from mg.latency import tuner
+    tuner.setup(fluid, state, audio_config)
+
+    menu.message('Starting core')
+    from mg.mglib import mgcore
+    mgcore.start()
+    mgcore.add_fluid_output(fluid.synth)
+    mgcore.enable_fluid_output()
+    fluid.command_sender = mgcore.send_synth_commands
+
     # restore key calibration
     from mg.input import calibration
     key_calib = calibration.load_keys()
     calibration.commit_keys(key_calib)
 
     # restore mapping ranges
-    for name in mgcore.get_mapping_configs().keys():
-        ranges = db.load_mapping_ranges(name)
-        if ranges:
-            mgcore.set_mapping_ranges(name, ranges)
+    ranges = db.load_all_mapping_ranges(mgcore.get_mapping_configs().keys())
+    mgcore.set_all_mapping_ranges({name: r for name, r in ranges.items() if r})
 
     # set default global settings
     state.main_volume = 120
@@ -123,8 +138,31 @@ def start(args):
     except db.Preset.DoesNotExist:
         pass
 
+    predictor.start()
+
+    from mg.telemetry import telemetry
+    telemetry.setup(fluid, state)
+    telemetry.start()
+
+    if settings.adaptive_polyphony:
+        from mg.polyphony import PolyphonyController
+        polyphony_ctrl = PolyphonyController(fluid, state)
+        polyphony_ctrl.start_listening()
+        polyphony_ctrl.start()
+
+    if settings.effects_idle_bypass:
+        from mg.bypass import bypass
+        bypass.setup(fluid)
+        bypass.start()
+
+    from mg.watcher import SoundDirWatcher
+    try:
+        SoundDirWatcher(state).start()
+    except Exception:
+        log.exception('Unable to watch sound directory!')
+
     menu.message('Starting server')
-    start_server(state, menu)
+    start_server(state, menu, synth_ctrl)
 
     menu.goto('home')
     input_manager.start()
@@ -133,49 +171,50 @@ def start(args):
 
 
 @background_task()
-def start_server(state, menu):
+def start_server(state, menu, synth):
     from mg.server.web import WebServer
     from mg.server.websocket import WebSocketServer
 
-    web = WebServer(state=state, menu=menu, port=settings.http_port)
+    web = WebServer(state=state, menu=menu, synth=synth, port=settings.http_port)
     web.start()
     ws = WebSocketServer()
     ws.start()
 
 
-def start_fluidsynth(synth, dump_midi, debug=False):
+def start_fluidsynth(synth, dump_midi, debug=False, audio_config=None, effects=None):
+    """
+    Start the synth with the saved audio config and effects, falling back to
+    the defaults if they don't work. Returns the audio config in use, or None
+    for the default one.
+    """
+    from mg.fluidsynth.api import FluidSynthError
+    from mg.fluidsynth.config import SYNTH_CONFIG, add_effects
+    from mg.latency import default_config, synth_config
+
     if debug:
         synth.set_logger()
-    synth.configure({
-        'audio.driver': 'alsa',
-        'audio.periods': 2,
-        'audio.period-size': 64,
-        'audio.realtime-prio': 51,
-        'synth.reverb.active': 0,
-        'synth.chorus.active': 0,
-        'synth.ladspa.active': 1,
-        'synth.overflow.important': 50000,
-        'synth.overflow.important-channels': '4,5,6,7,8,9',
-        'synth.min-note-length': 0,
-        'synth.verbose': 1 if dump_midi else 0,
-        'synth.polyphony': 64,
-        'synth.dynamic-sample-loading': 1,
-    })
-    synth.start()
-
-    # FIXME: make the effects configurable via web
-    synth.ladspa.add_effect('e1', '/usr/lib/ladspa/filter.so', 'hpf')
-    synth.ladspa.link_effect('e1', 'Input', 'Reverb:Send')
-    synth.ladspa.link_effect('e1', 'Output', 'Reverb:Send')
-    synth.ladspa.set_control('e1', 'Cutoff', 220)
-
-    synth.ladspa.add_effect('sympa', '/usr/lib/ladspa/sympathetic.so', mix=True)
-    synth.ladspa.link_effect('sympa', 'Input', 'Reverb:Send')
-    synth.ladspa.link_effect('sympa', 'Output Left', 'Main:L')
-    synth.ladspa.link_effect('sympa', 'Output Right', 'Main:R')
-    synth.ladspa.set_control('sympa', 'Damping', 0.06)
-
-    synth.ladspa.activate()
+    config = dict(SYNTH_CONFIG)
+    config['synth.verbose'] = 1 if dump_midi else 0
+    if audio_config:
+        config.update(synth_config(audio_config))
+    synth.configure(config)
+    try:
+        synth.start()
+    except FluidSynthError:
+        if not audio_config or not synth.synth:
+            raise
+        logging.exception('Unable to start audio with the saved audio config, using the defaults')
+        synth.configure(synth_config(default_config()))
+        synth.start_audio_driver()
+        audio_config = None
+    try:
+        add_effects(synth, effects)
+    except Exception:
+        if not effects:
+            raise
+        logging.exception('Unable to set up the saved effects, using the defaults')
+        add_effects(synth)
+    return audio_config
 
 
 def start_ui(state, settings, menu_debug):
@@ -1,4 +1,8 @@
+import array
+import threading
+
 from ._mglib import lib, ffi
+from .sensors import read_recording, synthetic_events
 
 
 STRINGS = {
@@ -27,6 +31,13 @@ PARAMS = {
     'program': lib.MG_PARAM_PROGRAM,
 }
 
+SYNTH_COMMANDS = {
+    'cc': lib.MG_SYNTH_CC,
+    'pitch_wheel_sens': lib.MG_SYNTH_PITCH_WHEEL_SENS,
+    'program_select': lib.MG_SYNTH_PROGRAM_SELECT,
+    'unset_program': lib.MG_SYNTH_UNSET_PROGRAM,
+}
+
 FEATURES = {
     'poly_base_note': lib.MG_FEATURE_POLY_BASE_NOTE,
     'poly_pitch_bend': lib.MG_FEATURE_POLY_PITCH_BEND,
@@ -190,13 +201,115 @@ MAPPINGS = {
 }
 
 
+def _map_ranges(mapping):
+    return [{'src': mapping.ranges[i][0], 'dst': mapping.ranges[i][1]}
+            for i in range(mapping.count)]
+
+
+def _fill_map(mapping, ranges):
+    mapping.count = len(ranges)
+    for i, entry in enumerate(ranges):
+        mapping.ranges[i][0] = entry['src']
+        mapping.ranges[i][1] = entry['dst']
+
+
+# outputs of sensor replays: the outputs of the core, or an output that only
+# counts the messages
+REPLAY_OUTPUTS = ('core', 'null')
+
+
+# tick stages measured by simulations, see struct mg_sim_result
+SIMULATION_STAGES = ('sensors', 'synth', 'model', 'sync')
+
+
+# worker loop steps with duration stats, see struct mg_worker_stats
+WORKER_DURATIONS = ('wakeup', 'tick', 'core_lock', 'state_lock', 'sync')
+
+
+def _duration_stats(stats, count):
+    return {
+        'mean': round(stats.total / count, 1) if count else 0.0,
+        'max': stats.max,
+        'histogram': list(stats.hist),
+    }
+
+
+class StringParamEncoder:
+    """
+    Encodes (string, param, value) configs into a preallocated
+    mg_string_config array. Keeps a copy of the values last sent to the core
+    and only encodes the params whose value has changed, so that handlers can
+    send the complete config of a string without cost.
+
+    All string params are plain state in the core, so sending a value that is
+    already set has no effect and can safely be left out.
+    """
+    def __init__(self):
+        self.index = {(string, param): (string_id, param_id)
+                      for string, string_id in STRINGS.items()
+                      for param, param_id in PARAMS.items()}
+        # one entry per string param, plus the list end sentinel
+        self.buffer = ffi.new('struct mg_string_config[]', len(self.index) + 1)
+        self.sent = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def encode(self, configs):
+        """
+        Fill the buffer with the changed params and return their number.
+        The caller must hold the lock until it has called commit() or
+        invalidate().
+        """
+        self.pending = {}
+        changes = {}
+        total = 0
+        for (string, param, val) in configs:
+            changes[(string, param)] = val
+            total += 1
+        count = 0
+        for key, val in changes.items():
+            if self.sent.get(key) == val:
+                continue
+            string_id, param_id = self.index[key]
+            cfg = self.buffer[count]
+            cfg.string = string_id
+            cfg.param = param_id
+            cfg.val = val
+            self.pending[key] = val
+            count += 1
+        self.buffer[count].param = lib.MG_PARAM_END
+        self.stats['sent'] += count
+        self.stats['suppressed'] += total - count
+        return count
+
+    def commit(self):
+        self.sent.update(self.pending)
+        self.pending = {}
+
+    def invalidate(self):
+        """
+        Forget the sent values, so that all params are sent again
+        """
+        self.sent = {}
+        self.pending = {}
+
+    def reset_stats(self):
+        self.stats = {
+            'sent': 0,
+            'suppressed': 0,
+        }
+
+
 class MGCore:
     FLUID_OUTPUT_NAME = '___FLUID___'
+    CHANNEL_BANK_SIZE = lib.MG_CHANNEL_BANK_SIZE
 
     def __init__(self):
         self.started = False
         self.outputs = {}
         self.halted = 0
+        self.string_params = StringParamEncoder()
 
         if lib.mg_initialize():
             raise RuntimeError('Unable to initialize mgcore')
@@ -242,7 +355,7 @@ class MGCore:
 
     def mute_all(self, muted):
         cfg = [(s, 'mute', 1 if muted else 0) for s in STRINGS]
-        self.set_string_params([cfg])
+        self.set_string_params(cfg)
 
     def halt_outputs(self):
         if lib.mg_halt_outputs(1):
@@ -257,6 +370,42 @@ class MGCore:
         if lib.mg_halt_outputs(0):
             raise RuntimeError('Unable to resume midi output')
 
+    def switch_channel_bank(self, bank, configs=None):
+        """
+        Apply the string params and move the FluidSynth output to the channels
+        of the given bank (0 or 1) in a single step. Bank n uses the channels
+        n * CHANNEL_BANK_SIZE to (n + 1) * CHANNEL_BANK_SIZE - 1.
+        """
+        encoder = self.string_params
+        with encoder.lock:
+            params = encoder.buffer if configs and encoder.encode(configs) else ffi.NULL
+            if lib.mg_switch_channel_bank(bank, params):
+                encoder.invalidate()
+                raise RuntimeError('Unable to switch channel bank')
+            encoder.commit()
+
+    def send_synth_commands(self, fluid, commands):
+        """
+        Send a list of (channel, type, data1, data2) commands to the FluidSynth
+        synth in a single call, without the core worker writing to the synth
+        in between. The command types are the names in SYNTH_COMMANDS.
+
+        Returns 0 on success, otherwise the 1-based index of the first command
+        that failed. All other commands are sent regardless.
+        """
+        count = len(commands)
+        cmds = ffi.new('struct mg_synth_cmd[]', count)
+        for i, (channel, cmd_type, data1, data2) in enumerate(commands):
+            cmd = cmds[i]
+            cmd.channel = channel
+            cmd.type = SYNTH_COMMANDS[cmd_type]
+            cmd.data1 = data1
+            cmd.data2 = data2
+        ret = lib.mg_synth_send(fluid, cmds, count)
+        if ret < 0:
+            raise RuntimeError('Unable to send synth commands')
+        return ret
+
     def get_wheel_gain(self):
         return lib.mg_get_wheel_gain()
 
@@ -280,24 +429,163 @@ class MGCore:
         lib.mg_set_base_note_delay(val)
 
     def set_string_params(self, configs):
-        cfgs = []
-
-        for (string, param, val) in configs:
-            cfgs.append({
-                'string': STRINGS[string],
-                'param': PARAMS[param],
-                'val': val,
-            })
-
-        # add list end sentinel
-        cfgs.append({'param': lib.MG_PARAM_END})
-
-        # print('\nsetting string params------')
-        # for (string, param, val) in configs:
-        #    print('  ', string, param, val)
-
-        params = ffi.new('struct mg_string_config[]', cfgs)
-        lib.mg_set_string(params)
+        """
+        Send the (string, param, value) configs to the core. Params that
+        already have the given value in the core are not sent.
+        """
+        encoder = self.string_params
+        with encoder.lock:
+            if not encoder.encode(configs):
+                return
+            if lib.mg_set_string(encoder.buffer):
+                # the core might have applied some of the params
+                encoder.invalidate()
+            else:
+                encoder.commit()
+
+    def get_string_param_stats(self):
+        """
+        Return the number of string params sent to the core and the number
+        left out because their value was unchanged
+        """
+        with self.string_params.lock:
+            return dict(self.string_params.stats)
+
+    def read_worker_stats(self):
+        """
+        Return a consistent copy of the worker loop stats struct. The worker
+        updates the stats without a lock, see mg_read_worker_stats().
+        """
+        stats = ffi.new('struct mg_worker_stats *')
+        if lib.mg_read_worker_stats(stats):
+            raise RuntimeError('Unable to read worker stats')
+        return stats
+
+    def get_worker_stats(self):
+        """
+        Return the worker loop timing stats in microseconds: the delay of the
+        tick start, the tick duration, the time waiting for the core and
+        state locks and the time to sync the outputs. Histogram bucket 0
+        counts durations below 1us, bucket n those from 2^(n-1)us to below
+        2^n us.
+        """
+        stats = self.read_worker_stats()
+        result = {
+            'ticks': stats.ticks,
+            'deadline_misses': stats.deadline_misses,
+            'buckets': [0] + [2 ** i for i in range(lib.MG_STATS_HIST_SIZE - 1)],
+        }
+        for name in WORKER_DURATIONS:
+            result[name] = _duration_stats(getattr(stats, name), stats.ticks)
+        return result
+
+    def reset_worker_stats(self):
+        """
+        Clear the worker loop stats with the next worker tick
+        """
+        lib.mg_reset_worker_stats()
+
+    def start_recording(self, max_events=500000):
+        """
+        Start recording the raw key and wheel events. Each event takes 12
+        bytes, events beyond max_events are dropped.
+        """
+        if lib.mg_record_start(max_events):
+            raise RuntimeError('Unable to start sensor recording')
+
+    def stop_recording(self, filename=None):
+        """
+        Stop recording and write the events to the file, if given. Returns the
+        number of recorded events.
+        """
+        ret = lib.mg_record_stop(filename.encode() if filename else ffi.NULL)
+        if ret < 0:
+            raise RuntimeError('Unable to stop sensor recording')
+        return ret
+
+    def start_replay(self, filename, speed=1.0, output='core'):
+        """
+        Replay a sensor recording instead of reading the keys and wheel.
+        Speed is relative to realtime and capped at 10 times realtime, output
+        is one of REPLAY_OUTPUTS.
+        """
+        if output not in REPLAY_OUTPUTS:
+            raise RuntimeError(f'Invalid replay output "{output}"')
+        if lib.mg_replay_start(filename.encode(), max(1, int(speed * 100)), 1 if output == 'null' else 0):
+            raise RuntimeError('Unable to start sensor replay')
+
+    def stop_replay(self):
+        if lib.mg_replay_stop():
+            raise RuntimeError('Unable to stop sensor replay')
+
+    def get_replay_status(self):
+        status = ffi.new('struct mg_replay_status *')
+        if lib.mg_replay_get_status(status):
+            raise RuntimeError('Unable to get sensor replay status')
+        return {
+            'active': bool(status.active),
+            'done': bool(status.done),
+            'speed': status.speed / 100,
+            'output': 'null' if status.null_output else 'core',
+            'tick': status.tick,
+            'ticks': status.ticks,
+            'events': status.events,
+            'events_played': status.events_played,
+            'noteon': status.counts.noteon,
+            'noteoff': status.counts.noteoff,
+            'reset': status.counts.reset,
+            'messages': status.counts.messages,
+        }
+
+    def simulate(self, ticks, sensor_source=None, output='null'):
+        """
+        Run the core tick as fast as possible for the given number of ticks,
+        without the worker thread and the input devices. Only possible while
+        the core is not started.
+
+        sensor_source is a SensorEvents buffer or the filename of a sensor
+        recording, by default the wheel turns and keys play a scale. Output is
+        one of REPLAY_OUTPUTS.
+
+        Returns the ticks per second, how much faster than realtime that is
+        and the mean time per tick of each stage in nanoseconds.
+        """
+        if output not in REPLAY_OUTPUTS:
+            raise RuntimeError(f'Invalid simulation output "{output}"')
+        if sensor_source is None:
+            events = synthetic_events(ticks)
+        elif isinstance(sensor_source, str):
+            events = read_recording(sensor_source)
+        else:
+            events = sensor_source
+
+        result = ffi.new('struct mg_sim_result *')
+        buf = ffi.from_buffer(events.data)
+        if lib.mg_simulate(ticks, ffi.cast('struct mg_sensor_event *', buf), len(events),
+                           1 if output == 'null' else 0, result):
+            raise RuntimeError('Unable to run simulation')
+
+        seconds = result.total_ns / 1e9
+        ticks_per_second = result.ticks / seconds if seconds else 0.0
+        stages = {}
+        for name in SIMULATION_STAGES:
+            stage_ns = getattr(result, name + '_ns')
+            stages[name] = {
+                'mean_ns': round(stage_ns / result.ticks) if result.ticks else 0,
+                'share': round(stage_ns / result.total_ns, 3) if result.total_ns else 0.0,
+            }
+        return {
+            'ticks': result.ticks,
+            'events': result.events,
+            'seconds': round(seconds, 3),
+            'ticks_per_second': round(ticks_per_second),
+            'realtime_factor': round(ticks_per_second * lib.WORKER_INTERVAL_US / 1e6, 1),
+            'stages': stages,
+            'noteon': result.counts.noteon,
+            'noteoff': result.counts.noteoff,
+            'reset': result.counts.reset,
+            'messages': result.counts.messages,
+        }
 
     def get_mapping_configs(self):
         return MAPPINGS
@@ -307,43 +595,74 @@ class MGCore:
         mapping = ffi.new('struct mg_map *map')
         if lib.mg_get_mapping(mapping, mapcfg['idx']) != 0:
             raise RuntimeError('Unable to get mapping ranges from core!')
-        ranges = []
-        for i in range(mapping.count):
-            ranges.append({'src': mapping.ranges[i][0],
-                           'dst': mapping.ranges[i][1]})
-        return ranges
+        return _map_ranges(mapping)
 
     def set_mapping_ranges(self, name, ranges):
         mapcfg = MAPPINGS[name]
         mapping = ffi.new('struct mg_map *map')
-        mapping.count = len(ranges)
-        for i, entry in enumerate(ranges):
-            mapping.ranges[i][0] = entry['src']
-            mapping.ranges[i][1] = entry['dst']
+        _fill_map(mapping, ranges)
         if lib.mg_set_mapping(mapping, mapcfg['idx']) != 0:
             raise RuntimeError('Unable to set mapping ranges for %s', name)
 
+    def get_all_mapping_ranges(self):
+        """
+        Return a dict of the ranges of all mappings, read in a single call
+        """
+        mappings = ffi.new('struct mg_map[]', lib.MG_MAP_COUNT)
+        if lib.mg_get_mappings(mappings, lib.MG_MAP_COUNT) != 0:
+            raise RuntimeError('Unable to get mapping ranges from core!')
+        return {name: _map_ranges(mappings[mapcfg['idx']])
+                for name, mapcfg in MAPPINGS.items()}
+
+    def set_all_mapping_ranges(self, ranges):
+        """
+        Set the ranges of several mappings in a single call. Takes a dict of
+        mapping name to ranges, mappings not in the dict are left unchanged.
+        """
+        # mappings with a count of 0 are not changed by the core
+        mappings = ffi.new('struct mg_map[]', lib.MG_MAP_COUNT)
+        for name, mapping_ranges in ranges.items():
+            _fill_map(mappings[MAPPINGS[name]['idx']], mapping_ranges)
+        if lib.mg_set_mappings(mappings, lib.MG_MAP_COUNT) != 0:
+            raise RuntimeError('Unable to set mapping ranges')
+
     def reset_mapping_ranges(self, name):
         mapcfg = MAPPINGS[name]
         if lib.mg_reset_mapping_ranges(mapcfg['idx']) != 0:
             raise RuntimeError('Unable to reset mapping ranges for %s', name)
 
     def get_key_calibration(self):
-        data = []
-        pressure = ffi.new('float *')
-        velocity = ffi.new('float *')
-        for i in range(24):
-            if lib.mg_calibrate_get_key(i, pressure, velocity) != 0:
-                raise RuntimeError('Unable to get key calib data!')
-            data.append({'pressure': float(pressure), 'velocity': float(velocity)})
-        return data
+        values = self.get_key_calibration_array()
+        return [{'pressure': values[i], 'velocity': values[i + 1]}
+                for i in range(0, len(values), 2)]
 
     def set_key_calibration(self, data):
-        for i, data in enumerate(data):
-            if lib.mg_calibrate_set_key(i,
-                                        float(data['pressure']),
-                                        float(data['velocity'])) != 0:
-                raise RuntimeError('Unable to set key calib data!')
+        values = array.array('f')
+        for key in data:
+            values.append(float(key['pressure']))
+            values.append(float(key['velocity']))
+        self.set_key_calibration_array(values)
+
+    def get_key_calibration_array(self):
+        """
+        Return the calibration of all keys as array('f') of pressure and
+        velocity adjust pairs, read in a single call
+        """
+        values = array.array('f', bytes(lib.MG_KEY_COUNT * 2 * ffi.sizeof('float')))
+        if lib.mg_calibrate_get_keys(ffi.cast('float *', ffi.from_buffer(values)), lib.MG_KEY_COUNT) != 0:
+            raise RuntimeError('Unable to get key calib data!')
+        return values
+
+    def set_key_calibration_array(self, values):
+        """
+        Set the calibration of the keys from a buffer of float pressure and
+        velocity adjust pairs, like the one returned by
+        get_key_calibration_array, in a single call
+        """
+        buf = ffi.from_buffer(values)
+        count = len(buf) // (2 * ffi.sizeof('float'))
+        if lib.mg_calibrate_set_keys(ffi.cast('float *', buf), count) != 0:
+            raise RuntimeError('Unable to set key calib data!')
 
     def add_midi_output(self, device):
         if device in self.outputs:
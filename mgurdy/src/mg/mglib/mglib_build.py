@@ -57,6 +57,8 @@ enum mg_map_enum {
     MG_MAP_KEYVEL_TO_TANGENT,
     MG_MAP_KEYVEL_TO_KEYNOISE,
     MG_MAP_CHIEN_THRESHOLD_TO_RANGE,
+
+    MG_MAP_COUNT,
 };
 
 enum mg_feature {
@@ -65,24 +67,105 @@ enum mg_feature {
 };
 
 #define MG_MAP_MAX_RANGES 20
+#define MG_KEY_COUNT 24
+#define MG_CHANNEL_BANK_SIZE 10
 
 struct mg_map {
     int ranges[MG_MAP_MAX_RANGES][2];
     int count;
 };
 
+enum mg_sensor_device {
+    MG_SENSOR_KEYS,
+    MG_SENSOR_WHEEL,
+};
+
+struct mg_sensor_event {
+    uint32_t tick;
+    uint8_t device;
+    uint8_t type;
+    uint16_t code;
+    int32_t value;
+};
+
+struct mg_output_counts {
+    unsigned int noteon;
+    unsigned int noteoff;
+    unsigned int reset;
+    unsigned int messages;
+};
+
+struct mg_replay_status {
+    int active;
+    int done;
+    int speed;
+    int null_output;
+    uint32_t tick;
+    uint32_t ticks;
+    int events;
+    int events_played;
+    struct mg_output_counts counts;
+};
+
+struct mg_sim_result {
+    int ticks;
+    int events;
+    uint64_t total_ns;
+    uint64_t sensors_ns;
+    uint64_t synth_ns;
+    uint64_t model_ns;
+    uint64_t sync_ns;
+    struct mg_output_counts counts;
+};
+
+#define MG_STATS_HIST_SIZE 16
+#define WORKER_INTERVAL_US 1000
+
+struct mg_duration_stats {
+    unsigned long long total;
+    unsigned int max;
+    unsigned int hist[MG_STATS_HIST_SIZE];
+};
+
+struct mg_worker_stats {
+    volatile unsigned int seq;
+    volatile int reset_requested;
+    unsigned int ticks;
+    unsigned int deadline_misses;
+    struct mg_duration_stats wakeup;
+    struct mg_duration_stats tick;
+    struct mg_duration_stats core_lock;
+    struct mg_duration_stats state_lock;
+    struct mg_duration_stats sync;
+};
+
 struct mg_string_config {
     int string;
     int param;
     int val;
 };
 
+enum mg_synth_cmd_enum {
+    MG_SYNTH_CC,
+    MG_SYNTH_PITCH_WHEEL_SENS,
+    MG_SYNTH_PROGRAM_SELECT,
+    MG_SYNTH_UNSET_PROGRAM,
+};
+
+struct mg_synth_cmd {
+    int channel;
+    int type;
+    int data1;
+    int data2;
+};
+
 int mg_initialize();
 
 int mg_start(void);
 int mg_stop(void);
 
 int mg_halt_outputs(int halted);
+int mg_switch_channel_bank(int bank, struct mg_string_config *configs);
 
 int mg_set_pitchbend_factor(float factor);
 int mg_set_key_on_debounce(int num);
@@ -94,8 +177,11 @@ int mg_get_wheel_gain(void);
 int mg_get_mapping(struct mg_map *dst, int idx);
 int mg_set_mapping(const struct mg_map *src, int idx);
 int mg_reset_mapping_ranges(int idx);
+int mg_get_mappings(struct mg_map *dst, int count);
+int mg_set_mappings(const struct mg_map *src, int count);
 
 int mg_add_fluid_output(void *fluid);
+int mg_synth_send(void *fluid, const struct mg_synth_cmd *cmds, int count);
 
 int mg_add_midi_output(const char *device);
 int mg_config_midi_output(int output_id, int melody_ch, int drone_ch, int trompette_ch, int prog_change, int speed);
@@ -130,6 +216,20 @@ int mg_calibrate_set_key(int key, float pressure_adjust,
                          float velocity_adjust);
 int mg_calibrate_get_key(int key, float *pressure_adjust,
                         float *velocity_adjust);
+int mg_calibrate_get_keys(float *data, int count);
+int mg_calibrate_set_keys(const float *data, int count);
+
+int mg_read_worker_stats(struct mg_worker_stats *dst);
+void mg_reset_worker_stats(void);
+
+int mg_record_start(int max_events);
+int mg_record_stop(const char *filename);
+int mg_replay_start(const char *filename, int speed, int null_output);
+int mg_replay_stop(void);
+int mg_replay_get_status(struct mg_replay_status *status);
+
+int mg_simulate(int ticks, const struct mg_sensor_event *events, int count,
+                int null_output, struct mg_sim_result *result);
 
 """)
 
@@ -0,0 +1,89 @@
+"""
+Key and wheel sensor event streams, in the format of the sensor recordings
+written by the core (see struct mg_sensor_event). Used to replay and
+simulate the core without the hardware.
+"""
+import struct
+
+
+MAGIC = b'MGSR'
+VERSION = 1
+
+HEADER = struct.Struct('=4sII')
+EVENT = struct.Struct('=IBBHi')
+
+# devices, see enum mg_sensor_device
+KEYS = 0
+WHEEL = 1
+
+# evdev event types used by the sensor drivers
+EV_SYN = 0
+EV_ABS = 3
+EV_MSC = 4
+
+WHEEL_POSITIONS = 16384
+
+
+class SensorEvents(object):
+    """
+    A buffer of sensor events, which have to be added in tick order
+    """
+    def __init__(self, data=b''):
+        self.data = bytearray(data)
+
+    def __len__(self):
+        return len(self.data) // EVENT.size
+
+    def add(self, tick, device, ev_type, code, value):
+        self.data += EVENT.pack(tick, device, ev_type, code, value)
+
+    def key(self, tick, key, pressure):
+        self.add(tick, KEYS, EV_ABS, key, pressure)
+
+    def wheel(self, tick, position, distance, elapsed_us):
+        # the driver reports the position inverted, see mg_sensors_read_wheel
+        self.add(tick, WHEEL, EV_ABS, 0, WHEEL_POSITIONS - 1 - position)
+        self.add(tick, WHEEL, EV_ABS, 1, distance)
+        self.add(tick, WHEEL, EV_MSC, 1, elapsed_us)
+        self.add(tick, WHEEL, EV_SYN, 0, 0)
+
+    def events(self):
+        return list(EVENT.iter_unpack(bytes(self.data)))
+
+
+def read_recording(filename):
+    with open(filename, 'rb') as f:
+        magic, version, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Invalid sensor recording: {}'.format(filename))
+        data = f.read(count * EVENT.size)
+    if len(data) != count * EVENT.size:
+        raise ValueError('Truncated sensor recording: {}'.format(filename))
+    return SensorEvents(data)
+
+
+def write_recording(filename, events):
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(events)))
+        f.write(events.data)
+
+
+def synthetic_events(ticks, distance=14, notes=(0, 2, 4, 5, 7, 9, 11, 12), note_ticks=200, pressure=1500):
+    """
+    Return events of the wheel turning with the given distance per tick and
+    the keys of notes being played one after the other, each for note_ticks
+    ticks with a short pause in between.
+    """
+    events = SensorEvents()
+    position = 0
+    for tick in range(ticks):
+        position = (position + distance) % WHEEL_POSITIONS
+        events.wheel(tick, position, distance, 1000)
+        if notes:
+            step, offset = divmod(tick, note_ticks)
+            key = notes[step % len(notes)]
+            if offset == 0:
+                events.key(tick, key, pressure)
+            elif offset == note_ticks - note_ticks // 10:
+                events.key(tick, key, 0)
+    return events
@@ -0,0 +1,126 @@
+import logging
+import threading
+
+from mg.conf import settings
+from mg.fluidsynth.config import SYNTH_CONFIG
+from mg.mglib import mgcore
+from mg.signals import EventListener
+from mg.utils import PeriodicTimer
+
+
+log = logging.getLogger('polyphony')
+
+
+def parse_channels(value):
+    return {int(channel) for channel in value.split(',') if channel.strip()}
+
+
+class PolyphonyController(EventListener):
+    """
+    Adapts the polyphony of the synth to the measured CPU load, so that heavy
+    presets drop voices instead of causing dropouts.
+
+    When the load is above HIGH_LOAD, the polyphony is lowered by STEP voices
+    and the synth is under pressure: the keynoise channels are no longer
+    important, so FluidSynth drops their voices first. When the load has been
+    below LOW_LOAD for RAISE_AFTER samples, the polyphony is raised again,
+    and the pressure ends once the full polyphony is restored.
+
+    If the active preset declares protected strings, only their channels are
+    important, with or without pressure.
+    """
+    events = [
+        'active:preset:changed',
+        'active:preset:voice:protected:changed',
+    ]
+
+    INTERVAL = 0.5
+    HIGH_LOAD = 80.0
+    LOW_LOAD = 50.0
+    STEP = 8
+    RAISE_AFTER = 10
+
+    def __init__(self, fluid, state, min_polyphony=None, max_polyphony=None):
+        self.fluid = fluid
+        self.state = state
+        self.min_polyphony = min_polyphony or settings.min_polyphony
+        self.max_polyphony = max_polyphony or SYNTH_CONFIG['synth.polyphony']
+        self.polyphony = self.max_polyphony
+        self.pressure = False
+        self.low_samples = 0
+        self.important = None
+        self.timer = None
+        self._lock = threading.RLock()
+
+    def start(self):
+        self.stop()
+        self.update_important_channels()
+        self.timer = PeriodicTimer(self.INTERVAL, self.check)
+        self.timer.start()
+
+    def stop(self):
+        if self.timer:
+            self.timer.stop()
+            self.timer = None
+
+    def active_preset_changed(self, **kwargs):
+        with self._lock:
+            self.update_important_channels()
+
+    def active_preset_voice_protected_changed(self, **kwargs):
+        with self._lock:
+            self.update_important_channels()
+
+    def check(self):
+        try:
+            load = self.fluid.get_cpu_load()
+            with self._lock:
+                self.adapt(load)
+        except Exception:
+            log.exception('Unable to adapt polyphony')
+
+    def adapt(self, load):
+        if load > self.HIGH_LOAD:
+            self.low_samples = 0
+            if not self.pressure:
+                self.pressure = True
+                self.update_important_channels()
+            if self.polyphony > self.min_polyphony:
+                self.set_polyphony(max(self.min_polyphony, self.polyphony - self.STEP), load)
+        elif load < self.LOW_LOAD and self.pressure:
+            self.low_samples += 1
+            if self.low_samples < self.RAISE_AFTER:
+                return
+            self.low_samples = 0
+            if self.polyphony < self.max_polyphony:
+                self.set_polyphony(min(self.max_polyphony, self.polyphony + self.STEP), load)
+            else:
+                self.pressure = False
+                self.update_important_channels()
+        else:
+            self.low_samples = 0
+
+    def set_polyphony(self, polyphony, load):
+        log.info('CPU load {:.0f}%, setting polyphony to {}'.format(load, polyphony))
+        self.fluid.set_polyphony(polyphony)
+        self.polyphony = polyphony
+
+    def important_channels(self):
+        voices = [voice for voice in self.state.preset.voices if voice.protected]
+        if voices:
+            channels = {voice.channel for voice in voices}
+        else:
+            channels = parse_channels(SYNTH_CONFIG['synth.overflow.important-channels'])
+            channels = {channel % mgcore.CHANNEL_BANK_SIZE for channel in channels}
+            if self.pressure:
+                channels -= {voice.channel for voice in self.state.preset.keynoise}
+        # the same channels on both channel banks, see SynthController
+        return {channel + bank * mgcore.CHANNEL_BANK_SIZE
+                for channel in channels
+                for bank in (0, 1)}
+
+    def update_important_channels(self):
+        channels = self.important_channels()
+        if channels != self.important:
+            self.fluid.set_important_channels(channels)
+            self.important = channels
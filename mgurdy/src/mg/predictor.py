@@ -0,0 +1,165 @@
+import collections
+import logging
+import threading
+
+import prctl
+
+from mg.db import Preset
+from mg.sf2 import registry
+from mg.signals import EventListener
+from mg.subsets import subsets
+
+
+log = logging.getLogger('predictor')
+
+
+# mod key modes that switch to the next or previous preset
+PRESET_KEY_MODES = (
+    'preset_next',
+    'preset_prev',
+    'preset',
+    'group_preset_next',
+    'group_preset_prev',
+)
+
+
+class PresetPredictor(EventListener, threading.Thread):
+    """
+    Keeps the sounds of the presets that are likely to be loaded next pinned
+    in FluidSynth, so that switching to them doesn't have to wait for
+    SoundFonts or samples to be loaded.
+
+    These are the presets before and after the active one if one of the mod
+    keys switches presets, and the most recently used presets. Pins are
+    updated in the background whenever the active preset or the list of
+    presets changes. The pins are owned by the predictor, so they don't
+    interfere with the pins of the preloaded presets.
+    """
+    events = [
+        'active:preset:changed',
+        'preset:added',
+        'preset:changed',
+        'preset:deleted',
+        'preset:reordered',
+        'mod1_key_mode:changed',
+        'mod2_key_mode:changed',
+        'wrap_presets:changed',
+        'clear:preload',
+        'presets_preloaded:changed',
+        'sound:changed',
+        'sound:deleted',
+    ]
+
+    RECENT_COUNT = 2
+
+    def __init__(self, fluid, state):
+        threading.Thread.__init__(self, name='mg-predictor')
+        self.daemon = True
+        self.fluid = fluid
+        self.state = state
+        self.recent = collections.deque(maxlen=self.RECENT_COUNT)
+        self.pinned = set()
+        self._pinned_lock = threading.Lock()
+        self.active_id = None
+        self.changed = threading.Event()
+        self.stopped = threading.Event()
+
+    def handle_event(self, name, data):
+        if name == 'active:preset:changed':
+            self.active_preset_changed()
+        elif name in ('sound:changed', 'sound:deleted'):
+            self.release_font(data['id'])
+        self.changed.set()
+
+    def release_font(self, font_id):
+        """
+        Drop the pins of all sounds of the SoundFont, so that the old file can
+        be unloaded when it has been replaced or deleted. The next update pins
+        the sounds from the new file.
+        """
+        with self._pinned_lock:
+            for sound in [sound for sound in self.pinned if subsets.source_id(sound[0]) == font_id]:
+                self.fluid.unpin_sound(*sound, owner='predictor')
+                self.pinned.discard(sound)
+
+    def active_preset_changed(self):
+        preset_id = self.state.preset.id
+        if preset_id == self.active_id:
+            return
+        if preset_id in self.recent:
+            self.recent.remove(preset_id)
+        if self.active_id is not None:
+            self.recent.appendleft(self.active_id)
+        self.active_id = preset_id
+
+    def run(self):
+        prctl.set_name(self.name)
+        while not self.stopped.is_set():
+            self.changed.wait()
+            self.changed.clear()
+            if self.stopped.is_set():
+                break
+            try:
+                self.update()
+            except Exception:
+                log.exception('Unable to update preloaded sounds')
+
+    def stop(self):
+        self.stopped.set()
+        self.changed.set()
+
+    def update(self):
+        with self._pinned_lock:
+            # everything is pinned already if all presets have been preloaded
+            if self.state.presets_preloaded:
+                sounds = set()
+            else:
+                sounds = self.predict_sounds()
+            for sound in self.pinned - sounds:
+                self.fluid.unpin_sound(*sound, owner='predictor')
+            for sound in sounds - self.pinned:
+                try:
+                    self.fluid.pin_sound(*sound, owner='predictor')
+                except Exception:
+                    log.exception('Unable to preload {}'.format(sound))
+                    sounds.discard(sound)
+            self.pinned = sounds
+        self.fluid.trim_soundfonts()
+
+    def predict_sounds(self):
+        """
+        Return the set of (font name, bank, program) tuples of all presets
+        that are likely to be loaded next
+        """
+        sounds = set()
+        for preset in self.predict_presets():
+            voices = []
+            for voice_list in preset.get_data().get('voices', {}).values():
+                for voice in voice_list:
+                    font_id = voice.get('soundfont')
+                    if font_id and registry.get_sound(font_id, voice['bank'], voice['program']):
+                        voices.append((font_id, voice['bank'], voice['program']))
+            fonts = subsets.resolve_all(voices)
+            sounds.update((fonts[font_id], bank, program) for font_id, bank, program in voices)
+        return sounds
+
+    def predict_presets(self):
+        presets = []
+        number = self.state.last_preset_number
+        key_modes = (self.state.mod1_key_mode, self.state.mod2_key_mode)
+        if number and any(mode in PRESET_KEY_MODES for mode in key_modes):
+            presets.extend(self.adjacent_presets(number))
+        if self.recent:
+            presets.extend(Preset.select().where(Preset.id << list(self.recent)))
+        unique = {preset.id: preset for preset in presets if preset.id != self.active_id}
+        return list(unique.values())
+
+    def adjacent_presets(self, number):
+        presets = list(Preset.select().where(Preset.number << [number - 1, number + 1]))
+        if self.state.wrap_presets:
+            numbers = [preset.number for preset in presets]
+            if number - 1 not in numbers:
+                presets.extend(Preset.select().order_by(Preset.number.desc()).limit(1))
+            if number + 1 not in numbers:
+                presets.extend(Preset.select().order_by(Preset.number).limit(1))
+        return presets
@@ -17,6 +17,9 @@ class VoiceSchema(Schema):
     note = fields.Int(default=60, validate=validate.Range(min=-1, max=127))
     finetune = fields.Int(default=0, validate=validate.Range(min=-100, max=100))
     chien_threshold = fields.Int(default=50, validate=percent_range)
+    # keep the voices of this string when the synth has to drop voices
+    protected = fields.Boolean(default=False)
+    interpolation = fields.Str(default='auto', validate=validate.OneOf(['auto', 'none', 'linear', '4th', '7th']))
 
 
 class MelodySchema(VoiceSchema):
@@ -140,6 +143,41 @@ class MiscSchema(Schema):
     instrument_mode = fields.Str(default='simple_three')
 
 
+class AudioConfigSchema(Schema):
+    periods = fields.Int(required=True, validate=validate.Range(min=2, max=16))
+    period_size = fields.Int(required=True, validate=validate.Range(min=16, max=4096))
+
+
+class EffectSchema(Schema):
+    name = fields.Str(required=True, validate=validate.Length(min=1, max=64))
+    library = fields.Str(required=True)
+    plugin = fields.Str(default=None, allow_none=True)
+    mix = fields.Boolean(default=False)
+    mix_gain = fields.Float(default=1.0, validate=validate.Range(min=0, max=10))
+    links = fields.Dict(default={})
+    controls = fields.Dict(default={})
+
+
+def validate_effects(effects):
+    names = set()
+    for effect in effects:
+        if effect['name'] in names:
+            raise ValidationError('Duplicate effect name {}'.format(effect['name']))
+        names.add(effect['name'])
+        for port, target in effect.get('links', {}).items():
+            if not isinstance(target, str):
+                raise ValidationError('Invalid link target for {}'.format(port))
+        for port, value in effect.get('controls', {}).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValidationError('Invalid control value for {}'.format(port))
+
+
+class EffectGraphSchema(Schema):
+    buffers = fields.List(fields.Str(), default=[])
+    effects = fields.Nested(EffectSchema, many=True, required=True, validate=validate_effects)
+    reverb = fields.Str(default=None, allow_none=True)
+
+
 class MidiSchema(Schema):
     input_enabled = fields.Boolean(default=False)
     input_auto = fields.Boolean(default=False)
@@ -0,0 +1,35 @@
+from flask_restful import Resource, abort
+
+from mg.latency import tuner
+
+
+class AudioConfigView(Resource):
+    """
+    Returns the audio buffer config and the progress and results of the
+    latency calibration. DELETE goes back to the default config.
+    """
+    def get(self):
+        return tuner.to_dict()
+
+    def delete(self):
+        try:
+            tuner.reset()
+        except RuntimeError as e:
+            abort(409, message=str(e))
+        return tuner.to_dict()
+
+
+class AudioCalibrationView(Resource):
+    """
+    Starts the latency calibration with the sounds of the active preset in
+    the background and returns 202. It takes about 5.5 seconds per period
+    size, up to 22 seconds, and restarts the audio driver for each one. Poll
+    GET /api/audio for the progress, the smallest stable config is saved and
+    used from then on.
+    """
+    def post(self):
+        try:
+            tuner.start_calibration()
+        except RuntimeError as e:
+            abort(409, message=str(e))
+        return tuner.to_dict(), 202
@@ -29,8 +29,9 @@ class ImportExportView(StateResource):
 
         if opt_switch('mappings'):
             data = []
+            stored = db.load_all_mapping_ranges(mgcore.get_mapping_configs().keys())
             for name in mgcore.get_mapping_configs().keys():
-                ranges = db.load_mapping_ranges(name)
+                ranges = stored.get(name)
                 if ranges:
                     data.append({
                         'name': name,
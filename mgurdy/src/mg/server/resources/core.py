@@ -0,0 +1,16 @@
+from flask_restful import Resource
+
+from mg.mglib import mgcore
+
+
+class WorkerStatsView(Resource):
+    """
+    Returns the timing stats of the core worker loop. Reading them doesn't
+    lock the core, so polling this doesn't disturb the worker.
+    """
+    def get(self):
+        return mgcore.get_worker_stats()
+
+    def delete(self):
+        mgcore.reset_worker_stats()
+        return mgcore.get_worker_stats()
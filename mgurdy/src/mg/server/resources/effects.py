@@ -0,0 +1,75 @@
+import logging
+import os
+
+from flask import request, current_app
+from flask_restful import Resource, abort
+
+from mg import db
+from mg.bypass import bypass
+from mg.conf import settings
+from mg.fluidsynth.api import FluidSynthError
+from mg.fluidsynth.config import DEFAULT_EFFECTS
+from mg.schema import EffectGraphSchema
+from mg.signals import signals
+
+
+log = logging.getLogger('api')
+
+
+class EffectsView(Resource):
+    """
+    Provides read and write access to the LADSPA effect graph. Changes are
+    applied immediately and only saved if FluidSynth accepted them, see
+    LADSPA.apply()
+    """
+    def get(self):
+        return db.load_effects() or DEFAULT_EFFECTS
+
+    def put(self):
+        data = request.get_json()
+        graph, errors = EffectGraphSchema().load(data)
+        if errors:
+            abort(400, errors=errors)
+        ladspa_dir = os.path.realpath(settings.ladspa_dir)
+        for effect in graph['effects']:
+            library = os.path.realpath(os.path.join(ladspa_dir, effect['library']))
+            if os.path.dirname(library) != ladspa_dir or not os.path.isfile(library):
+                abort(400, message='Invalid effect library {}'.format(effect['library']))
+            effect['library'] = library
+        self.apply(graph)
+        db.save_effects(graph)
+        signals.emit('effects:changed', {'graph': graph})
+        return self.get()
+
+    def delete(self):
+        self.apply(DEFAULT_EFFECTS)
+        db.delete_effects()
+        signals.emit('effects:changed', {'graph': DEFAULT_EFFECTS})
+        return self.get()
+
+    def apply(self, graph):
+        synth = current_app.config['synth']
+        ladspa = synth.fluid.ladspa
+        previous = ladspa.graph
+        try:
+            ladspa.apply(synth.effect_graph(graph))
+        except FluidSynthError as e:
+            if previous is not None:
+                try:
+                    ladspa.apply(previous)
+                except FluidSynthError:
+                    log.exception('Unable to restore previous effects')
+            abort(400, message='Unable to apply effects: {}'.format(e))
+
+
+class EffectBypassView(Resource):
+    """
+    Returns how long the effects have been bypassed while the instrument was
+    silent, and the estimated CPU time saved
+    """
+    def get(self):
+        return bypass.get_stats()
+
+    def delete(self):
+        bypass.reset()
+        return bypass.get_stats()
@@ -5,6 +5,7 @@ from playhouse.flask_utils import get_object_or_404
 
 from mg.db import Preset
 from mg.signals import signals
+from mg.subsets import subsets
 
 from .base import StateResource
 
@@ -65,6 +66,20 @@ class LoadPresetView(StateResource):
         return None, 204
 
 
+class PresetSubsetView(Resource):
+    def post(self, id):
+        """
+        Create compact SoundFonts that only contain the sounds used by the
+        preset. They are used instead of the full SoundFonts the next time
+        the preset is loaded.
+        """
+        preset = get_object_or_404(Preset, Preset.id == id)
+        try:
+            return subsets.create_for_preset(preset.get_data()), 201
+        except RuntimeError as e:
+            abort(400, message=str(e))
+
+
 class OrderPresetsView(Resource):
     def post(self):
         order = request.get_json()['order']
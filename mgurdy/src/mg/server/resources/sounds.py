@@ -1,70 +1,142 @@
 import re
 import os
 import shutil
-import tempfile
 
 from flask import request
 from flask_restful import Resource, abort
 
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_content_range_header
 from werkzeug.utils import secure_filename
 
-from mg.sf2 import SoundFont
+from mg.sf2 import SoundFont, Sf2StreamValidator
 from mg.signals import signals
 from mg.conf import settings
 
 from .base import StateResource
 
 
+# the first read is small, so that files that are not SoundFonts at all
+# are rejected before the rest of the upload is transferred
+FIRST_CHUNK_SIZE = 1024
+CHUNK_SIZE = 1024 * 1024
+
+
 class UploadError(Exception):
     pass
 
 
 class SoundFontUploadView(StateResource):
+    """
+    Uploads SoundFonts into the sound directory.
+
+    Large files can be uploaded in several requests, each one with a
+    Content-Range header describing the part that is sent. Uploads without
+    Content-Range header are accepted as well. If a transfer is interrupted,
+    the data received so far is kept and GET returns the offset from which
+    the upload can be resumed.
+    """
+    def get(self, filename=None):
+        filename = self.check_filename(filename)
+        try:
+            offset = os.path.getsize(self.part_filepath(filename))
+        except FileNotFoundError:
+            offset = 0
+        return {'offset': offset}
+
     def post(self, filename=None):
-        filename = secure_filename(filename)
+        filename = self.check_filename(filename)
+        start, total = self.get_content_range()
+        partpath = self.part_filepath(filename)
 
-        if not re.search(r'\.sf[23]$', filename, re.I):
-            abort(400, message='Invalid file extension, please use .sf2 or .sf3 files')
+        try:
+            offset = os.path.getsize(partpath) if start else 0
+        except FileNotFoundError:
+            offset = 0
+        if start != offset:
+            abort(409, message='Upload has to continue at offset {}'.format(offset), offset=offset)
+
+        validator = Sf2StreamValidator()
+        try:
+            with open(partpath, 'r+b' if start else 'wb') as f:
+                if start:
+                    validator.resume(f, start)
+                    f.seek(start)
+                size = FIRST_CHUNK_SIZE
+                while True:
+                    try:
+                        chunk = request.stream.read(size)
+                    except ClientDisconnected:
+                        abort(400, message='Upload interrupted', offset=validator.pos)
+                    if len(chunk) == 0:
+                        break
+                    validator.feed(chunk)
+                    f.write(chunk)
+                    size = CHUNK_SIZE
+
+            if total is not None and validator.pos < total:
+                return {'offset': validator.pos}, 202
+
+            validator.finish()
+            try:
+                sf = SoundFont(partpath)
+            except Exception:
+                raise UploadError()
+        except (RuntimeError, UploadError):
+            try:
+                os.unlink(partpath)
+            except Exception:
+                pass
+            abort(400, message='Invalid file format, is this really a SoundFont?')
 
+        return self.add_soundfont(filename, partpath, sf)
+
+    def add_soundfont(self, filename, partpath, sf):
         filepath = os.path.join(settings.sound_dir, filename)
         overwrite = os.path.isfile(filepath)
 
-        tmp = tempfile.NamedTemporaryFile(
-            delete=False,
-            dir=settings.upload_dir)
-        try:
-            while True:
-                chunk = request.stream.read(16 * 1024 * 1024)
-                if len(chunk) == 0:
-                    break
-                tmp.write(chunk)
-            tmp.seek(0)
+        # store the parsed metadata in the index before moving the file into
+        # place, so that the file never needs to be parsed again
+        stat = os.stat(partpath)
+        index = SoundFont.get_index()
+        index.put(filename, stat.st_size, stat.st_mtime, sf.to_metadata())
+        index.save()
 
-            try:
-                SoundFont().parse_file(tmp)
-            except Exception as e:
-                raise UploadError('Invalid file format, is this really a SoundFont?')
+        # replace existing files in a single step, so that the sound
+        # directory watcher never sees the file disappear
+        shutil.move(partpath, filepath)
 
-            tmp.close()
+        # only notify if the sound directory watcher hasn't already done so
+        if SoundFont.refresh(filename) or not SoundFont.is_watched():
+            if overwrite:
+                with self.state.lock('Loading...', goto_home=True):
+                    signals.emit('sound:changed', {'id': filename})
+            else:
+                signals.emit('sound:added', {'id': filename})
 
-            if os.path.isfile(filepath):
-                os.unlink(filepath)
-            shutil.move(tmp.name, filepath)
+        return SoundFont.by_id(filename).as_dict()
 
-        except UploadError as e:
-            try:
-                os.unlink(tmp.name)
-            except Exception:
-                pass
-            abort(400, message=str(e))
+    def check_filename(self, filename):
+        filename = secure_filename(filename)
+        if not re.search(r'\.sf[23]$', filename, re.I):
+            abort(400, message='Invalid file extension, please use .sf2 or .sf3 files')
+        return filename
 
-        if overwrite:
-            with self.state.lock('Loading...', goto_home=True):
-                signals.emit('sound:changed', {'id': filename})
-        else:
-            signals.emit('sound:added', {'id': filename})
+    def part_filepath(self, filename):
+        return os.path.join(settings.upload_dir, filename + '.part')
 
-        return SoundFont(filepath).as_dict()
+    def get_content_range(self):
+        """
+        Return the start offset and total size of the upload from the
+        Content-Range header. The total is None if unknown.
+        """
+        header = request.headers.get('Content-Range')
+        if not header:
+            return 0, None
+        content_range = parse_content_range_header(header)
+        if content_range is None or content_range.units != 'bytes' or content_range.start is None:
+            abort(400, message='Invalid Content-Range header')
+        return content_range.start, content_range.length
 
 
 class SoundFontListView(Resource):
@@ -74,13 +146,13 @@ class SoundFontListView(Resource):
 
 class SoundFontView(StateResource):
     def get(self, id):
-        filepath = self.id_to_filepath(id)
-        if not os.path.isfile(filepath):
-            return abort(404)
         try:
-            return SoundFont(filepath).as_dict()
+            sf = SoundFont.by_id(secure_filename(id))
         except Exception:
             abort(500, message='Unable to load sound')
+        if sf is None:
+            return abort(404)
+        return sf.as_dict()
 
     def delete(self, id):
         filepath = self.id_to_filepath(id)
@@ -90,8 +162,9 @@ class SoundFontView(StateResource):
             os.remove(filepath)
         except Exception as e:
             return abort(500, message=str(e))
-        with self.state.lock('Loading...', goto_home=True):
-            signals.emit('sound:deleted', {'id': id})
+        if SoundFont.refresh(secure_filename(id)) or not SoundFont.is_watched():
+            with self.state.lock('Loading...', goto_home=True):
+                signals.emit('sound:deleted', {'id': id})
         return None, 204
 
     def id_to_filepath(self, id):
@@ -0,0 +1,21 @@
+from flask import request
+from flask_restful import Resource
+
+from mg.telemetry import telemetry
+
+
+class TelemetryView(Resource):
+    """
+    Returns the recorded synth load samples. With the 'since' parameter, only
+    samples taken after that timestamp are returned.
+    """
+    def get(self):
+        try:
+            since = float(request.args['since'])
+        except (KeyError, ValueError, TypeError):
+            since = None
+        return telemetry.to_dict(since)
+
+    def delete(self):
+        telemetry.reset()
+        return telemetry.to_dict()
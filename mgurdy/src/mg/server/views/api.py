@@ -9,7 +9,11 @@ from mg.server.resources.info import SystemInfo
 from mg.server.resources import calibration
 from mg.server.resources import config
 from mg.server.resources import misc
+from mg.server.resources import audio
+from mg.server.resources import effects
 from mg.server.resources.display import DisplayView
+from mg.server.resources.telemetry import TelemetryView
+from mg.server.resources.core import WorkerStatsView
 
 views = Blueprint('api', __name__)
 api = Api(views)
@@ -20,6 +24,7 @@ api.add_resource(Mapping, '/mappings/<string:name>')
 api.add_resource(presets.PresetListView, '/presets')
 api.add_resource(presets.PresetView, '/presets/<int:id>')
 api.add_resource(presets.LoadPresetView, '/presets/<int:id>/load')
+api.add_resource(presets.PresetSubsetView, '/presets/<int:id>/subsets')
 api.add_resource(presets.OrderPresetsView, '/presets/order')
 
 api.add_resource(sounds.SoundFontListView, '/sounds')
@@ -33,9 +38,19 @@ api.add_resource(config.ImportExportView, '/config')
 
 api.add_resource(misc.MiscView, '/misc')
 
+api.add_resource(audio.AudioConfigView, '/audio')
+api.add_resource(audio.AudioCalibrationView, '/audio/calibrate')
+
+api.add_resource(effects.EffectsView, '/effects')
+api.add_resource(effects.EffectBypassView, '/effects/bypass')
+
 api.add_resource(calibration.Keyboard, '/calibrate/keyboard')
 api.add_resource(calibration.Wheel, '/calibrate/wheel')
 
 api.add_resource(SystemInfo, '/info')
 
 api.add_resource(DisplayView, '/screenshot')
+
+api.add_resource(TelemetryView, '/telemetry')
+
+api.add_resource(WorkerStatsView, '/core/worker')
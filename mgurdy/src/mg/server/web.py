@@ -13,10 +13,11 @@ log = logging.getLogger('web')
 
 
 class WebServer(threading.Thread):
-    def __init__(self, state, menu, port=80, debug=None):
+    def __init__(self, state, menu, synth, port=80, debug=None):
         super().__init__(name='mg-web-server')
         self.state = state
         self.menu = menu
+        self.synth = synth
         self.daemon = True
         self.port = port
         self.debug = debug
@@ -26,6 +27,7 @@ class WebServer(threading.Thread):
         try:
             app.config['state'] = self.state
             app.config['menu'] = self.menu
+            app.config['synth'] = self.synth
             app.run(port=self.port, host='0.0.0.0', debug=self.debug, threaded=True)
         except Exception:
             log.exception('Unable to start webserver on port {}'.format(self.port))
@@ -33,6 +33,8 @@ WS_EVENTS = {
     'active:preset:voice:chien_threshold:changed': THROTTLE_ALWAYS,
     'misc_config:updated': THROTTLE_ALWAYS,
     'multi_chien_threshold:changed': THROTTLE_DEFAULT,
+    'synth:telemetry': THROTTLE_ALWAYS,
+    'effects:changed': THROTTLE_DEFAULT,
 }
 
 
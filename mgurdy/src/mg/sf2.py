@@ -1,23 +1,121 @@
+import array
+import bisect
 import collections
 import glob
+import json
+import logging
+import mmap
 import os
 import re
 import struct
+import sys
+import tempfile
+import threading
 
 from mg.conf import settings
 
 
+log = logging.getLogger('sf2')
+
+
 Sound = collections.namedtuple(
-    'Sound', ['soundfont', 'bank', 'program', 'name', 'type', 'base_note'])
+    'Sound', ['soundfont', 'bank', 'program', 'name', 'type', 'base_note', 'sample_size'])
 
 
 FILENAME_PATTERN = re.compile(r'\.sf[23]$', re.I)
 
+METADATA_ATTRS = ('name', 'copyright', 'creation_date', 'author',
+                  'tool', 'description', 'mode')
+
+
+class SoundFontIndex(object):
+    """
+    Persistent index of the metadata of all SoundFonts in the sound
+    directory, so that the files don't need to be parsed again on every boot.
+
+    Entries are keyed by filename and are only valid as long as the size and
+    modification time of the file match the values stored in the entry.
+    """
+    VERSION = 2
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.entries = None
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    def get(self, filename, filesize, mtime):
+        with self._lock:
+            self._load()
+            entry = self.entries.get(filename)
+            if entry and entry['size'] == filesize and entry['mtime'] == mtime:
+                return entry['metadata']
+
+    def put(self, filename, filesize, mtime, metadata):
+        with self._lock:
+            self._load()
+            self.entries[filename] = {
+                'size': filesize,
+                'mtime': mtime,
+                'metadata': metadata,
+            }
+            self.dirty = True
+
+    def prune(self, filenames):
+        """
+        Remove all entries that are not in the list of filenames
+        """
+        with self._lock:
+            self._load()
+            for filename in set(self.entries) - set(filenames):
+                del self.entries[filename]
+                self.dirty = True
+
+    def remove(self, filename):
+        with self._lock:
+            self._load()
+            if self.entries.pop(filename, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self.dirty:
+                return
+            try:
+                dirname = os.path.dirname(self.filepath)
+                os.makedirs(dirname, exist_ok=True)
+                with tempfile.NamedTemporaryFile('w', dir=dirname, delete=False) as f:
+                    json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+                os.replace(f.name, self.filepath)
+                self.dirty = False
+            except Exception:
+                log.exception('Unable to write SoundFont index {}'.format(self.filepath))
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        try:
+            with open(self.filepath, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data['entries']
+        except FileNotFoundError:
+            pass
+        except Exception:
+            log.exception('Unable to read SoundFont index {}'.format(self.filepath))
+
 
 class SoundFont(object):
     FILE_CACHE = {}
+    INDEX = None
 
-    def __init__(self, filepath=None, mtime=None):
+    # Set by the SoundDirWatcher once the FILE_CACHE is kept in sync with the
+    # contents of the sound directory
+    WATCHED_DIR = None
+    CACHE_LOCK = threading.RLock()
+
+    def __init__(self, filepath=None, mtime=None, filesize=None, metadata=None):
         if filepath and not filepath.startswith('/'):
             filepath = os.path.join(settings.sound_dir, filepath)
 
@@ -25,10 +123,12 @@ class SoundFont(object):
         if self.filepath:
             self.filename = os.path.basename(filepath)
             self.id = self.filename
-            self.filesize = os.path.getsize(filepath)
+            if filesize is None:
+                filesize = os.path.getsize(filepath)
+            self.filesize = filesize
 
         self.mtime = mtime
-        self.sounds = []
+        self.sounds = PresetTable(self)
         self.name = ''
         self.copyright = ''
         self.creation_date = ''
@@ -36,34 +136,123 @@ class SoundFont(object):
         self.tool = ''
         self.description = ''
         self.mode = 'generic'
+        self.base_notes = {}
 
-        if self.filepath:
+        if metadata is not None:
+            self.from_metadata(metadata)
+        elif self.filepath:
             with open(self.filepath, 'rb') as f:
                 self.parse_file(f)
 
+    @classmethod
+    def get_index(cls):
+        index_file = os.path.join(settings.cache_dir, 'soundfonts.json')
+        if cls.INDEX is None or cls.INDEX.filepath != index_file:
+            cls.INDEX = SoundFontIndex(index_file)
+        return cls.INDEX
+
+    @classmethod
+    def is_watched(cls):
+        return cls.WATCHED_DIR is not None and cls.WATCHED_DIR == settings.sound_dir
+
     @classmethod
     def from_cache(cls, filepath):
-        mtime = os.path.getmtime(filepath)
-        sf = cls.FILE_CACHE.get(filepath)
-        if not sf or sf.mtime != mtime:
-            cls.FILE_CACHE[filepath] = cls(filepath, mtime)
-        return cls.FILE_CACHE[filepath]
+        stat = os.stat(filepath)
+        with cls.CACHE_LOCK:
+            sf = cls.FILE_CACHE.get(filepath)
+            if not sf or sf.mtime != stat.st_mtime or sf.filesize != stat.st_size:
+                sf = cls.from_index(filepath, stat)
+                cls.FILE_CACHE[filepath] = sf
+                registry.invalidate(sf.id)
+            return sf
+
+    @classmethod
+    def from_index(cls, filepath, stat):
+        """
+        Create a SoundFont from the persistent index, only parsing the
+        file if the index doesn't contain an up-to-date entry for it.
+        """
+        index = cls.get_index()
+        filename = os.path.basename(filepath)
+        metadata = index.get(filename, stat.st_size, stat.st_mtime)
+        sf = cls(filepath, stat.st_mtime, stat.st_size, metadata=metadata)
+        if metadata is None:
+            index.put(filename, stat.st_size, stat.st_mtime, sf.to_metadata())
+        return sf
 
     @classmethod
     def load_all(cls):
-        sounds = []
-        for path in glob.glob(os.path.join(settings.sound_dir, '*')):
-            if FILENAME_PATTERN.search(path):
-                sounds.append(cls.from_cache(path))
+        if cls.is_watched():
+            with cls.CACHE_LOCK:
+                sounds = list(cls.FILE_CACHE.values())
+        else:
+            sounds = cls.scan()
         return sorted(sounds, key=lambda x: x.name + x.id)
 
+    @classmethod
+    def scan(cls):
+        """
+        Bring the FILE_CACHE and the index in sync with the contents of the
+        sound directory and return all SoundFonts found.
+        """
+        sounds = []
+        with cls.CACHE_LOCK:
+            for path in glob.glob(os.path.join(settings.sound_dir, '*')):
+                if FILENAME_PATTERN.search(path):
+                    try:
+                        sounds.append(cls.from_cache(path))
+                    except FileNotFoundError:
+                        pass
+            found = set(sf.filepath for sf in sounds)
+            for path in set(cls.FILE_CACHE) - found:
+                del cls.FILE_CACHE[path]
+            registry.invalidate()
+        index = cls.get_index()
+        index.prune([sf.filename for sf in sounds])
+        index.save()
+        return sounds
+
+    @classmethod
+    def refresh(cls, filename):
+        """
+        Update the cached SoundFont for filename after it has been changed on
+        disk. Returns 'added', 'changed' or 'deleted' if the cache had to be
+        updated, otherwise None.
+        """
+        filepath = os.path.join(settings.sound_dir, filename)
+        index = cls.get_index()
+        with cls.CACHE_LOCK:
+            cached = cls.FILE_CACHE.get(filepath)
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                if cached is None:
+                    return None
+                del cls.FILE_CACHE[filepath]
+                registry.invalidate(filename)
+                index.remove(filename)
+                index.save()
+                return 'deleted'
+            if cached and cached.mtime == stat.st_mtime and cached.filesize == stat.st_size:
+                return None
+            cls.FILE_CACHE[filepath] = cls.from_index(filepath, stat)
+            registry.invalidate(filename)
+            index.save()
+            return 'changed' if cached else 'added'
+
     @classmethod
     def by_id(cls, id):
         filepath = os.path.join(settings.sound_dir, '{}'.format(id))
+        if cls.is_watched():
+            sf = cls.FILE_CACHE.get(filepath)
+            if sf is not None:
+                return sf
         try:
-            return cls.from_cache(filepath)
+            sf = cls.from_cache(filepath)
         except FileNotFoundError:
             return None
+        cls.get_index().save()
+        return sf
 
     def as_dict(self):
         result = {}
@@ -71,31 +260,48 @@ class SoundFont(object):
                      'name', 'copyright', 'creation_date',
                      'author', 'tool', 'description'):
             result[name] = getattr(self, name)
-        result['sounds'] = [{
-            'id': '{}:{}:{}'.format(self.id, s.bank, s.program),
-            'bank': s.bank,
-            'program': s.program,
-            'name': s.name,
-            'type': s.type,
-            'note': s.base_note,
-        } for s in self.sounds]
+        result['sounds'] = self.sounds.as_list()
         return result
 
     def get_sound(self, bank, progam):
-        for sound in self.sounds:
-            if sound.bank == bank and sound.program == progam:
-                return sound
+        return self.sounds.get(bank, progam)
 
-    def parse_file(self, f):
-        sf2 = Sf2File(f)
+    def to_metadata(self):
+        """
+        Return the parsed metadata as a JSON serializable dict, used
+        to store this font in the SoundFontIndex
+        """
+        result = {}
+        for name in METADATA_ATTRS:
+            result[name] = getattr(self, name)
+        result['base_notes'] = [[bank, program, note] for (bank, program), note
+                                in sorted(self.base_notes.items())]
+        table = self.sounds
+        result['presets'] = [list(preset) for preset
+                             in zip(table.banks, table.programs, table.names, table.sample_sizes)]
+        return result
 
-        self._parse_metadata(sf2)
+    def from_metadata(self, metadata):
+        for name in METADATA_ATTRS:
+            setattr(self, name, metadata[name])
+        self.base_notes = {(bank, program): note for bank, program, note
+                           in metadata['base_notes']}
+        self.sounds = PresetTable(self)
+        for bank, program, name, sample_size in metadata['presets']:
+            self._parse_preset(bank, program, name, sample_size)
 
-        for bank, program, name in sf2.presets:
-            self.sounds.append(self._parse_preset(bank, program, name))
+    def parse_file(self, f):
+        with Sf2File(f) as sf2:
+            self._parse_metadata(sf2)
+
+            sample_sizes = sf2.sample_sizes
+            for bank, program, name in sf2.presets:
+                self._parse_preset(bank, program, name, sample_sizes.get((bank, program), 0))
 
-    def _parse_preset(self, bank, program, name):
+    def _parse_preset(self, bank, program, name, sample_size=0):
         """
+        Add a preset to the preset table.
+
         The MidiGurdy expects the different types of sounds in certain banks.
             Melody Sounds: Bank 0
             Drone Sounds: Bank 1
@@ -119,7 +325,7 @@ class SoundFont(object):
             type = 'generic'
             base_note = -1
 
-        return Sound(self, bank, program, name, type, base_note)
+        self.sounds.append(bank, program, name, type, base_note, sample_size)
 
     def _parse_metadata(self, sf2):
         self.name = sf2.strings['font_name'] or 'Unnamed'
@@ -164,114 +370,327 @@ class SoundFont(object):
         return '<SoundFont: {}>'.format(self.name)
 
 
-class EndOfFile(Exception):
-    pass
+class PresetTable(object):
+    """
+    Compact, read-only sequence of the presets of a SoundFont.
+
+    Banks, programs, base notes and types are stored in packed arrays and
+    names are interned, so that fonts with thousands of presets only cost
+    a few bytes per preset apart from the name. Sound tuples are only created
+    when a preset is accessed.
+
+    Presets are usually added in (bank, program) order, in which case lookups
+    are a binary search over the packed keys.
+    """
+    TYPES = ('generic', 'melody', 'drone', 'trompette', 'keynoise')
+
+    def __init__(self, soundfont):
+        self.soundfont = soundfont
+        self.keys = array.array('I')
+        self.banks = array.array('H')
+        self.programs = array.array('H')
+        self.base_notes = array.array('h')
+        self.types = array.array('B')
+        self.sample_sizes = array.array('I')
+        self.names = []
+        self.is_sorted = True
+
+    def append(self, bank, program, name, type, base_note, sample_size=0):
+        key = (bank << 16) | program
+        if self.keys and key < self.keys[-1]:
+            self.is_sorted = False
+        self.keys.append(key)
+        self.banks.append(bank)
+        self.programs.append(program)
+        self.base_notes.append(base_note)
+        self.types.append(self.TYPES.index(type))
+        self.sample_sizes.append(sample_size)
+        self.names.append(sys.intern(name))
+
+    def get(self, bank, program):
+        """
+        Return the Sound for bank and program, or None if there is none
+        """
+        key = (bank << 16) | program
+        if self.is_sorted:
+            pos = bisect.bisect_left(self.keys, key)
+            if pos < len(self.keys) and self.keys[pos] == key:
+                return self[pos]
+        elif key in self.keys:
+            return self[self.keys.index(key)]
+
+    def as_list(self):
+        """
+        Return the presets as list of dicts, without creating Sound tuples
+        """
+        prefix = self.soundfont.id + ':'
+        types = self.TYPES
+        return [{
+            'id': '{}{}:{}'.format(prefix, bank, program),
+            'bank': bank,
+            'program': program,
+            'name': name,
+            'type': types[type],
+            'note': note,
+            'sample_size': sample_size,
+        } for bank, program, name, type, note, sample_size
+            in zip(self.banks, self.programs, self.names, self.types, self.base_notes, self.sample_sizes)]
+
+    def __len__(self):
+        return len(self.banks)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        return Sound(self.soundfont, self.banks[pos], self.programs[pos], self.names[pos],
+                     self.TYPES[self.types[pos]], self.base_notes[pos], self.sample_sizes[pos])
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+
+class SoundRegistry(object):
+    """
+    In-memory lookup of SoundFonts and sounds by font id, bank and program.
+
+    Fonts are resolved through SoundFont.by_id() on first access and then
+    served from memory until the SoundFont cache reports a change to the
+    font, so repeated lookups never touch the filesystem. Missing fonts and
+    sounds are remembered as well.
+    """
+    def __init__(self):
+        self.fonts = {}
+        self.sounds = {}
+
+    def get_font(self, font_id):
+        try:
+            return self.fonts[font_id]
+        except KeyError:
+            pass
+        with SoundFont.CACHE_LOCK:
+            sf = SoundFont.by_id(font_id)
+            self.fonts[font_id] = sf
+        return sf
+
+    def get_sound(self, font_id, bank, program):
+        key = (font_id, bank, program)
+        try:
+            return self.sounds[key]
+        except KeyError:
+            pass
+        with SoundFont.CACHE_LOCK:
+            sf = self.get_font(font_id)
+            sound = sf.get_sound(bank, program) if sf else None
+            self.sounds[key] = sound
+        return sound
+
+    def invalidate(self, font_id=None):
+        with SoundFont.CACHE_LOCK:
+            if font_id is None:
+                self.fonts.clear()
+                self.sounds.clear()
+            else:
+                self.fonts.pop(font_id, None)
+                for key in [key for key in self.sounds if key[0] == font_id]:
+                    del self.sounds[key]
+
+
+registry = SoundRegistry()
 
 
 class Sf2File(object):
     """
     Parses a SoundFont file and extracts the presets and info
-    header strings
+    header strings.
+
+    The file is memory mapped and only the RIFF chunk headers are read
+    to find the position of the INFO and pdta sub-chunks, so the (usually
+    huge) sample data is never touched. The INFO strings are parsed
+    immediately, the preset headers only when they are first accessed.
     """
+    PHDR_FORMAT = struct.Struct(r'<20sHHHIII')
+    INST_FORMAT = struct.Struct(r'<20sH')
+    BAG_FORMAT = struct.Struct(r'<HH')
+    MOD_FORMAT = struct.Struct(r'<HHhHH')
+    GEN_FORMAT = struct.Struct(r'<HH')
+    SHDR_FORMAT = struct.Struct(r'<20sIIIIIBbHH')
+
+    GEN_INSTRUMENT = 41
+    GEN_SAMPLE_ID = 53
+    SAMPLE_TYPE_COMPRESSED = 0x10
+    SAMPLE_TYPE_ROM = 0x8000
 
     def __init__(self, sf2file):
         self.file = sf2file
-        self.list_size = 0
-        self.presets = []
         self.strings = {key: '' for key in self.string_map.values()}
+        self.chunks = {}
+        self.lists = {}
+        self._presets = None
+        self._sample_sizes = None
+
+        size = os.fstat(sf2file.fileno()).st_size
+        if size < 12:
+            raise RuntimeError('File too small to be a SoundFont')
+        self._map = mmap.mmap(sf2file.fileno(), 0, access=mmap.ACCESS_READ)
         try:
-            self.parse_next()
-        except EndOfFile:
-            pass
+            self.parse_chunks()
+            self.parse_info()
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def presets(self):
+        """
+        List of (bank, program, name) tuples of all presets in the file,
+        sorted by bank and program.
+        """
+        if self._presets is None:
+            self._presets = self.parse_phdr()
+        return self._presets
 
-    def parse_size(self):
-        chunk_size, = struct.unpack(r'<I', self.file.read(4))
-        return chunk_size
+    @property
+    def sample_sizes(self):
+        """
+        Dict of (bank, program) to the number of bytes of sample data used
+        by the preset.
+        """
+        if self._sample_sizes is None:
+            self._sample_sizes = self.parse_sample_sizes()
+        return self._sample_sizes
 
-    def parse_next(self):
-        data = self.file.read(4)
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
 
-        if len(data) < 4:
-            raise EndOfFile()
+    def __enter__(self):
+        return self
 
-        chunk_id, = struct.unpack(r'4s', data)
+    def __exit__(self, *args):
+        self.close()
 
-        parser_method = self.parser_map.get(chunk_id)
-        if parser_method:
-            parser_method(self, chunk_id)
-        else:
-            raise RuntimeError('Invalid chunk in file: {}'.format(chunk_id))
-
-    def parse_riff(self, chunk_id):
-        self.parse_size()
-        self.parse_next()
-
-    def parse_sfbk(self, chunk_id):
-        self.parse_next()
-        self.parse_next()
-        self.parse_next()
-
-    def parse_list(self, chunk_id):
-        self.list_size = self.parse_size()
-        self.parse_next()
-
-    def parse_array(self, chunk_id):
-        end_size = self.file.tell() + self.list_size - 4
-        while self.file.tell() < end_size:
-            self.parse_next()
-
-    def parse_version(self, chunk_id):
-        self.parse_size()
-        major, minor = struct.unpack(r'<HH', self.file.read(4))
-        self.strings['version'] = '{:.2}'.format(major + minor / 100.)
-
-    def parse_short_str(self, chunk_id):
-        size = min(self.parse_size(), 256)
-        name = self.string_map[chunk_id]
-        self.strings[name] = from_cstr(self.file.read(size))
-
-    def parse_long_str(self, chunk_id):
-        size = min(self.parse_size(), 65536)
-        name = self.string_map[chunk_id]
-        self.strings[name] = from_cstr(self.file.read(size))
-
-    def parse_phdr(self, chunk_id):
-        end_pos = self.file.tell() + self.parse_size()
-        while self.file.tell() < end_pos:
-            data = struct.unpack(r'<20sHHHIII', self.file.read(38))
-            (name, prog, bank, _, _, _, _) = data
-            self.presets.append((bank, prog, from_cstr(name)))
-        self.presets.pop()  # last preset is EOP marker
-        self.presets.sort()
-
-    def ignore_chunk(self, chunk_id):
-        self.parse_next()
-
-    def skip_chunk(self, chunk_id):
-        self.file.seek(self.parse_size(), 1)
-
-    parser_map = {
-        b'RIFF': parse_riff,
-        b'LIST': parse_list,
-        b'sfbk': parse_sfbk,
-        b'INFO': parse_array,
-        b'ifil': parse_version,
-        b'isng': parse_short_str,
-        b'INAM': parse_short_str,
-        b'irom': parse_short_str,
-        b'iver': parse_short_str,
-        b'ICRD': parse_short_str,
-        b'IENG': parse_short_str,
-        b'IPRD': parse_short_str,
-        b'ICOP': parse_short_str,
-        b'ICMT': parse_long_str,
-        b'ISFT': parse_short_str,
-        b'sdta': parse_array,
-        b'smpl': skip_chunk,
-        b'sm24': skip_chunk,
-        b'pdta': ignore_chunk,
-        b'phdr': parse_phdr,
-    }
+    def parse_chunks(self):
+        """
+        Walk the RIFF tree and record the offset and size of all sub-chunks
+        of the INFO, sdta and pdta lists.
+        """
+        riff_id, riff_size, form_type = struct.unpack_from(r'<4sI4s', self._map, 0)
+        if riff_id != b'RIFF' or form_type != b'sfbk':
+            raise RuntimeError('Not a SoundFont file')
+
+        end = min(len(self._map), riff_size + 8)
+        for list_type, pos, list_end in self._iter_chunks(12, end):
+            if list_type != b'LIST' or pos + 4 > list_end:
+                continue
+            list_type = self._map[pos:pos + 4]
+            if list_type not in (b'INFO', b'sdta', b'pdta'):
+                continue
+            self.lists[list_type] = (pos, list_end - pos)
+            for chunk_id, chunk_pos, chunk_end in self._iter_chunks(pos + 4, list_end):
+                self.chunks[chunk_id] = (chunk_pos, chunk_end - chunk_pos)
+
+    def _iter_chunks(self, pos, end):
+        while pos + 8 <= end:
+            chunk_id, size = struct.unpack_from(r'<4sI', self._map, pos)
+            chunk_end = min(pos + 8 + size, end)
+            yield chunk_id, pos + 8, chunk_end
+            # chunks are padded to even sizes
+            pos = pos + 8 + size + (size & 1)
+
+    def parse_info(self):
+        if b'ifil' in self.chunks:
+            pos, size = self.chunks[b'ifil']
+            if size >= 4:
+                major, minor = struct.unpack_from(r'<HH', self._map, pos)
+                self.strings['version'] = '{:.2}'.format(major + minor / 100.)
+
+        for chunk_id, name in self.string_map.items():
+            if chunk_id not in self.chunks:
+                continue
+            pos, size = self.chunks[chunk_id]
+            size = min(size, 65536 if chunk_id == b'ICMT' else 256)
+            self.strings[name] = from_cstr(self._map[pos:pos + size])
+
+    def parse_phdr(self):
+        presets = [(bank, prog, from_cstr(name)) for (name, prog, bank, _, _, _, _)
+                   in self.read_records(b'phdr', self.PHDR_FORMAT)]
+        if presets:
+            presets.pop()  # last preset is EOP marker
+        presets.sort()
+        return presets
+
+    def parse_sample_sizes(self):
+        """
+        Follow the preset zones to their instruments and the instrument zones
+        to their samples, and add up the size of all distinct samples used by
+        each preset.
+
+        Sizes are the number of bytes FluidSynth needs to hold the samples,
+        i.e. two bytes per sample point (three for 24 bit fonts). For
+        compressed (sf3) samples, the size of the compressed data is used, so
+        the value is only a lower bound for those.
+        """
+        phdr = self.read_records(b'phdr', self.PHDR_FORMAT)
+        pbag = [gen for gen, _ in self.read_records(b'pbag', self.BAG_FORMAT)]
+        pgen = self.read_records(b'pgen', self.GEN_FORMAT)
+        inst = [bag for _, bag in self.read_records(b'inst', self.INST_FORMAT)]
+        ibag = [gen for gen, _ in self.read_records(b'ibag', self.BAG_FORMAT)]
+        igen = self.read_records(b'igen', self.GEN_FORMAT)
+        shdr = self.read_records(b'shdr', self.SHDR_FORMAT)
+
+        bytes_per_point = 3 if b'sm24' in self.chunks else 2
+        sample_sizes = []
+        for (_, start, end, _, _, _, _, _, _, sample_type) in shdr:
+            if sample_type & self.SAMPLE_TYPE_COMPRESSED:
+                sample_sizes.append(max(0, end - start))
+            else:
+                sample_sizes.append(max(0, end - start) * bytes_per_point)
+
+        instrument_samples = [
+            self._zone_refs(inst[i], inst[i + 1], ibag, igen, self.GEN_SAMPLE_ID, len(sample_sizes))
+            for i in range(len(inst) - 1)]
+
+        sizes = {}
+        for preset, next_preset in zip(phdr, phdr[1:]):
+            (_, prog, bank, first_bag, _, _, _) = preset
+            instruments = self._zone_refs(first_bag, next_preset[3], pbag, pgen,
+                                          self.GEN_INSTRUMENT, len(instrument_samples))
+            samples = set()
+            for instrument in instruments:
+                samples.update(instrument_samples[instrument])
+            sizes[(bank, prog)] = sum(sample_sizes[sample] for sample in samples)
+        return sizes
+
+    def _zone_refs(self, first_bag, end_bag, bags, gens, generator, limit):
+        """
+        Return the set of values of the generator in the zones first_bag up to
+        end_bag, ignoring out of range references in broken files.
+        """
+        refs = set()
+        for bag in range(first_bag, min(end_bag, len(bags) - 1)):
+            for gen in range(bags[bag], min(bags[bag + 1], len(gens))):
+                oper, amount = gens[gen]
+                if oper == generator and amount < limit:
+                    refs.add(amount)
+        return refs
+
+    def read_records(self, chunk_id, record_format):
+        """
+        Return all records of a pdta sub-chunk as a list of tuples
+        """
+        if self._map is None:
+            raise RuntimeError('SoundFont file already closed')
+        if chunk_id not in self.chunks:
+            return []
+        pos, size = self.chunks[chunk_id]
+        size -= size % record_format.size
+        with memoryview(self._map) as view:
+            records = view[pos:pos + size]
+            result = list(record_format.iter_unpack(records))
+            records.release()
+        return result
 
     string_map = {
         b'irom': 'rom_name',
@@ -287,6 +706,262 @@ class Sf2File(object):
     }
 
 
+def write_subset(src_path, dest_path, presets):
+    """
+    Write a new SoundFont to dest_path that only contains the given presets
+    of the SoundFont at src_path, as a list of (bank, program) tuples, and
+    the instruments and samples they use. The INFO list is copied unchanged,
+    so the subset keeps the name, mode and base notes of the source.
+
+    Returns the list of (bank, program) tuples written.
+    """
+    dirname = os.path.dirname(dest_path)
+    with open(src_path, 'rb') as f, Sf2File(f) as sf2:
+        subset = Sf2Subset(sf2, presets)
+        with tempfile.NamedTemporaryFile('wb', dir=dirname, delete=False) as out:
+            try:
+                subset.write(out)
+            except Exception:
+                os.unlink(out.name)
+                raise
+    os.replace(out.name, dest_path)
+    return subset.presets
+
+
+class Sf2Subset(object):
+    """
+    Collects the pdta records of a set of presets from an Sf2File and
+    renumbers all references between presets, instruments and samples.
+    """
+    # number of zero sample points required after each sample
+    SAMPLE_PADDING = 46
+
+    SAMPLE_TYPES_LINKED = (2, 4, 8)
+
+    def __init__(self, sf2, presets):
+        self.sf2 = sf2
+        wanted = set(presets)
+
+        phdr = sf2.read_records(b'phdr', sf2.PHDR_FORMAT)
+        selected = [(preset, next_preset) for preset, next_preset in zip(phdr, phdr[1:])
+                    if (preset[2], preset[1]) in wanted]
+        if not selected:
+            raise RuntimeError('None of the presets exist in the SoundFont')
+        self.presets = sorted((preset[2], preset[1]) for preset, _ in selected)
+
+        instruments = {}
+        samples = {}
+
+        self.phdr = []
+        self.pbag, self.pmod, self.pgen = [], [], []
+        for preset, next_preset in selected:
+            (name, prog, bank, first_bag, library, genre, morphology) = preset
+            self.phdr.append((name, prog, bank, len(self.pbag), library, genre, morphology))
+            self._copy_zones(first_bag, next_preset[3], b'pbag', b'pmod', b'pgen',
+                             self.pbag, self.pmod, self.pgen, sf2.GEN_INSTRUMENT, instruments)
+        self.phdr.append((b'EOP', 0, 0, len(self.pbag), 0, 0, 0))
+        self._terminate_zones(self.pbag, self.pmod, self.pgen)
+
+        inst = sf2.read_records(b'inst', sf2.INST_FORMAT)
+        self.inst = []
+        self.ibag, self.imod, self.igen = [], [], []
+        for index in sorted(instruments, key=instruments.get):
+            if index + 1 >= len(inst):
+                raise RuntimeError('Invalid instrument reference')
+            name, first_bag = inst[index]
+            self.inst.append((name, len(self.ibag)))
+            self._copy_zones(first_bag, inst[index + 1][1], b'ibag', b'imod', b'igen',
+                             self.ibag, self.imod, self.igen, sf2.GEN_SAMPLE_ID, samples)
+        self.inst.append((b'EOI', len(self.ibag)))
+        self._terminate_zones(self.ibag, self.imod, self.igen)
+
+        shdr = sf2.read_records(b'shdr', sf2.SHDR_FORMAT)
+        order = sorted(samples, key=samples.get)
+        # stereo samples need their linked partner
+        for index in order:
+            if index + 1 >= len(shdr):
+                raise RuntimeError('Invalid sample reference')
+            link, sample_type = shdr[index][8:10]
+            if sample_type & (sf2.SAMPLE_TYPE_COMPRESSED | sf2.SAMPLE_TYPE_ROM):
+                raise RuntimeError('Subsets of compressed or ROM samples are not supported')
+            if sample_type in self.SAMPLE_TYPES_LINKED and link + 1 < len(shdr) and link not in samples:
+                samples[link] = len(samples)
+                order.append(link)
+
+        self.samples = []
+        self.shdr = []
+        pos = 0
+        for index in order:
+            (name, start, end, start_loop, end_loop, rate, pitch,
+             correction, link, sample_type) = shdr[index]
+            end = max(start, end)
+            self.samples.append((start, end))
+            offset = pos - start
+            if sample_type in self.SAMPLE_TYPES_LINKED:
+                link = samples.get(link, 0)
+            self.shdr.append((name, start + offset, end + offset, start_loop + offset,
+                              end_loop + offset, rate, pitch, correction, link, sample_type))
+            pos += end - start + self.SAMPLE_PADDING
+        self.shdr.append((b'EOS', 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        self.sample_points = pos
+
+    def _copy_zones(self, first_bag, end_bag, bag_id, mod_id, gen_id,
+                    bags, mods, gens, ref_generator, refs):
+        sf2 = self.sf2
+        src_bags = sf2.read_records(bag_id, sf2.BAG_FORMAT)
+        src_mods = sf2.read_records(mod_id, sf2.MOD_FORMAT)
+        src_gens = sf2.read_records(gen_id, sf2.GEN_FORMAT)
+        for bag in range(first_bag, min(end_bag, len(src_bags) - 1)):
+            (first_gen, first_mod), (end_gen, end_mod) = src_bags[bag:bag + 2]
+            bags.append((len(gens), len(mods)))
+            mods.extend(src_mods[first_mod:end_mod])
+            for oper, amount in src_gens[first_gen:end_gen]:
+                if oper == ref_generator:
+                    amount = refs.setdefault(amount, len(refs))
+                gens.append((oper, amount))
+
+    def _terminate_zones(self, bags, mods, gens):
+        bags.append((len(gens), len(mods)))
+        mods.append((0, 0, 0, 0, 0))
+        gens.append((0, 0))
+
+    def write(self, f):
+        sf2 = self.sf2
+        if b'INFO' in sf2.lists:
+            pos, size = sf2.lists[b'INFO']
+            info = sf2._map[pos:pos + size]
+        else:
+            info = b'INFO'
+
+        sm24 = b'sm24' in sf2.chunks
+        smpl_size = self.sample_points * 2
+        sm24_size = self.sample_points if sm24 else 0
+        sdta_size = 4 + 8 + smpl_size
+        if sm24:
+            sdta_size += 8 + sm24_size + (sm24_size & 1)
+
+        pdta = b'pdta' + b''.join(
+            self._chunk(chunk_id, b''.join(record_format.pack(*record) for record in records))
+            for chunk_id, record_format, records in (
+                (b'phdr', sf2.PHDR_FORMAT, self.phdr),
+                (b'pbag', sf2.BAG_FORMAT, self.pbag),
+                (b'pmod', sf2.MOD_FORMAT, self.pmod),
+                (b'pgen', sf2.GEN_FORMAT, self.pgen),
+                (b'inst', sf2.INST_FORMAT, self.inst),
+                (b'ibag', sf2.BAG_FORMAT, self.ibag),
+                (b'imod', sf2.MOD_FORMAT, self.imod),
+                (b'igen', sf2.GEN_FORMAT, self.igen),
+                (b'shdr', sf2.SHDR_FORMAT, self.shdr)))
+
+        riff_size = 4 + 8 + len(info) + 8 + sdta_size + 8 + len(pdta)
+        f.write(struct.pack(r'<4sI4s', b'RIFF', riff_size, b'sfbk'))
+        f.write(self._chunk(b'LIST', info))
+        f.write(struct.pack(r'<4sI4s', b'LIST', sdta_size, b'sdta'))
+
+        f.write(struct.pack(r'<4sI', b'smpl', smpl_size))
+        self._write_samples(f, b'smpl', 2)
+        if sm24:
+            f.write(struct.pack(r'<4sI', b'sm24', sm24_size))
+            self._write_samples(f, b'sm24', 1)
+            if sm24_size & 1:
+                f.write(b'\0')
+
+        f.write(self._chunk(b'LIST', pdta))
+
+    def _write_samples(self, f, chunk_id, width):
+        pos, size = self.sf2.chunks[chunk_id]
+        padding = b'\0' * (self.SAMPLE_PADDING * width)
+        for start, end in self.samples:
+            data = self.sf2._map[pos + min(start * width, size):pos + min(end * width, size)]
+            f.write(data)
+            # keep the layout intact for truncated sample data
+            f.write(b'\0' * ((end - start) * width - len(data)))
+            f.write(padding)
+
+    def _chunk(self, chunk_id, data):
+        if len(data) % 2:
+            return struct.pack(r'<4sI', chunk_id, len(data)) + data + b'\0'
+        return struct.pack(r'<4sI', chunk_id, len(data)) + data
+
+
+class Sf2StreamValidator(object):
+    """
+    Checks the RIFF structure of a SoundFont while it is being received, so
+    that invalid data can be rejected as soon as the first chunk headers have
+    arrived instead of after the whole file has been transferred.
+
+    Only the RIFF header and the headers of the top-level chunks are looked
+    at. Raises RuntimeError on invalid data.
+    """
+    HEADER_SIZE = 12
+
+    def __init__(self):
+        self.pos = 0
+        self.riff_end = None
+        self.header_pos = 0
+        self.header = bytearray()
+        self.lists = []
+
+    def feed(self, data):
+        offset = self.pos
+        self.pos += len(data)
+        while self.header_pos is not None:
+            start = self.header_pos + len(self.header) - offset
+            if start >= len(data):
+                break
+            needed = self._header_size()
+            self.header += data[start:start + needed - len(self.header)]
+            if len(self.header) < needed:
+                break
+            self._check_header(bytes(self.header).ljust(self.HEADER_SIZE, b'\0'))
+            self.header = bytearray()
+        if self.riff_end is not None and self.pos > self.riff_end + (self.riff_end & 1):
+            raise RuntimeError('Data after end of SoundFont')
+
+    def resume(self, f, size):
+        """
+        Restore the validator state for the first size bytes of the file f,
+        only reading the chunk headers.
+        """
+        while self.header_pos is not None and self.header_pos < size:
+            f.seek(self.header_pos)
+            self.pos = self.header_pos
+            self.feed(f.read(min(self._header_size(), size - self.header_pos)))
+        self.pos = size
+
+    def finish(self):
+        if self.riff_end is None or self.header_pos is not None or self.pos < self.riff_end:
+            raise RuntimeError('Incomplete SoundFont file')
+        if b'pdta' not in self.lists:
+            raise RuntimeError('SoundFont has no preset data')
+
+    def _header_size(self):
+        if self.riff_end is None:
+            return self.HEADER_SIZE
+        # the last chunk might be too small to have a list type
+        return min(self.HEADER_SIZE, self.riff_end - self.header_pos)
+
+    def _check_header(self, header):
+        chunk_id, size, list_type = struct.unpack(r'<4sI4s', header)
+        if self.riff_end is None:
+            if chunk_id != b'RIFF' or list_type != b'sfbk':
+                raise RuntimeError('Not a SoundFont file')
+            self.riff_end = size + 8
+            self.header_pos = self.HEADER_SIZE
+        else:
+            if self.riff_end - self.header_pos < 8:
+                raise RuntimeError('Truncated chunk header')
+            # chunks are padded to even sizes
+            end = self.header_pos + 8 + size + (size & 1)
+            if end > self.riff_end + (self.riff_end & 1):
+                raise RuntimeError('Chunk exceeds SoundFont size')
+            if chunk_id == b'LIST':
+                self.lists.append(list_type)
+            self.header_pos = end
+        if self.header_pos >= self.riff_end:
+            self.header_pos = None
+
+
 def from_cstr(cstr):
     if cstr is None:
         return None
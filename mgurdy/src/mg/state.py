@@ -5,7 +5,7 @@ import logging
 from mg.signals import EventEmitter, signals
 from mg.utils import PeriodicTimer
 from mg.db import Preset, load_midi_config
-from mg.sf2 import SoundFont
+from mg.sf2 import registry
 from mg.alsa.api import RawMIDI
 from mg.mglib import mgcore
 
@@ -549,6 +549,8 @@ class VoiceState(EventEmitter):
         self.mode = 'midigurdy'
         self.finetune = 0
         self.chien_threshold = 50
+        self.protected = False
+        self.interpolation = 'auto'
 
     def to_dict(self):
         return {
@@ -564,12 +566,16 @@ class VoiceState(EventEmitter):
             'polyphonic': self.polyphonic,
             'finetune': self.finetune,
             'chien_threshold': self.chien_threshold,
+            'protected': self.protected,
+            'interpolation': self.interpolation,
         }
 
     def from_dict(self, data, partial=False):
         if 'soundfont' in data and 'bank' in data and 'program' in data:
-            sf = SoundFont.by_id(data['soundfont']) if data['soundfont'] else None
-            sound = sf.get_sound(data['bank'], data['program']) if sf else None
+            if data['soundfont']:
+                sound = registry.get_sound(data['soundfont'], data['bank'], data['program'])
+            else:
+                sound = None
             if sound:
                 self.set_sound(sound)
                 if self.type == 'keynoise':
@@ -589,6 +595,8 @@ class VoiceState(EventEmitter):
         _set(self, 'mode', data, 'mode', 'midigurdy', partial)
         _set(self, 'finetune', data, 'finetune', 0, partial)
         _set(self, 'chien_threshold', data, 'chien_threshold', 50, partial)
+        _set(self, 'protected', data, 'protected', False, partial)
+        _set(self, 'interpolation', data, 'interpolation', 'auto', partial)
 
     def set_sound(self, sound):
         with signals.suppress():
@@ -617,20 +625,16 @@ class VoiceState(EventEmitter):
             self.notify('sound:changed')
 
     def get_sound(self):
-        from mg.sf2 import SoundFont
         if self.soundfont_id:
-            sf = SoundFont.by_id(self.soundfont_id)
-            if sf:
-                return sf.get_sound(self.bank, self.program)
+            return registry.get_sound(self.soundfont_id, self.bank, self.program)
 
     def is_silent(self):
         return self.muted or not self.soundfont_id or self.base_note < 0
 
     def has_midigurdy_soundfont(self):
-        from mg.sf2 import SoundFont
         if not self.soundfont_id:
             return True
-        sf = SoundFont.by_id(self.soundfont_id)
+        sf = registry.get_font(self.soundfont_id)
         if not sf:
             return True
         return sf.mode == 'midigurdy'
@@ -0,0 +1,168 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from mg.conf import settings
+from mg.sf2 import registry, write_subset
+
+
+log = logging.getLogger('subsets')
+
+
+class SoundFontSubsets(object):
+    """
+    Manages compact SoundFonts that only contain the sounds used by a preset
+    (see mg.sf2.write_subset), stored in the subsets directory of the cache.
+
+    A subset is only used as long as the SoundFont it was derived from is
+    unchanged. The list of subsets is kept in memory, so resolve() doesn't
+    need to touch the filesystem.
+    """
+    MANIFEST = 'subsets.json'
+
+    def __init__(self):
+        self.dirpath = None
+        self.entries = None
+        self._lock = threading.RLock()
+
+    def get_dir(self):
+        return os.path.join(settings.cache_dir, 'subsets')
+
+    def create(self, font_id, presets):
+        """
+        Create (or reuse) a subset of the SoundFont with the given list of
+        (bank, program) tuples and return its entry.
+        """
+        sf = registry.get_font(font_id)
+        if sf is None:
+            raise RuntimeError('SoundFont {} not found'.format(font_id))
+        presets = sorted(set(presets))
+        key = json.dumps([sf.id, sf.filesize, sf.mtime, presets])
+        filename = '{}-{}.sf2'.format(os.path.splitext(sf.id)[0],
+                                      hashlib.sha1(key.encode()).hexdigest()[:12])
+        with self._lock:
+            self._load()
+            path = os.path.join(self.dirpath, filename)
+            entry = self.entries.get(filename)
+            if entry is None or not os.path.isfile(path):
+                os.makedirs(self.dirpath, exist_ok=True)
+                written = write_subset(sf.filepath, path, presets)
+                entry = {
+                    'font': sf.id,
+                    'size': sf.filesize,
+                    'mtime': sf.mtime,
+                    'presets': [list(preset) for preset in written],
+                    'filesize': os.path.getsize(path),
+                }
+                self.entries[filename] = entry
+                log.info('Created subset {} of {} ({} of {} bytes)'.format(
+                    filename, sf.id, entry['filesize'], sf.filesize))
+                self.prune()
+                self.save()
+            return dict(entry, filename=filename)
+
+    def create_for_preset(self, data):
+        """
+        Create one subset for each SoundFont used in the preset data
+        """
+        fonts = collections.defaultdict(set)
+        for voices in data.get('voices', {}).values():
+            for voice in voices:
+                if voice.get('soundfont'):
+                    fonts[voice['soundfont']].add((voice['bank'], voice['program']))
+        return [self.create(font_id, presets) for font_id, presets in sorted(fonts.items())]
+
+    def resolve(self, font_id, presets):
+        """
+        Return the path of the smallest up-to-date subset of the SoundFont that
+        contains all of the given (bank, program) tuples, or the font id
+        itself if there is no such subset.
+        """
+        sf = registry.get_font(font_id)
+        if sf is None:
+            return font_id
+        presets = set(presets)
+        best = None
+        with self._lock:
+            self._load()
+            for filename, entry in self.entries.items():
+                if (entry['font'] != font_id or entry['size'] != sf.filesize or
+                        entry['mtime'] != sf.mtime):
+                    continue
+                if not presets.issubset(tuple(preset) for preset in entry['presets']):
+                    continue
+                if best is None or entry['filesize'] < self.entries[best]['filesize']:
+                    best = filename
+            if best is None:
+                return font_id
+            return os.path.join(self.dirpath, best)
+
+    def resolve_all(self, sounds):
+        """
+        Return a dict of SoundFont id to the result of resolve() for all
+        SoundFonts in the given list of (font_id, bank, program) tuples
+        """
+        presets = collections.defaultdict(set)
+        for font_id, bank, program in sounds:
+            presets[font_id].add((bank, program))
+        return {font_id: self.resolve(font_id, font_presets)
+                for font_id, font_presets in presets.items()}
+
+    def source_id(self, name):
+        """
+        Return the id of the SoundFont that the loaded font name was derived
+        from, or the name itself if it is not a subset.
+        """
+        with self._lock:
+            self._load()
+            if os.path.dirname(name) == self.dirpath:
+                entry = self.entries.get(os.path.basename(name))
+                if entry:
+                    return entry['font']
+        return name
+
+    def prune(self):
+        """
+        Remove all subsets of SoundFonts that have been changed or deleted
+        """
+        with self._lock:
+            self._load()
+            for filename, entry in list(self.entries.items()):
+                sf = registry.get_font(entry['font'])
+                if sf and sf.filesize == entry['size'] and sf.mtime == entry['mtime']:
+                    continue
+                del self.entries[filename]
+                try:
+                    os.unlink(os.path.join(self.dirpath, filename))
+                except FileNotFoundError:
+                    pass
+
+    def save(self):
+        with self._lock:
+            try:
+                with tempfile.NamedTemporaryFile('w', dir=self.dirpath, delete=False) as f:
+                    json.dump(self.entries, f)
+                os.replace(f.name, os.path.join(self.dirpath, self.MANIFEST))
+            except Exception:
+                log.exception('Unable to write subset list')
+
+    def _load(self):
+        dirpath = self.get_dir()
+        if self.entries is not None and self.dirpath == dirpath:
+            return
+        self.dirpath = dirpath
+        self.entries = {}
+        try:
+            with open(os.path.join(dirpath, self.MANIFEST), 'r') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            log.exception('Unable to read subset list')
+
+
+subsets = SoundFontSubsets()
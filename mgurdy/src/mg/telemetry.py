@@ -0,0 +1,119 @@
+import collections
+import logging
+import threading
+import time
+
+from mg.conf import settings
+from mg.signals import signals
+from mg.utils import PeriodicTimer
+
+
+log = logging.getLogger('telemetry')
+
+
+Sample = collections.namedtuple('Sample', [
+    'time', 'cpu_load', 'active_voices', 'polyphony', 'voice_steals', 'xruns', 'preset_id'])
+
+
+class SynthTelemetry(object):
+    """
+    Periodically samples the synth load into a fixed-size ring buffer, so that
+    dropouts can be correlated with the preset that was active at the time.
+
+    FluidSynth doesn't report voice steals or xruns, so they are derived from
+    the samples: when all voices of the polyphony limit are active, the next
+    note steals a voice, and when the CPU load reaches 100% the synth can't
+    keep up with the audio output. Both are counted once per sample.
+    """
+    def __init__(self):
+        self.fluid = None
+        self.state = None
+        self.timer = None
+        self.samples = collections.deque()
+        self.totals = {}
+        self.polyphony = 0
+        self._lock = threading.Lock()
+        self.reset()
+
+    def setup(self, fluid, state, size=None):
+        self.fluid = fluid
+        self.state = state
+        self.polyphony = fluid.get_polyphony()
+        with self._lock:
+            self.samples = collections.deque(maxlen=size or settings.telemetry_size)
+
+    def start(self, interval=None):
+        self.stop()
+        self.timer = PeriodicTimer(interval or settings.telemetry_interval, self.sample)
+        self.timer.start()
+
+    def stop(self):
+        if self.timer:
+            self.timer.stop()
+            self.timer = None
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.totals = {
+                'samples': 0,
+                'voice_steals': 0,
+                'xruns': 0,
+                'max_cpu_load': 0.0,
+                'max_active_voices': 0,
+            }
+
+    def sample(self):
+        try:
+            cpu_load = self.fluid.get_cpu_load()
+            active_voices = self.fluid.get_active_voice_count()
+            # changed under load by the PolyphonyController
+            self.polyphony = self.fluid.get_polyphony()
+        except Exception:
+            log.exception('Unable to sample synth load')
+            return
+        sample = Sample(
+            time=time.time(),
+            cpu_load=round(cpu_load, 1),
+            active_voices=active_voices,
+            polyphony=self.polyphony,
+            voice_steals=int(active_voices >= self.polyphony),
+            xruns=int(cpu_load >= 100),
+            preset_id=self.state.preset.id,
+        )
+        with self._lock:
+            self.samples.append(sample)
+            totals = self.totals
+            totals['samples'] += 1
+            totals['voice_steals'] += sample.voice_steals
+            totals['xruns'] += sample.xruns
+            totals['max_cpu_load'] = max(totals['max_cpu_load'], sample.cpu_load)
+            totals['max_active_voices'] = max(totals['max_active_voices'], active_voices)
+            totals = dict(totals)
+        signals.emit('synth:telemetry', {
+            'sample': sample._asdict(),
+            'totals': totals,
+        })
+
+    def get_samples(self, since=None):
+        """
+        Return all samples as dicts, or only the ones taken after the given
+        timestamp
+        """
+        with self._lock:
+            samples = list(self.samples)
+        return [sample._asdict() for sample in samples
+                if since is None or sample.time > since]
+
+    def to_dict(self, since=None):
+        with self._lock:
+            totals = dict(self.totals)
+        return {
+            'polyphony': self.polyphony,
+            'interval': self.timer.period if self.timer else None,
+            'totals': totals,
+            'samples': self.get_samples(since),
+        }
+
+
+telemetry = SynthTelemetry()
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from mg.tests.conf import settings
+from mg.db import initialize
+from mg.fluidsynth.config import DEFAULT_EFFECTS
+from mg.server.app import app as flask_app
+from mg.signals import signals
+from mg.state import State
+
+
+class FakeSynth:
+    def __init__(self, fluid):
+        self.fluid = fluid
+
+    def effect_graph(self, graph):
+        return graph
+
+
+@pytest.fixture
+def synth(fluid):
+    return FakeSynth(fluid)
+
+
+@pytest.fixture
+def client(tmpdir, synth):
+    initialize(':memory:')
+    old_ladspa_dir = settings.ladspa_dir
+    settings.ladspa_dir = str(tmpdir)
+    tmpdir.join('delay.so').write('')
+    flask_app.config['state'] = State(settings)
+    flask_app.config['synth'] = synth
+    yield flask_app.test_client()
+    settings.ladspa_dir = old_ladspa_dir
+
+
+@pytest.fixture
+def emitted():
+    events = []
+
+    def handler(name, data):
+        events.append((name, data))
+
+    signals.register('effects:changed', handler)
+    yield events
+    signals.unregister('effects:changed', handler)
+
+
+def rjson(response):
+    return json.loads(response.data.decode('utf8'))
+
+
+GRAPH = {
+    'effects': [{
+        'name': 'delay',
+        'library': 'delay.so',
+        'mix': True,
+        'mix_gain': 0.5,
+        'links': {'Input': 'Reverb:Send', 'Output': 'Main:L'},
+        'controls': {'Delay': 0.25},
+    }],
+    'reverb': 'delay',
+}
+
+
+def test_get_default_effects(client):
+    rv = client.get('/api/effects')
+    assert rjson(rv) == DEFAULT_EFFECTS
+
+
+def test_put_effects(client, synth, emitted, tmpdir):
+    rv = client.put('/api/effects', data=json.dumps(GRAPH), content_type='application/json')
+    assert rv.status_code == 200
+    data = rjson(rv)
+    assert synth.fluid.ladspa.graph == data
+    assert data['effects'][0]['library'] == str(tmpdir.join('delay.so'))
+    assert data['effects'][0]['controls'] == {'Delay': 0.25}
+
+    assert rjson(client.get('/api/effects')) == data
+    assert emitted[-1][0] == 'effects:changed'
+    assert emitted[-1][1]['graph']['effects'][0]['name'] == 'delay'
+
+    rv = client.delete('/api/effects')
+    assert rjson(rv) == DEFAULT_EFFECTS
+    assert synth.fluid.ladspa.graph == DEFAULT_EFFECTS
+    assert emitted[-1][1]['graph'] == DEFAULT_EFFECTS
+
+
+def test_put_rejected_effects(client, synth, emitted):
+    client.delete('/api/effects')
+    synth.fluid.ladspa.fail = True
+    rv = client.put('/api/effects', data=json.dumps(GRAPH), content_type='application/json')
+    assert rv.status_code == 400
+
+    # the previous graph is restored and nothing is saved
+    assert synth.fluid.ladspa.graph == DEFAULT_EFFECTS
+    assert rjson(client.get('/api/effects')) == DEFAULT_EFFECTS
+    assert len(emitted) == 1
+
+
+@pytest.mark.parametrize('change', [
+    {'library': '../delay.so'},
+    {'library': 'missing.so'},
+    {'controls': {'Delay': 'long'}},
+])
+def test_put_invalid_effects(client, change):
+    graph = {'effects': [dict(GRAPH['effects'][0], **change)]}
+    rv = client.put('/api/effects', data=json.dumps(graph), content_type='application/json')
+    assert rv.status_code == 400
+
+
+def test_put_duplicate_effect_names(client):
+    graph = {'effects': [GRAPH['effects'][0], GRAPH['effects'][0]]}
+    rv = client.put('/api/effects', data=json.dumps(graph), content_type='application/json')
+    assert rv.status_code == 400
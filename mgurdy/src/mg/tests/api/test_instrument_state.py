@@ -46,6 +46,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -60,6 +62,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -74,6 +78,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }
             ],
             'drone': [
@@ -90,6 +96,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -104,6 +112,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -118,6 +128,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }
             ],
             'trompette': [
@@ -134,6 +146,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -148,6 +162,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'bank': 0,
@@ -162,6 +178,8 @@ def test_get_instrument_state(client, state):
                     'volume': 100,
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }
             ]
         },
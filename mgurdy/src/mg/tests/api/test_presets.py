@@ -1,4 +1,7 @@
 import json
+import os
+import shutil
+
 import pytest
 
 from mg.tests.conf import settings
@@ -66,6 +69,8 @@ def test_list_presets(client):
                     'mode': 'midigurdy',
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }],
                 'trompette': [],
                 'drone': [],
@@ -116,6 +121,8 @@ def test_create_preset(client):
                     'mode': 'midigurdy',
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }, {
                     'soundfont': 'test',
                     'bank': 0,
@@ -129,6 +136,8 @@ def test_create_preset(client):
                     'mode': 'keyboard',
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }
             ],
             'drone': [],
@@ -168,6 +177,8 @@ def test_create_preset_checks_max_voice_len(client):
         'panning': 0,
         'finetune': 0,
         'chien_threshold': 50,
+        'protected': False,
+        'interpolation': 'auto',
     }
     data = {
         'name': 'p1',
@@ -289,6 +300,8 @@ def test_update_preset(client):
                     'mode': 'midigurdy',
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 },
                 {
                     'soundfont': 'test',
@@ -303,6 +316,8 @@ def test_update_preset(client):
                     'mode': 'midigurdy',
                     'finetune': 0,
                     'chien_threshold': 50,
+                    'protected': False,
+                    'interpolation': 'auto',
                 }
             ],
             'drone': [],
@@ -330,3 +345,29 @@ def test_put_nonexistant_preset_returns_404(client):
     data = {'id': 1, 'blafoo': 'test'}
     rv = client.put('/api/presets/42', data=json.dumps(data))
     assert rv.status_code == 404
+
+
+def test_create_preset_subsets(client, tmpdir):
+    old_dirs = (settings.sound_dir, settings.cache_dir)
+    settings.sound_dir = str(tmpdir.mkdir('sounds'))
+    settings.cache_dir = str(tmpdir.join('cache'))
+    shutil.copy(os.path.join(old_dirs[0], 'mg.sf2'), settings.sound_dir)
+    try:
+        p1 = Preset(name='p1')
+        p1.set_data({
+            'voices': {
+                'melody': [{'soundfont': 'mg.sf2', 'bank': 0, 'program': 0}],
+                'drone': [{'soundfont': 'mg.sf2', 'bank': 1, 'program': 0}],
+                'trompette': [],
+            }
+        })
+        p1.save()
+
+        rv = client.post('/api/presets/1/subsets')
+
+        assert rv.status_code == 201
+        entries = rjson(rv)
+        assert [(e['font'], e['presets']) for e in entries] == [('mg.sf2', [[0, 0], [1, 0]])]
+        assert os.path.isfile(os.path.join(settings.cache_dir, 'subsets', entries[0]['filename']))
+    finally:
+        settings.sound_dir, settings.cache_dir = old_dirs
@@ -77,49 +77,57 @@ def test_upload_soundfont(client, tmpdata_dir):
              'id': 'test.sf2:0:0',
              'name': 'First Melody',
              'program': 0,
-             'type': 'melody'},
+             'type': 'melody',
+             'sample_size': 200},
             {'bank': 0,
              'note': -1,
              'id': 'test.sf2:0:1',
              'name': 'Second Melody',
              'program': 1,
-             'type': 'melody'},
+             'type': 'melody',
+             'sample_size': 200},
             {'bank': 1,
              'note': 50,
              'id': 'test.sf2:1:0',
              'name': 'First Drone',
              'program': 0,
-             'type': 'drone'},
+             'type': 'drone',
+             'sample_size': 200},
             {'bank': 1,
              'note': -1,
              'id': 'test.sf2:1:1',
              'name': 'Second Drone',
              'program': 1,
-             'type': 'drone'},
+             'type': 'drone',
+             'sample_size': 200},
             {'bank': 2,
              'note': -1,
              'id': 'test.sf2:2:0',
              'name': 'First Trompette',
              'program': 0,
-             'type': 'trompette'},
+             'type': 'trompette',
+             'sample_size': 200},
             {'bank': 2,
              'note': -1,
              'id': 'test.sf2:2:1',
              'name': 'Second Trompette',
              'program': 1,
-             'type': 'trompette'},
+             'type': 'trompette',
+             'sample_size': 200},
             {'bank': 3,
              'note': -1,
              'id': 'test.sf2:3:0',
              'name': 'Keynoise',
              'program': 0,
-             'type': 'keynoise'},
+             'type': 'keynoise',
+             'sample_size': 200},
             {'bank': 10,
              'note': -1,
              'id': 'test.sf2:10:0',
              'name': 'Generic Sound',
              'program': 0,
-             'type': 'generic'}
+             'type': 'generic',
+             'sample_size': 200}
         ],
         'tool': 'Polyphone',
     }
@@ -175,6 +183,44 @@ def test_upload_invalid_soundfont_returns_error(client, tmpdata_dir):
     assert rv.status_code == 400
 
 
+def test_upload_rejects_non_soundfont_early(client, tmpdata_dir):
+    data = b'RIFF\x00\x00\x10\x00WAVEfmt ' + b'\0' * 1024 * 1024
+
+    rv = client.post('/api/upload/sound/test.sf2', data=data)
+
+    assert rjson(rv) == {'message': 'Invalid file format, is this really a SoundFont?'}
+    assert rv.status_code == 400
+    assert not os.path.exists(os.path.join(tmpdata_dir, 'test.sf2.part'))
+
+
+def test_resumable_upload(client, tmpdata_dir):
+    with open(os.path.join(get_testdata_dir(), 'sounds/mg.sf2'), 'rb') as f:
+        data = f.read()
+    total = len(data)
+
+    rv = client.post('/api/upload/sound/test.sf2', data=data[:500], headers={
+        'Content-Range': 'bytes 0-499/{}'.format(total)})
+    assert rv.status_code == 202
+    assert rjson(rv) == {'offset': 500}
+
+    rv = client.get('/api/upload/sound/test.sf2')
+    assert rjson(rv) == {'offset': 500}
+
+    # a part that doesn't continue at the current offset is rejected
+    rv = client.post('/api/upload/sound/test.sf2', data=data[600:], headers={
+        'Content-Range': 'bytes 600-{}/{}'.format(total - 1, total)})
+    assert rv.status_code == 409
+    assert rjson(rv)['offset'] == 500
+
+    rv = client.post('/api/upload/sound/test.sf2', data=data[500:], headers={
+        'Content-Range': 'bytes 500-{}/{}'.format(total - 1, total)})
+    assert rv.status_code == 200
+    assert rjson(rv)['id'] == 'test.sf2'
+    assert rjson(rv)['sounds'] == [dict(s, id=s['id'].replace('mg.sf2', 'test.sf2'))
+                                   for s in MG_SOUNDFONT['sounds']]
+    assert not os.path.exists(os.path.join(tmpdata_dir, 'test.sf2.part'))
+
+
 MG_SOUNDFONT = {
     'author': 'Marcus Weseloh',
     'copyright': 'Marcus Weseloh 2017',
@@ -191,49 +237,57 @@ MG_SOUNDFONT = {
          'id': 'mg.sf2:0:0',
          'name': 'First Melody',
          'program': 0,
-         'type': 'melody'},
+         'type': 'melody',
+         'sample_size': 200},
         {'bank': 0,
          'note': -1,
          'id': 'mg.sf2:0:1',
          'name': 'Second Melody',
          'program': 1,
-         'type': 'melody'},
+         'type': 'melody',
+         'sample_size': 200},
         {'bank': 1,
          'note': 50,
          'id': 'mg.sf2:1:0',
          'name': 'First Drone',
          'program': 0,
-         'type': 'drone'},
+         'type': 'drone',
+         'sample_size': 200},
         {'bank': 1,
          'note': -1,
          'id': 'mg.sf2:1:1',
          'name': 'Second Drone',
          'program': 1,
-         'type': 'drone'},
+         'type': 'drone',
+         'sample_size': 200},
         {'bank': 2,
          'note': -1,
          'id': 'mg.sf2:2:0',
          'name': 'First Trompette',
          'program': 0,
-         'type': 'trompette'},
+         'type': 'trompette',
+         'sample_size': 200},
         {'bank': 2,
          'note': -1,
          'id': 'mg.sf2:2:1',
          'name': 'Second Trompette',
          'program': 1,
-         'type': 'trompette'},
+         'type': 'trompette',
+         'sample_size': 200},
         {'bank': 3,
          'note': -1,
          'id': 'mg.sf2:3:0',
          'name': 'Keynoise',
          'program': 0,
-         'type': 'keynoise'},
+         'type': 'keynoise',
+         'sample_size': 200},
         {'bank': 10,
          'note': -1,
          'id': 'mg.sf2:10:0',
          'name': 'Generic Sound',
          'program': 0,
-         'type': 'generic'}
+         'type': 'generic',
+         'sample_size': 200}
     ],
     'tool': 'Polyphone',
 }
@@ -0,0 +1,41 @@
+import json
+import pytest
+
+from mg.server.app import app as flask_app
+from mg.state import State
+from mg.telemetry import telemetry
+from mg.tests.conf import settings
+
+
+@pytest.fixture
+def client(fluid):
+    fluid.active_voices = 4
+    telemetry.setup(fluid, State(settings), size=10)
+    telemetry.reset()
+    return flask_app.test_client()
+
+
+def rjson(response):
+    return json.loads(response.data.decode('utf8'))
+
+
+def test_get_telemetry(client):
+    telemetry.sample()
+    telemetry.sample()
+
+    rv = client.get('/api/telemetry')
+    data = rjson(rv)
+    assert data['polyphony'] == 64
+    assert data['totals']['samples'] == 2
+    assert len(data['samples']) == 2
+    assert data['samples'][0]['active_voices'] == 4
+
+    rv = client.get('/api/telemetry?since={}'.format(data['samples'][-1]['time']))
+    assert rjson(rv)['samples'] == []
+
+
+def test_reset_telemetry(client):
+    telemetry.sample()
+    rv = client.delete('/api/telemetry')
+    assert rjson(rv)['samples'] == []
+    assert telemetry.totals['samples'] == 0
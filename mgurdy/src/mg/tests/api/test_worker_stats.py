@@ -0,0 +1,28 @@
+import json
+import pytest
+
+from mg.server.app import app as flask_app
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
+
+def rjson(response):
+    return json.loads(response.data.decode('utf8'))
+
+
+def test_get_worker_stats(client):
+    rv = client.get('/api/core/worker')
+    data = rjson(rv)
+    assert rv.status_code == 200
+    assert data['deadline_misses'] <= data['ticks']
+    for name in ('wakeup', 'tick', 'core_lock', 'state_lock', 'sync'):
+        assert len(data[name]['histogram']) == len(data['buckets'])
+        assert sum(data[name]['histogram']) == data['ticks']
+
+
+def test_reset_worker_stats(client):
+    rv = client.delete('/api/core/worker')
+    assert rv.status_code == 200
@@ -0,0 +1,102 @@
+import pytest
+
+
+def fluidsynth_error(message):
+    # imported late, so that tests using the fakes don't need the compiled
+    # FluidSynth bindings
+    from mg.fluidsynth.api import FluidSynthError
+    return FluidSynthError(message)
+
+
+class FakeLADSPA:
+    def __init__(self):
+        self.active = True
+        self.graph = None
+        # make the next apply() fail
+        self.fail = False
+
+    def apply(self, graph):
+        if self.fail:
+            self.fail = False
+            self.graph = None
+            raise fluidsynth_error('Unable to add effect')
+        self.graph = graph
+
+    def bypass(self):
+        self.active = False
+
+    def resume(self):
+        self.active = True
+
+
+class FakeFluidSynth:
+    """
+    Stands in for mg.fluidsynth.api.FluidSynth in tests that don't need a
+    running synth. Load values are set by the tests, everything sent to the
+    synth is recorded.
+    """
+    def __init__(self):
+        self.ladspa = FakeLADSPA()
+        self.config = {}
+        self.cpu_load = 10.0
+        # CPU load per audio period size, used instead of cpu_load if set
+        self.period_loads = None
+        self.active_voices = 0
+        self.polyphony = 64
+        self.important = None
+        self.channels = {}
+        self.notes = []
+        self.driver_restarts = 0
+        # period sizes the audio driver can't be started with
+        self.failing_period_sizes = set()
+
+    def configure(self, config):
+        self.config.update(config)
+
+    def stop_audio_driver(self):
+        pass
+
+    def start_audio_driver(self):
+        if self.config.get('audio.period-size') in self.failing_period_sizes:
+            raise fluidsynth_error('Unable to create synth audio driver')
+        self.driver_restarts += 1
+
+    def get_sample_rate(self):
+        return 48000.0
+
+    def get_cpu_load(self):
+        if self.period_loads:
+            return self.period_loads[self.config['audio.period-size']]
+        return self.cpu_load
+
+    def get_active_voice_count(self):
+        return self.active_voices
+
+    def get_polyphony(self):
+        return self.polyphony
+
+    def set_polyphony(self, polyphony):
+        self.polyphony = polyphony
+
+    def set_important_channels(self, channels):
+        self.important = set(channels)
+
+    def set_channel_sound(self, channel, font, bank, program):
+        self.channels[channel] = (font, bank, program)
+
+    def clear_channel_sound(self, channel):
+        self.channels.pop(channel, None)
+
+    def noteon(self, channel, key, velocity):
+        self.notes.append((channel, key))
+
+    def cc_command(self, channel, ctrl, val):
+        return (channel, 'cc', ctrl, val)
+
+    def send_commands(self, commands):
+        pass
+
+
+@pytest.fixture
+def fluid():
+    return FakeFluidSynth()
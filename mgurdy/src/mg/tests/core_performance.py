@@ -0,0 +1,50 @@
+"""
+Runs the core modelling faster than realtime with synthetic key and wheel
+input and reports the ticks per second and the time per tick of each stage.
+
+Run with: pytest -s mg/tests/core_performance.py
+
+Set MG_BENCH_RECORDING to the path of a sensor recording to also benchmark
+the replay of a real performance.
+"""
+import os
+
+from mg.mglib import mgcore
+
+
+TICKS = 100000
+
+STRINGS = ('melody1', 'melody2', 'drone1', 'trompette1', 'keynoise1')
+
+
+def report(name, result):
+    print('{:>24}: {:9d} ticks/s, {:6.1f}x realtime, {}'.format(
+        name, result['ticks_per_second'], result['realtime_factor'],
+        ', '.join('{} {} ns'.format(stage, data['mean_ns']) for stage, data in result['stages'].items())))
+
+
+def unmute(strings):
+    mgcore.set_string_params([(string, 'mute', 0 if string in strings else 1)
+                              for string in STRINGS])
+
+
+def test_simulate_strings():
+    print()
+    try:
+        for strings in (('melody1',), ('melody1', 'drone1'), STRINGS):
+            unmute(strings)
+            report(' + '.join(strings), mgcore.simulate(TICKS))
+    finally:
+        unmute(())
+
+
+def test_simulate_recording():
+    filename = os.environ.get('MG_BENCH_RECORDING')
+    if not filename:
+        return
+    unmute(STRINGS)
+    try:
+        print()
+        report(os.path.basename(filename), mgcore.simulate(TICKS, filename))
+    finally:
+        unmute(())
@@ -0,0 +1,92 @@
+"""
+Renders presets offline with the synth settings and effects of the
+instrument and reports the render time per second of audio, i.e. the CPU
+cost of each preset.
+
+Run with: pytest -s mg/tests/fluidsynth_performance.py
+
+The LADSPA effects are only used if they are installed. Set
+MG_BENCH_PRESETS to the path of an mg.db to also benchmark its presets, using
+the sounds in MG_BENCH_SOUND_DIR.
+"""
+import os
+
+from mg.fluidsynth.api import FluidSynthError
+from mg.fluidsynth.render import PresetRenderer
+from mg.tests.conf import settings
+
+
+def voice(program, note=60, bank=0, interpolation='auto'):
+    return {'soundfont': 'mg.sf2', 'bank': bank, 'program': program,
+            'muted': False, 'note': note, 'interpolation': interpolation}
+
+
+PRESETS = (
+    ('melody', {'melody': [voice(0)]}),
+    ('melody + drone', {'melody': [voice(0)], 'drone': [voice(1, 48)]}),
+    ('all strings', {
+        'melody': [voice(0), voice(0, 67), voice(1, 72)],
+        'drone': [voice(1, 48), voice(1, 55), voice(0, 43)],
+        'trompette': [voice(0, 60, 1), voice(0, 67, 1), voice(0, 72, 1)],
+    }),
+)
+
+
+def create_renderer(sound_dir):
+    try:
+        return PresetRenderer(sound_dir)
+    except FluidSynthError as e:
+        print('\nRendering without effects: {}'.format(e))
+        return PresetRenderer(sound_dir, effects=False)
+
+
+def report(name, cost):
+    print('{:>24}: {:7.1f} ms per second of audio'.format(name, cost * 1000))
+
+
+def test_render_presets():
+    renderer = create_renderer(settings.sound_dir)
+    try:
+        print()
+        for name, voices in PRESETS:
+            report(name, renderer.render_preset({'voices': voices}, 10))
+    finally:
+        renderer.stop()
+
+
+def test_render_interpolation_methods():
+    """
+    CPU cost of all strings playing with each interpolation method, compared
+    to 7th order interpolation
+    """
+    renderer = create_renderer(settings.sound_dir)
+    try:
+        costs = {}
+        for method in ('7th', '4th', 'linear', 'none', 'auto'):
+            voices = {
+                voice_type: [voice(program, note, interpolation=method)
+                             for program, note in ((0, 55), (1, 62), (0, 67))]
+                for voice_type in ('melody', 'drone', 'trompette')
+            }
+            costs[method] = renderer.render_preset({'voices': voices}, 10)
+        print()
+        for method, cost in costs.items():
+            print('{:>24}: {:7.1f} ms per second of audio, {:5.1f}% saved'.format(
+                method, cost * 1000, (1 - cost / costs['7th']) * 100))
+    finally:
+        renderer.stop()
+
+
+def test_render_database_presets():
+    db_path = os.environ.get('MG_BENCH_PRESETS')
+    if not db_path:
+        return
+    from mg import db
+    db.initialize(db_path)
+    renderer = create_renderer(os.environ.get('MG_BENCH_SOUND_DIR', settings.sound_dir))
+    try:
+        print()
+        for preset in db.Preset.select().order_by(db.Preset.number):
+            report('{} {}'.format(preset.number, preset.name), renderer.render_preset(preset.get_data(), 10))
+    finally:
+        renderer.stop()
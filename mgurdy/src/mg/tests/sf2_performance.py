@@ -0,0 +1,209 @@
+"""
+Compares the mmap based Sf2File parser with the previous parser, which
+walked the RIFF tree with many small reads, and the memory used by the
+PresetTable with the previous list of Sound tuples.
+
+Run with: pytest -s mg/tests/sf2_performance.py
+
+Set MG_BENCH_SOUNDFONTS to a colon separated list of SoundFont files to
+benchmark real (e.g. large General MIDI) fonts in addition to the
+generated one.
+"""
+import os
+import struct
+import sys
+import time
+
+from mg.sf2 import PresetTable, Sf2File, SoundFont, Sound, from_cstr
+
+
+class LegacySf2File(object):
+    """
+    The original parser implementation, kept here as the benchmark baseline
+    """
+
+    def __init__(self, sf2file):
+        self.file = sf2file
+        self.list_size = 0
+        self.presets = []
+        self.strings = {}
+        try:
+            self.parse_next()
+        except EOFError:
+            pass
+
+    def parse_size(self):
+        chunk_size, = struct.unpack(r'<I', self.file.read(4))
+        return chunk_size
+
+    def parse_next(self):
+        data = self.file.read(4)
+        if len(data) < 4:
+            raise EOFError()
+        chunk_id, = struct.unpack(r'4s', data)
+        self.parser_map.get(chunk_id, LegacySf2File.skip_chunk)(self, chunk_id)
+
+    def parse_riff(self, chunk_id):
+        self.parse_size()
+        self.parse_next()
+
+    def parse_sfbk(self, chunk_id):
+        self.parse_next()
+        self.parse_next()
+        self.parse_next()
+
+    def parse_list(self, chunk_id):
+        self.list_size = self.parse_size()
+        self.parse_next()
+
+    def parse_array(self, chunk_id):
+        end_size = self.file.tell() + self.list_size - 4
+        while self.file.tell() < end_size:
+            self.parse_next()
+
+    def parse_str(self, chunk_id):
+        size = min(self.parse_size(), 65536)
+        self.strings[chunk_id] = from_cstr(self.file.read(size))
+
+    def parse_phdr(self, chunk_id):
+        end_pos = self.file.tell() + self.parse_size()
+        while self.file.tell() < end_pos:
+            data = struct.unpack(r'<20sHHHIII', self.file.read(38))
+            (name, prog, bank, _, _, _, _) = data
+            self.presets.append((bank, prog, from_cstr(name)))
+        self.presets.pop()
+        self.presets.sort()
+
+    def ignore_chunk(self, chunk_id):
+        self.parse_next()
+
+    def skip_chunk(self, chunk_id):
+        self.file.seek(self.parse_size(), 1)
+
+    parser_map = {
+        b'RIFF': parse_riff,
+        b'LIST': parse_list,
+        b'sfbk': parse_sfbk,
+        b'INFO': parse_array,
+        b'INAM': parse_str,
+        b'IPRD': parse_str,
+        b'ICMT': parse_str,
+        b'sdta': parse_array,
+        b'pdta': ignore_chunk,
+        b'phdr': parse_phdr,
+    }
+
+
+def chunk(chunk_id, data):
+    if len(data) % 2:
+        data += b'\0'
+    return chunk_id + struct.pack(r'<I', len(data)) + data
+
+
+def write_soundfont(path, preset_count, sample_bytes):
+    """
+    Write a General MIDI sized SoundFont with preset_count presets and a
+    sparse sample chunk of sample_bytes
+    """
+    info = b'INFO' + chunk(b'ifil', struct.pack(r'<HH', 2, 1)) + \
+        chunk(b'INAM', b'Benchmark GM\0') + \
+        chunk(b'IPRD', b'Benchmark\0') + \
+        chunk(b'ICMT', b'x' * 4000 + b'\0')
+
+    phdr = b''.join(
+        struct.pack(r'<20sHHHIII', 'Preset {}'.format(i).encode(), i % 128, i // 128, i, 0, 0, 0)
+        for i in range(preset_count + 1))
+    pdta = b'pdta' + chunk(b'phdr', phdr)
+    for chunk_id in (b'pbag', b'pmod', b'pgen', b'inst', b'ibag', b'imod', b'igen', b'shdr'):
+        pdta += chunk(chunk_id, b'\0' * 64)
+
+    with open(path, 'wb') as f:
+        sdta_header = b'sdta' + b'smpl' + struct.pack(r'<I', sample_bytes)
+        body = chunk(b'LIST', info)
+        body += b'LIST' + struct.pack(r'<I', len(sdta_header) + sample_bytes) + sdta_header
+        riff_size = 4 + len(body) + sample_bytes + len(chunk(b'LIST', pdta))
+        f.write(b'RIFF' + struct.pack(r'<I', riff_size) + b'sfbk' + body)
+        f.seek(sample_bytes, 1)
+        f.write(chunk(b'LIST', pdta))
+
+
+def time_parser(name, parser, path, iterations, presets=True):
+    t0 = time.time()
+    for _ in range(iterations):
+        with open(path, 'rb') as f:
+            sf2 = parser(f)
+            if presets:
+                sf2.presets
+            if hasattr(sf2, 'close'):
+                sf2.close()
+    t1 = time.time()
+    print('{:>24}: {:8.3f} ms per parse'.format(name, (t1 - t0) * 1000 / iterations))
+
+
+def benchmark_file(path, iterations):
+    print('\n{} ({:.1f} MB)'.format(path, os.path.getsize(path) / 1024 / 1024))
+    time_parser('legacy', LegacySf2File, path, iterations)
+    time_parser('mmap', Sf2File, path, iterations)
+    time_parser('mmap (info only)', Sf2File, path, iterations, presets=False)
+
+
+def test_sf2_parser_performance(tmpdir):
+    path = str(tmpdir.join('gm.sf2'))
+    write_soundfont(path, preset_count=2000, sample_bytes=150 * 1024 * 1024)
+    benchmark_file(path, 50)
+
+    for path in os.environ.get('MG_BENCH_SOUNDFONTS', '').split(':'):
+        if path:
+            benchmark_file(path, 20)
+
+
+def legacy_sounds(sf, path):
+    """
+    The previous representation of the presets of a SoundFont
+    """
+    with open(path, 'rb') as f, Sf2File(f) as sf2:
+        return [Sound(sf, bank, program, name, 'generic', -1, 0)
+                for bank, program, name in sf2.presets]
+
+
+def deep_size(obj, seen=None):
+    """
+    Size of obj and everything it references, counting shared objects
+    only once. SoundFont back references are not followed.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or isinstance(obj, SoundFont):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple)):
+        size += sum(deep_size(item, seen) for item in obj)
+    elif isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, PresetTable):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def benchmark_memory(path):
+    print('\n{} (memory)'.format(path))
+    sf = SoundFont(path)
+    count = len(sf.sounds)
+
+    def report(name, size):
+        print('{:>24}: {:8.1f} KB, {:6.1f} bytes per preset'.format(
+            name, size / 1024, size / count))
+
+    report('Sound list', deep_size(legacy_sounds(sf, path)))
+    report('PresetTable', deep_size(sf.sounds))
+
+
+def test_preset_table_memory(tmpdir):
+    path = str(tmpdir.join('gm.sf2'))
+    write_soundfont(path, preset_count=2000, sample_bytes=1024)
+    benchmark_memory(path)
+
+    for path in os.environ.get('MG_BENCH_SOUNDFONTS', '').split(':'):
+        if path:
+            benchmark_memory(path)
@@ -0,0 +1,66 @@
+import pytest
+
+from mg.bypass import EffectBypass
+
+
+@pytest.fixture
+def bypass(fluid):
+    bypass = EffectBypass()
+    bypass.setup(fluid, tail=2)
+    return bypass
+
+
+def test_bypass_after_tail(bypass):
+    fluid = bypass.fluid
+    fluid.active_voices = 3
+    bypass.check(now=0)
+    fluid.active_voices = 0
+    bypass.check(now=1)
+    bypass.check(now=2)
+    assert fluid.ladspa.active
+
+    bypass.check(now=3)
+    assert not fluid.ladspa.active
+    assert bypass.get_stats(now=3)['bypassed']
+
+
+def test_resume_on_next_voice(bypass):
+    fluid = bypass.fluid
+    bypass.check(now=0)
+    bypass.check(now=2)
+    assert not fluid.ladspa.active
+
+    fluid.active_voices = 1
+    bypass.check(now=10)
+    assert fluid.ladspa.active
+
+    # new tail after the voice has stopped
+    fluid.active_voices = 0
+    bypass.check(now=11)
+    bypass.check(now=12)
+    assert fluid.ladspa.active
+
+
+def test_stats(bypass):
+    fluid = bypass.fluid
+    bypass.check(now=0)
+    fluid.cpu_load = 20.0
+    bypass.check(now=1)
+    bypass.check(now=2)
+    fluid.cpu_load = 5.0
+    bypass.check(now=6)
+    fluid.active_voices = 1
+    bypass.check(now=12)
+
+    stats = bypass.get_stats(now=20)
+    assert stats == {
+        'bypassed': False,
+        'bypass_count': 1,
+        'bypassed_time': 10.0,
+        'silent_cpu_load': 20.0,
+        'bypassed_cpu_load': 5.0,
+        'cpu_saved': 1.5,
+    }
+
+    bypass.reset()
+    assert bypass.get_stats()['bypassed_time'] == 0
@@ -2,7 +2,7 @@ import os
 
 import pytest
 
-from mg.fluidsynth.api import FluidSynth, FluidSynthError
+from mg.fluidsynth.api import FluidSynth, FluidSynthError, write_wav
 from mg.tests.conf import settings
 
 
@@ -51,6 +51,128 @@ def test_select_sound_with_missing_file_raises_error(fs):
         fs.set_channel_sound(0, 'blafoo.sf2', 0, 0)
 
 
+def test_load_font_async_shares_concurrent_loads(fs):
+    fs.unload_unused_soundfonts()
+
+    f1 = fs.load_font_async('test.sf2')
+    f2 = fs.load_font_async('test.sf2')
+
+    assert f1 is f2 or f1.result() == f2.result()
+    assert fs.load_font('test.sf2') == f1.result()
+
+
+def test_select_sound_in_background(fs):
+    ready = fs.set_channel_sound(2, 'mg.sf2', 0, 0, wait=False)
+
+    assert ready.result(timeout=5) == fs.load_font('mg.sf2')
+    assert not fs.is_channel_pending(2)
+    assert fs.get_loaded_fonts()['mg.sf2'] >= 1
+
+
+def test_select_sound_in_background_is_cancelled_by_newer_sound(fs):
+    fs.clear_all_channel_sounds()
+    fs.unload_unused_soundfonts()
+
+    first = fs.set_channel_sound(3, 'mg.sf2', 0, 0, wait=False)
+    fs.set_channel_sound(3, 'test.sf2', 13, 37)
+
+    assert first.done()
+    assert fs.channels[3] == fs.load_font('test.sf2')
+
+
+def test_select_sound_in_background_with_missing_file(fs):
+    ready = fs.set_channel_sound(4, 'blafoo.sf2', 0, 0, wait=False)
+
+    with pytest.raises(FluidSynthError):
+        ready.result(timeout=5)
+    assert not fs.is_channel_pending(4)
+
+
+def test_trim_soundfonts_keeps_fonts_within_cache_size(fs):
+    fs.clear_all_channel_sounds()
+    fs.unload_unused_soundfonts()
+    mg_size = os.path.getsize(os.path.join(settings.sound_dir, 'mg.sf2'))
+    test_size = os.path.getsize(os.path.join(settings.sound_dir, 'test.sf2'))
+
+    fs.font_cache_size = mg_size + test_size
+    fs.set_channel_sound(0, 'test.sf2', 13, 37)
+    fs.set_channel_sound(0, 'mg.sf2', 0, 0)
+    fs.trim_soundfonts()
+    assert fs.get_loaded_fonts() == {'test.sf2': 0, 'mg.sf2': 1}
+
+    fs.font_cache_size = mg_size
+    fs.trim_soundfonts()
+    assert fs.get_loaded_fonts() == {'mg.sf2': 1}
+
+
+def test_trim_soundfonts_evicts_least_recently_used_first(fs):
+    fs.clear_all_channel_sounds()
+    fs.unload_unused_soundfonts()
+    fs.font_cache_size = os.path.getsize(os.path.join(settings.sound_dir, 'test.sf2'))
+
+    fs.load_font('test.sf2')
+    fs.load_font('mg.sf2')
+    fs.load_font('test.sf2')
+    fs.trim_soundfonts()
+
+    assert fs.get_loaded_fonts() == {'test.sf2': 0}
+
+
+def test_trim_soundfonts_keeps_pinned_fonts(fs):
+    fs.clear_all_channel_sounds()
+    fs.unload_unused_soundfonts()
+    fs.font_cache_size = 0
+
+    fs.pin_sound('mg.sf2', 0, 0)
+    fs.trim_soundfonts()
+    assert fs.get_loaded_fonts() == {'mg.sf2': 0}
+
+    fs.unpin_all_sounds()
+    fs.trim_soundfonts()
+    assert fs.get_loaded_fonts() == {}
+
+
+def test_unpin_sound(fs):
+    fs.pin_sound('mg.sf2', 0, 0)
+    fs.pin_sound('mg.sf2', 0, 1)
+
+    assert fs.unpin_sound('mg.sf2', 0, 0)
+    assert not fs.unpin_sound('mg.sf2', 0, 0)
+    assert [(e['bank'], e['program']) for e in fs.pinned_sounds] == [(0, 1)]
+    fs.unpin_all_sounds()
+
+
+def test_pin_owners(fs):
+    fs.pin_sound('mg.sf2', 0, 0, owner='preload')
+    fs.pin_sound('mg.sf2', 0, 0, owner='predictor')
+    fs.pin_sound('mg.sf2', 0, 1, owner='preload')
+
+    # still pinned by the preload
+    assert not fs.unpin_sound('mg.sf2', 0, 0, owner='predictor')
+    assert len(fs.pinned_sounds) == 2
+
+    fs.pin_sound('mg.sf2', 0, 0, owner='predictor')
+    fs.unpin_all_sounds(owner='preload')
+    assert [(e['bank'], e['program']) for e in fs.pinned_sounds] == [(0, 0)]
+    assert fs.unpin_sound('mg.sf2', 0, 0, owner='predictor')
+    assert fs.pinned_sounds == []
+
+
+def test_font_cache_stats(fs):
+    fs.clear_all_channel_sounds()
+    fs.unload_unused_soundfonts()
+    before = fs.get_font_cache_stats()
+
+    fs.load_font('mg.sf2')
+    fs.load_font('mg.sf2')
+
+    stats = fs.get_font_cache_stats()
+    assert stats['misses'] == before['misses'] + 1
+    assert stats['hits'] == before['hits'] + 1
+    assert stats['fonts'] == 1
+    assert stats['size'] == os.path.getsize(os.path.join(settings.sound_dir, 'mg.sf2'))
+
+
 def test_set_reverb(fs):
     fs.set_reverb(roomsize=0.5, damping=0.4, width=0.3, level=0.2)
     fs.set_reverb(roomsize=1, damping=2, width=3, level=4)
@@ -67,6 +189,31 @@ def test_set_channel_volume(fs):
         fs.set_channel_volume(16, 127)
 
 
+def test_send_commands(fs):
+    commands = fs.fine_tune_commands(0, 50) + [
+        fs.cc_command(1, 7, 100),
+        fs.program_select_command(2, fs.load_font('mg.sf2'), 1, 0),
+    ]
+    fs.send_commands(commands)
+
+
+def test_send_commands_reports_failed_command(fs):
+    commands = [fs.cc_command(1, 7, 100), fs.cc_command(1, 7, 300)]
+    with pytest.raises(FluidSynthError) as e:
+        fs.send_commands(commands)
+    assert '300' in str(e.value)
+
+
+def test_send_commands_with_command_sender(fs):
+    sent = []
+    fs.command_sender = lambda synth, commands: sent.append(commands) or 0
+    try:
+        fs.send_commands([fs.cc_command(1, 7, 100)])
+    finally:
+        fs.command_sender = None
+    assert sent == [[(1, 'cc', 7, 100)]]
+
+
 def test_set_pitch_bend_range(fs):
     fs.set_pitch_bend_range(0, 5)
 
@@ -74,3 +221,33 @@ def test_set_pitch_bend_range(fs):
 def test_get_cpu_load(fs):
     load = fs.get_cpu_load()
     assert load > 0
+
+
+def test_render(tmpdir):
+    api = FluidSynth(soundfont_dir=settings.sound_dir)
+    api.start(audio=False)
+    try:
+        api.set_channel_sound(0, 'mg.sf2', 0, 0)
+        api.noteon(0, 60, 127)
+        samples = api.render(1000, block_size=64)
+        assert len(samples) == 2000
+        assert any(samples)
+
+        filename = str(tmpdir.join('render.wav'))
+        write_wav(filename, samples, api.get_sample_rate())
+        assert os.path.getsize(filename) == 44 + 4000
+    finally:
+        api.stop()
+
+
+def test_render_requires_offline_mode(fs):
+    with pytest.raises(FluidSynthError):
+        fs.render(64)
+
+
+def test_set_interp_method(fs):
+    for method in ('none', 'linear', '4th', '7th'):
+        fs.set_interp_method(0, method)
+
+    with pytest.raises(FluidSynthError):
+        fs.set_interp_method(0, 'cubic')
@@ -0,0 +1,111 @@
+import pytest
+
+from mg import db
+from mg.latency import LatencyTuner, STRESS_CHANNELS
+from mg.state import State
+from mg.tests.conf import settings
+
+
+# CPU load per period size, smaller periods are more expensive
+PERIOD_LOADS = {32: 120.0, 64: 85.0, 128: 60.0, 256: 40.0}
+
+
+@pytest.fixture
+def tuner(fluid):
+    db.initialize(':memory:')
+    fluid.period_loads = PERIOD_LOADS
+    state = State(settings)
+    voice = state.preset.melody[0]
+    voice.soundfont_id = 'mg.sf2'
+    tuner = LatencyTuner()
+    tuner.SETTLE_TIME = 0
+    tuner.setup(fluid, state)
+    return tuner
+
+
+def test_calibrate_finds_smallest_stable_period_size(tuner):
+    config = tuner.calibrate(duration=0.01, headroom=20)
+    assert config == {'periods': 2, 'period_size': 128}
+    assert [r['period_size'] for r in tuner.results] == [32, 64, 128]
+    assert [r['stable'] for r in tuner.results] == [False, False, True]
+    assert tuner.results[0]['xruns'] > 0
+
+    assert tuner.fluid.config['audio.period-size'] == 128
+    assert db.load_audio_config() == config
+
+    # stress sounds are removed again
+    assert not tuner.fluid.channels
+    assert {channel for channel, _ in tuner.fluid.notes} == set(STRESS_CHANNELS)
+
+
+def test_calibrate_keeps_config_if_nothing_is_stable(tuner):
+    assert tuner.calibrate(duration=0.01, headroom=70) is None
+    assert len(tuner.results) == 4
+    assert tuner.config == {'periods': 2, 'period_size': 64}
+    assert tuner.fluid.config['audio.period-size'] == 64
+    assert db.load_audio_config() is None
+
+
+def test_calibrate_skips_failing_period_sizes(tuner):
+    tuner.fluid.failing_period_sizes = {32, 128}
+    config = tuner.calibrate(duration=0.01, headroom=50)
+    assert config == {'periods': 2, 'period_size': 256}
+    assert [r['stable'] for r in tuner.results] == [False, False, False, True]
+    assert 'error' in tuner.results[0]
+    assert 'error' in tuner.results[2]
+    assert tuner.fluid.config['audio.period-size'] == 256
+
+
+def test_calibrate_restores_config_on_errors(tuner):
+    tuner.fluid.failing_period_sizes = {32, 128, 256}
+    assert tuner.calibrate(duration=0.01, headroom=70) is None
+    assert tuner.config == {'periods': 2, 'period_size': 64}
+    assert tuner.fluid.config['audio.period-size'] == 64
+
+
+def test_start_calibration_in_background(tuner):
+    tuner.start_calibration(duration=0.01, headroom=20)
+    tuner.thread.join()
+    data = tuner.to_dict()
+    assert not data['calibrating']
+    assert data['calibrated'] is True
+    assert data['error'] is None
+    assert data['config'] == {'periods': 2, 'period_size': 128}
+    assert len(data['results']) == 3
+
+
+def test_background_calibration_error(tuner, monkeypatch):
+    def measure(config, duration):
+        raise ValueError('broken')
+
+    monkeypatch.setattr(tuner, 'measure', measure)
+    tuner.start_calibration(duration=0.01)
+    tuner.thread.join()
+    data = tuner.to_dict()
+    assert data['error'] == 'broken'
+    assert data['calibrated'] is None
+    assert tuner.fluid.config['audio.period-size'] == 64
+    # the next calibration can be started again
+    assert not data['calibrating']
+
+
+def test_reset_refused_while_calibrating(tuner):
+    with tuner.running:
+        with pytest.raises(RuntimeError):
+            tuner.reset()
+        with pytest.raises(RuntimeError):
+            tuner.start_calibration()
+
+
+def test_calibrate_requires_sounds(tuner):
+    tuner.state.preset.melody[0].soundfont_id = None
+    with pytest.raises(RuntimeError):
+        tuner.calibrate(duration=0.01)
+
+
+def test_reset(tuner):
+    tuner.calibrate(duration=0.01)
+    tuner.reset()
+    assert db.load_audio_config() is None
+    assert tuner.config == {'periods': 2, 'period_size': 64}
+    assert tuner.to_dict()['latency'] == pytest.approx(2 * 64 * 1000 / 48000.0, abs=0.01)
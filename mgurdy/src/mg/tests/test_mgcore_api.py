@@ -1,3 +1,5 @@
+import array
+
 import pytest
 
 from mg.mglib.api import MGCore
@@ -46,6 +48,31 @@ def test_set_get_and_reset_ranges(mg, name):
     assert result == default
 
 
+def test_set_and_get_all_mapping_ranges(mg):
+    ranges = [{'src': 0, 'dst': 0}, {'src': 1, 'dst': 10}]
+    unchanged = mg.get_mapping_ranges('speed_to_chien')
+
+    mg.set_all_mapping_ranges({'keyvel_to_notevel': ranges, 'pressure_to_poly': ranges})
+
+    result = mg.get_all_mapping_ranges()
+    assert result['keyvel_to_notevel'] == ranges
+    assert result['pressure_to_poly'] == ranges
+    assert result['speed_to_chien'] == unchanged
+
+    mg.reset_mapping_ranges('keyvel_to_notevel')
+    mg.reset_mapping_ranges('pressure_to_poly')
+
+
+def test_set_and_get_key_calibration_array(mg):
+    values = array.array('f', [0.5, 1.25] * 24)
+    mg.set_key_calibration_array(values)
+    assert mg.get_key_calibration_array() == values
+    assert mg.get_key_calibration()[3] == {'pressure': 0.5, 'velocity': 1.25}
+
+    mg.set_key_calibration([{'pressure': 1.0, 'velocity': 1.0}] * 24)
+    assert mg.get_key_calibration_array() == array.array('f', [1.0] * 48)
+
+
 def test_invalid_mapping_name_raises_exception(mg):
     with pytest.raises(Exception):
         mg.get_mapping_ranges('blafoo')
@@ -62,3 +89,72 @@ def test_invalid_mapping_name_raises_exception(mg):
 def test_mute_string(mg, name):
     mg.mute_string(name, False)
     mg.mute_string(name, True)
+
+
+def test_unchanged_string_params_are_not_sent(mg):
+    mg.set_string_params([('melody1', 'volume', 100), ('melody1', 'panning', 64)])
+    assert mg.get_string_param_stats() == {'sent': 2, 'suppressed': 0}
+
+    mg.set_string_params([('melody1', 'volume', 100), ('melody1', 'panning', 20)])
+    assert mg.get_string_param_stats() == {'sent': 3, 'suppressed': 1}
+
+    mg.switch_channel_bank(0, [('melody1', 'volume', 100)])
+    assert mg.get_string_param_stats() == {'sent': 3, 'suppressed': 2}
+
+
+def test_invalidated_string_params_are_sent_again(mg):
+    mg.set_string_params([('drone1', 'mute', 1)])
+    mg.string_params.invalidate()
+    mg.set_string_params([('drone1', 'mute', 1)])
+    assert mg.get_string_param_stats() == {'sent': 2, 'suppressed': 0}
+
+
+def test_invalid_string_param_raises_exception(mg):
+    with pytest.raises(KeyError):
+        mg.set_string_params([('melody1', 'blafoo', 1)])
+
+
+def test_worker_stats(mg):
+    stats = mg.read_worker_stats()
+    assert stats.seq % 2 == 0
+
+    data = mg.get_worker_stats()
+    assert data['buckets'][:4] == [0, 1, 2, 4]
+    assert data['tick']['max'] >= data['tick']['mean']
+
+
+def test_record_and_replay_sensors(mg, tmpdir):
+    filename = str(tmpdir.join('sensors.rec'))
+    mg.start_recording(max_events=100)
+    assert mg.stop_recording(filename) == 0
+
+    mg.start_replay(filename, speed=2.0, output='null')
+    status = mg.get_replay_status()
+    assert status['active'] is True
+    assert status['speed'] == 2.0
+    assert status['output'] == 'null'
+    assert status['events'] == 0
+
+    mg.stop_replay()
+    assert mg.get_replay_status()['active'] is False
+
+
+def test_invalid_replay_raises_exception(mg, tmpdir):
+    with pytest.raises(RuntimeError):
+        mg.stop_recording()
+
+    with pytest.raises(RuntimeError):
+        mg.start_replay(str(tmpdir.join('missing.rec')))
+
+    with pytest.raises(RuntimeError):
+        mg.start_replay(str(tmpdir.join('missing.rec')), output='blafoo')
+
+
+def test_simulate(mg):
+    result = mg.simulate(100)
+    assert result['ticks'] == 100
+    assert result['events'] > 0
+    assert set(result['stages'].keys()) == {'sensors', 'synth', 'model', 'sync'}
+
+    with pytest.raises(RuntimeError):
+        mg.simulate(100, output='blafoo')
@@ -0,0 +1,62 @@
+import pytest
+
+from mg.polyphony import PolyphonyController
+from mg.state import State
+from mg.tests.conf import settings
+
+
+@pytest.fixture
+def ctrl(fluid):
+    ctrl = PolyphonyController(fluid, State(settings), min_polyphony=40, max_polyphony=64)
+    ctrl.update_important_channels()
+    return ctrl
+
+
+def test_default_important_channels(ctrl):
+    assert ctrl.fluid.important == {4, 5, 6, 7, 8, 9, 14, 15, 16, 17, 18, 19}
+
+
+def test_lower_polyphony_under_load(ctrl):
+    ctrl.adapt(90)
+    assert ctrl.pressure
+    assert ctrl.fluid.polyphony == 56
+    # keynoise is dropped first
+    assert ctrl.fluid.important == {4, 5, 6, 7, 8, 14, 15, 16, 17, 18}
+
+    for i in range(5):
+        ctrl.adapt(90)
+    assert ctrl.fluid.polyphony == 40
+
+
+def test_raise_polyphony_with_headroom(ctrl):
+    ctrl.adapt(90)
+    ctrl.adapt(90)
+    assert ctrl.fluid.polyphony == 48
+
+    for i in range(ctrl.RAISE_AFTER - 1):
+        ctrl.adapt(30)
+    assert ctrl.fluid.polyphony == 48
+    ctrl.adapt(30)
+    assert ctrl.fluid.polyphony == 56
+
+    # medium load doesn't change anything, but restarts the wait
+    ctrl.adapt(60)
+    for i in range(ctrl.RAISE_AFTER):
+        ctrl.adapt(30)
+    assert ctrl.fluid.polyphony == 64
+    assert ctrl.pressure
+
+    for i in range(ctrl.RAISE_AFTER):
+        ctrl.adapt(30)
+    assert not ctrl.pressure
+    assert 9 in ctrl.fluid.important
+
+
+def test_protected_strings(ctrl):
+    ctrl.state.preset.melody[0].protected = True
+    ctrl.state.preset.drone[1].protected = True
+    ctrl.active_preset_voice_protected_changed()
+    assert ctrl.fluid.important == {0, 4, 10, 14}
+
+    ctrl.adapt(90)
+    assert ctrl.fluid.important == {0, 4, 10, 14}
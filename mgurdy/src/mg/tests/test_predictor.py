@@ -0,0 +1,134 @@
+import pytest
+
+from mg.db import initialize, Preset
+from mg.predictor import PresetPredictor
+from mg.sf2 import SoundFont, registry
+from mg.state import State
+from mg.tests.conf import settings
+
+
+class RecordingFluidSynth:
+    def __init__(self):
+        self.pinned = set()
+        self.pin_count = 0
+
+    def pin_sound(self, font_filename, bank, program, owner=None):
+        assert owner == 'predictor'
+        self.pinned.add((font_filename, bank, program))
+        self.pin_count += 1
+
+    def unpin_sound(self, font_filename, bank, program, owner=None):
+        assert owner == 'predictor'
+        self.pinned.discard((font_filename, bank, program))
+
+    def trim_soundfonts(self):
+        pass
+
+
+@pytest.fixture
+def predictor(tmpdir):
+    old_cache_dir = settings.cache_dir
+    settings.cache_dir = str(tmpdir)
+    SoundFont.FILE_CACHE.clear()
+    registry.invalidate()
+    initialize(':memory:')
+    for number, program in ((1, 0), (2, 1), (3, 0), (4, 1)):
+        preset = Preset(name='p{}'.format(number))
+        preset.set_data({
+            'voices': {
+                'melody': [{'soundfont': 'mg.sf2', 'bank': 0, 'program': program}],
+                'drone': [{'soundfont': 'mg.sf2', 'bank': 1, 'program': number % 2}],
+                'trompette': [],
+            }
+        })
+        preset.save()
+    state = State(settings)
+    state.mod1_key_mode = 'preset_prev'
+    state.mod2_key_mode = 'preset_next'
+    state.wrap_presets = False
+    yield PresetPredictor(RecordingFluidSynth(), state)
+    SoundFont.FILE_CACHE.clear()
+    registry.invalidate()
+    settings.cache_dir = old_cache_dir
+
+
+def activate(predictor, number):
+    preset = Preset.get(Preset.number == number)
+    predictor.state.preset.id = preset.id
+    predictor.state.last_preset_number = number
+    predictor.handle_event('active:preset:changed', {})
+
+
+def predicted_numbers(predictor):
+    return sorted(preset.number for preset in predictor.predict_presets())
+
+
+def test_predicts_adjacent_presets(predictor):
+    activate(predictor, 2)
+    assert predicted_numbers(predictor) == [1, 3]
+
+    activate(predictor, 1)
+    assert predicted_numbers(predictor) == [2]
+
+
+def test_predicts_wrapped_presets(predictor):
+    predictor.state.wrap_presets = True
+    activate(predictor, 1)
+    assert predicted_numbers(predictor) == [2, 4]
+
+
+def test_predicts_recent_presets_without_preset_keys(predictor):
+    predictor.state.mod1_key_mode = 'group_next'
+    predictor.state.mod2_key_mode = 'group_prev'
+    activate(predictor, 1)
+    activate(predictor, 4)
+    activate(predictor, 3)
+    activate(predictor, 4)
+
+    assert predicted_numbers(predictor) == [1, 3]
+
+
+def test_update_pins_and_unpins_sounds(predictor):
+    activate(predictor, 2)
+    predictor.update()
+    assert predictor.fluid.pinned == {('mg.sf2', 0, 0), ('mg.sf2', 1, 1)}
+
+    predictor.state.mod1_key_mode = 'group_next'
+    predictor.state.mod2_key_mode = 'group_prev'
+    activate(predictor, 4)
+    predictor.update()
+    assert predictor.fluid.pinned == {('mg.sf2', 0, 1), ('mg.sf2', 1, 0)}
+
+
+def test_update_releases_pins_when_all_presets_are_preloaded(predictor):
+    activate(predictor, 2)
+    predictor.update()
+    assert predictor.fluid.pinned
+
+    predictor.state.presets_preloaded = True
+    predictor.handle_event('presets_preloaded:changed', {})
+    predictor.update()
+    assert predictor.fluid.pinned == set()
+    assert predictor.pinned == set()
+
+
+def test_changed_font_is_unpinned_and_pinned_again(predictor):
+    activate(predictor, 2)
+    predictor.update()
+    pin_count = predictor.fluid.pin_count
+
+    # the file has been overwritten, the old font must not stay pinned
+    predictor.handle_event('sound:changed', {'id': 'mg.sf2'})
+    assert predictor.fluid.pinned == set()
+    assert predictor.pinned == set()
+
+    predictor.update()
+    assert predictor.fluid.pinned == {('mg.sf2', 0, 0), ('mg.sf2', 1, 1)}
+    assert predictor.fluid.pin_count == pin_count + 2
+
+
+def test_deleted_font_keeps_other_pins(predictor):
+    activate(predictor, 2)
+    predictor.update()
+    predictor.handle_event('sound:deleted', {'id': 'other.sf2'})
+    assert predictor.fluid.pinned == {('mg.sf2', 0, 0), ('mg.sf2', 1, 1)}
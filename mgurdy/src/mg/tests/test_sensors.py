@@ -0,0 +1,35 @@
+from mg.mglib.sensors import (
+    SensorEvents, read_recording, write_recording, synthetic_events, KEYS, WHEEL, EV_ABS, EV_SYN,
+)
+
+
+def test_wheel_events():
+    events = SensorEvents()
+    events.wheel(3, 100, 14, 1000)
+    assert events.events() == [
+        (3, WHEEL, EV_ABS, 0, 16283),
+        (3, WHEEL, EV_ABS, 1, 14),
+        (3, WHEEL, 4, 1, 1000),
+        (3, WHEEL, EV_SYN, 0, 0),
+    ]
+
+
+def test_synthetic_events_are_ordered_by_tick():
+    events = synthetic_events(1000, notes=(0, 2), note_ticks=100).events()
+    ticks = [event[0] for event in events]
+    assert ticks == sorted(ticks)
+
+    keys = [event for event in events if event[1] == KEYS]
+    assert keys[:4] == [
+        (0, KEYS, EV_ABS, 0, 1500),
+        (90, KEYS, EV_ABS, 0, 0),
+        (100, KEYS, EV_ABS, 2, 1500),
+        (190, KEYS, EV_ABS, 2, 0),
+    ]
+
+
+def test_write_and_read_recording(tmpdir):
+    filename = str(tmpdir.join('sensors.rec'))
+    events = synthetic_events(100)
+    write_recording(filename, events)
+    assert read_recording(filename).events() == events.events()
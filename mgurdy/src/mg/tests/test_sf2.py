@@ -0,0 +1,251 @@
+import os
+import shutil
+
+import pytest
+
+from mg.tests.conf import settings
+from mg.sf2 import PresetTable, SoundFont, Sf2StreamValidator, registry, write_subset
+from mg.subsets import subsets
+
+
+def get_testdata_dir():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(current_dir, 'data')
+
+
+@pytest.fixture
+def sound_dir(tmpdir):
+    old_dirs = (settings.sound_dir, settings.cache_dir)
+    settings.sound_dir = str(tmpdir.mkdir('sounds'))
+    settings.cache_dir = str(tmpdir.join('cache'))
+    shutil.copy(os.path.join(get_testdata_dir(), 'sounds/mg.sf2'), settings.sound_dir)
+    SoundFont.FILE_CACHE.clear()
+    registry.invalidate()
+    yield tmpdir.join('sounds')
+    SoundFont.FILE_CACHE.clear()
+    registry.invalidate()
+    settings.sound_dir, settings.cache_dir = old_dirs
+
+
+def test_load_all_writes_index(sound_dir):
+    soundfonts = SoundFont.load_all()
+
+    assert [sf.id for sf in soundfonts] == ['mg.sf2']
+    assert os.path.isfile(SoundFont.get_index().filepath)
+
+
+def test_index_is_used_instead_of_parsing(sound_dir, monkeypatch):
+    expected = SoundFont.load_all()[0].as_dict()
+    SoundFont.FILE_CACHE.clear()
+    SoundFont.INDEX = None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('SoundFont should not be parsed')
+    monkeypatch.setattr(SoundFont, 'parse_file', fail)
+
+    sf = SoundFont.by_id('mg.sf2')
+
+    assert sf.as_dict() == expected
+    assert sf.get_sound(1, 0).base_note == 50
+
+
+def test_changed_file_is_parsed_again(sound_dir):
+    SoundFont.load_all()
+    SoundFont.FILE_CACHE.clear()
+    shutil.copy(os.path.join(get_testdata_dir(), 'sounds/test.sf2'),
+                str(sound_dir.join('mg.sf2')))
+
+    sf = SoundFont.by_id('mg.sf2')
+
+    assert sf.as_dict() == SoundFont(str(sound_dir.join('mg.sf2'))).as_dict()
+
+
+def test_deleted_file_is_removed_from_index(sound_dir):
+    SoundFont.load_all()
+    sound_dir.join('mg.sf2').remove()
+
+    assert SoundFont.load_all() == []
+    assert SoundFont.get_index().entries == {}
+
+
+def test_refresh_reports_changes(sound_dir):
+    assert SoundFont.refresh('mg.sf2') == 'added'
+    assert SoundFont.refresh('mg.sf2') is None
+
+    shutil.copy(os.path.join(get_testdata_dir(), 'sounds/test.sf2'),
+                str(sound_dir.join('mg.sf2')))
+    os.utime(str(sound_dir.join('mg.sf2')), (0, 0))
+    assert SoundFont.refresh('mg.sf2') == 'changed'
+
+    sound_dir.join('mg.sf2').remove()
+    assert SoundFont.refresh('mg.sf2') == 'deleted'
+    assert SoundFont.refresh('mg.sf2') is None
+    assert SoundFont.get_index().entries == {}
+
+
+def test_watched_load_all_does_not_touch_filesystem(sound_dir, monkeypatch):
+    SoundFont.scan()
+    monkeypatch.setattr(SoundFont, 'WATCHED_DIR', settings.sound_dir)
+    sound_dir.join('mg.sf2').remove()
+
+    assert [sf.id for sf in SoundFont.load_all()] == ['mg.sf2']
+    assert SoundFont.by_id('mg.sf2') is not None
+
+
+def test_registry_lookup_does_not_touch_filesystem(sound_dir, monkeypatch):
+    sound = registry.get_sound('mg.sf2', 1, 0)
+    assert sound.base_note == 50
+    assert registry.get_sound('missing.sf2', 0, 0) is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError('Filesystem should not be accessed')
+    monkeypatch.setattr(os, 'stat', fail)
+
+    assert registry.get_sound('mg.sf2', 1, 0) is sound
+    assert registry.get_sound('mg.sf2', 99, 99) is None
+    assert registry.get_font('missing.sf2') is None
+
+
+def test_registry_is_invalidated_by_changes(sound_dir):
+    assert registry.get_font('new.sf2') is None
+    shutil.copy(os.path.join(get_testdata_dir(), 'sounds/test.sf2'),
+                str(sound_dir.join('new.sf2')))
+    SoundFont.refresh('new.sf2')
+    assert registry.get_font('new.sf2').id == 'new.sf2'
+
+    sound_dir.join('new.sf2').remove()
+    SoundFont.refresh('new.sf2')
+    assert registry.get_font('new.sf2') is None
+
+
+@pytest.mark.parametrize('presets', [
+    [(0, 0), (0, 5), (1, 0), (2, 3)],
+    [(2, 3), (0, 5), (1, 0), (0, 0)],
+])
+def test_preset_table_lookup(presets):
+    table = PresetTable(SoundFont())
+    for bank, program in presets:
+        table.append(bank, program, 'Sound {}:{}'.format(bank, program), 'generic', -1)
+
+    assert len(table) == 4
+    assert [(s.bank, s.program) for s in table] == presets
+    for bank, program in presets:
+        sound = table.get(bank, program)
+        assert (sound.bank, sound.program, sound.name) == (bank, program, 'Sound {}:{}'.format(bank, program))
+    assert table.get(0, 1) is None
+    assert table.get(3, 0) is None
+
+
+def read_testfile(name):
+    with open(os.path.join(get_testdata_dir(), 'sounds', name), 'rb') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1024])
+def test_stream_validator_accepts_soundfont(chunk_size):
+    data = read_testfile('mg.sf2')
+    validator = Sf2StreamValidator()
+    for pos in range(0, len(data), chunk_size):
+        validator.feed(data[pos:pos + chunk_size])
+    validator.finish()
+
+    assert validator.lists == [b'INFO', b'sdta', b'pdta']
+
+
+def test_stream_validator_rejects_other_files_early():
+    validator = Sf2StreamValidator()
+    with pytest.raises(RuntimeError):
+        validator.feed(b'RIFF\x00\x10\x00\x00WAVEfmt ')
+
+
+def test_stream_validator_rejects_truncated_file():
+    validator = Sf2StreamValidator()
+    validator.feed(read_testfile('mg.sf2')[:-10])
+    with pytest.raises(RuntimeError):
+        validator.finish()
+
+
+def test_stream_validator_resume(tmpdir):
+    data = read_testfile('mg.sf2')
+    part = tmpdir.join('mg.sf2.part')
+    part.write_binary(data[:500])
+
+    validator = Sf2StreamValidator()
+    with open(str(part), 'rb') as f:
+        validator.resume(f, 500)
+    validator.feed(data[500:])
+    validator.finish()
+
+
+def test_sample_sizes():
+    sf = SoundFont(os.path.join(get_testdata_dir(), 'sounds/test.sf2'))
+
+    # the preset only uses one of the two 60 point samples in the file
+    assert sf.get_sound(13, 37).sample_size == 120
+    assert sf.as_dict()['sounds'][0]['sample_size'] == 120
+
+
+def test_write_subset(tmpdir):
+    src = os.path.join(get_testdata_dir(), 'sounds/mg.sf2')
+    dest = str(tmpdir.join('subset.sf2'))
+
+    assert write_subset(src, dest, [(1, 0), (0, 0)]) == [(0, 0), (1, 0)]
+
+    sf = SoundFont(dest)
+    assert [(s.bank, s.program, s.name) for s in sf.sounds] == [
+        (0, 0, 'First Melody'), (1, 0, 'First Drone')]
+    assert sf.get_sound(0, 0).base_note == 60
+    assert sf.get_sound(1, 0).base_note == 50
+    assert sf.mode == 'midigurdy'
+    assert sf.filesize < os.path.getsize(src)
+
+    validator = Sf2StreamValidator()
+    with open(dest, 'rb') as f:
+        validator.feed(f.read())
+    validator.finish()
+
+
+def test_write_subset_drops_unused_samples(tmpdir):
+    src = os.path.join(get_testdata_dir(), 'sounds/test.sf2')
+    dest = str(tmpdir.join('subset.sf2'))
+
+    write_subset(src, dest, [(13, 37)])
+
+    sf = SoundFont(dest)
+    assert sf.get_sound(13, 37).sample_size == 120
+    assert sf.filesize < os.path.getsize(src)
+
+
+def test_write_subset_of_missing_presets(tmpdir):
+    src = os.path.join(get_testdata_dir(), 'sounds/mg.sf2')
+    dest = str(tmpdir.join('subset.sf2'))
+
+    with pytest.raises(RuntimeError):
+        write_subset(src, dest, [(99, 99)])
+    assert not os.path.exists(dest)
+
+
+def test_subsets_resolve(sound_dir):
+    assert subsets.resolve('mg.sf2', [(0, 0)]) == 'mg.sf2'
+
+    entry = subsets.create('mg.sf2', [(0, 0), (1, 0)])
+    path = os.path.join(settings.cache_dir, 'subsets', entry['filename'])
+
+    assert os.path.isfile(path)
+    assert subsets.resolve('mg.sf2', [(0, 0)]) == path
+    assert subsets.resolve('mg.sf2', [(0, 0), (2, 0)]) == 'mg.sf2'
+    assert subsets.source_id(path) == 'mg.sf2'
+    assert subsets.source_id('mg.sf2') == 'mg.sf2'
+
+
+def test_subsets_of_changed_soundfont_are_removed(sound_dir):
+    entry = subsets.create('mg.sf2', [(0, 0)])
+    path = os.path.join(settings.cache_dir, 'subsets', entry['filename'])
+    shutil.copy(os.path.join(get_testdata_dir(), 'sounds/test.sf2'),
+                str(sound_dir.join('mg.sf2')))
+    SoundFont.refresh('mg.sf2')
+
+    assert subsets.resolve('mg.sf2', [(0, 0)]) == 'mg.sf2'
+
+    subsets.prune()
+    assert not os.path.exists(path)
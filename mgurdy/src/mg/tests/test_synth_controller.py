@@ -6,6 +6,25 @@ from mg.tests.conf import settings
 from mg.controller import SynthController
 
 
+EFFECTS = {
+    'effects': [{
+        'name': 'sympa',
+        'library': '../../mg-effects/build/sympathetic.so',
+        'mix': True,
+        'links': {
+            'Input': 'Reverb:Send',
+            'Output Left': 'Main:L',
+            'Output Right': 'Main:R',
+        },
+        'controls': {
+            'Wet Left': 1.0,
+            'Wet Right': 1.0,
+        },
+    }],
+    'reverb': 'sympa',
+}
+
+
 @pytest.fixture
 def ctrl():
     fluid = FluidSynth(settings.sound_dir)
@@ -13,14 +32,11 @@ def ctrl():
         "audio.driver": "file",
         "synth.ladspa.active": 1,
         "synth.dynamic-sample-loading": 1,
+        "synth.midi-channels": 32,
     })
     fluid.start()
 
-    fluid.ladspa.add_effect('sympa', '../../mg-effects/build/sympathetic.so', mix=True)
-    fluid.ladspa.link_effect('sympa', 'Input', 'Reverb:Send')
-    fluid.ladspa.link_effect('sympa', 'Output Left', 'Main:L')
-    fluid.ladspa.link_effect('sympa', 'Output Right', 'Main:R')
-    fluid.ladspa.activate()
+    fluid.ladspa.apply(EFFECTS)
 
     yield SynthController(fluid, State(settings))
 
@@ -40,3 +56,39 @@ def ctrl():
 def test_synth_gain_changed(ctrl, name, kwargs):
     method = getattr(ctrl, name)
     method(**kwargs)
+
+
+def test_preset_change_switches_channel_bank(ctrl):
+    assert ctrl.channel_bank == 0
+
+    ctrl.configure_all_voices()
+    assert ctrl.channel_bank == 1
+
+    ctrl.configure_all_voices()
+    assert ctrl.channel_bank == 0
+
+
+def test_channel_bank_switch_clears_idle_bank(ctrl):
+    assert ctrl.channel_bank == 0
+    # a sound of the previous preset on the outgoing bank
+    ctrl.fluid.set_channel_sound(5, 'mg.sf2', 0, 0)
+
+    ctrl.configure_all_voices()
+    assert ctrl.channel_bank == 1
+    assert 5 not in ctrl.fluid.channels
+
+    # no longer in use, so the font has been trimmed from the cache
+    assert ctrl.fluid.font_cache_size == 0
+    assert 'mg.sf2' not in ctrl.fluid.get_loaded_fonts()
+
+
+def test_reverb_changes_do_not_rebuild_effects(ctrl):
+    ctrl.apply_effects()
+    ctrl.state.reverb_volume = 0
+    assert ctrl.fluid.ladspa.apply(ctrl.effect_graph(ctrl.fluid.ladspa.graph)) is False
+    assert ctrl.fluid.ladspa.graph['effects'][0]['mix_gain'] == 0.0
+    assert ctrl.fluid.ladspa.is_active()
+
+    ctrl.state.reverb_panning = 0
+    ctrl.apply_effects()
+    assert ctrl.fluid.ladspa.graph['effects'][0]['controls']['Wet Right'] == 0
@@ -0,0 +1,64 @@
+import pytest
+
+from mg.state import State
+from mg.telemetry import SynthTelemetry
+from mg.tests.conf import settings
+
+
+@pytest.fixture
+def telemetry(fluid):
+    telemetry = SynthTelemetry()
+    telemetry.setup(fluid, State(settings), size=3)
+    return telemetry
+
+
+def test_sample(telemetry):
+    fluid = telemetry.fluid
+    fluid.active_voices = 64
+    telemetry.sample()
+    fluid.cpu_load = 120.0
+    fluid.active_voices = 12
+    telemetry.sample()
+
+    samples = telemetry.get_samples()
+    assert [s['active_voices'] for s in samples] == [64, 12]
+    assert [s['voice_steals'] for s in samples] == [1, 0]
+    assert [s['xruns'] for s in samples] == [0, 1]
+
+    totals = telemetry.to_dict()['totals']
+    assert totals['voice_steals'] == 1
+    assert totals['xruns'] == 1
+    assert totals['max_cpu_load'] == 120.0
+    assert totals['max_active_voices'] == 64
+
+
+def test_voice_steals_follow_polyphony_changes(telemetry):
+    fluid = telemetry.fluid
+    fluid.active_voices = 48
+    telemetry.sample()
+    fluid.polyphony = 48
+    telemetry.sample()
+
+    samples = telemetry.get_samples()
+    assert [s['polyphony'] for s in samples] == [64, 48]
+    assert [s['voice_steals'] for s in samples] == [0, 1]
+    assert telemetry.to_dict()['polyphony'] == 48
+
+
+def test_ring_buffer_size(telemetry):
+    for voices in range(5):
+        telemetry.fluid.active_voices = voices
+        telemetry.sample()
+    samples = telemetry.get_samples()
+    assert [s['active_voices'] for s in samples] == [2, 3, 4]
+    assert telemetry.totals['samples'] == 5
+
+
+def test_get_samples_since(telemetry):
+    telemetry.sample()
+    last = telemetry.get_samples()[-1]['time']
+    assert telemetry.get_samples(since=last) == []
+
+    telemetry.reset()
+    assert telemetry.get_samples() == []
+    assert telemetry.totals['samples'] == 0
@@ -1,7 +1,7 @@
 from .base import PopupItem, ListPage, Deck, ConfigList, ValueListItem, BooleanListItem
 
 from mg.input import Action, Key
-from mg.utils import midi2percent, midi2note
+from mg.utils import midi2percent, midi2note, format_size
 from mg.ui.display import blit
 
 
@@ -177,7 +177,7 @@ class SoundPopupItem(PopupItem):
         cur_snd = (voice.soundfont_id, voice.bank, voice.program)
         if prev_snd != cur_snd:
             # Label creation cached to prevent unnessecary calls to
-            # VoiceState.get_sound() (which parses the SF2 file every time)
+            # VoiceState.get_sound()
             if voice.soundfont_id:
                 sound = voice.get_sound()
                 if sound:
@@ -261,7 +261,7 @@ class SoundListPage(ListPage):
     def item_label(self, item):
         snum, sf, sound = item
         if sound:
-            return '{} {}'.format(snum, sound.name)
+            return '{} {} ({})'.format(snum, sound.name, format_size(sound.sample_size))
         elif sf:
             return sf.name
         else:
@@ -403,7 +403,7 @@ class TreeSoundListPage(ListPage):
     def item_label(self, item):
         snum, sf, sound = item
         if sound:
-            return '{} {}'.format(snum, sound.name)
+            return '{} {} ({})'.format(snum, sound.name, format_size(sound.sample_size))
         elif sf:
             return sf.name
         else:
@@ -57,6 +57,21 @@ def scale(value, from_min, from_max, to_min, to_max):
     return to_min + (scaled * to_span)
 
 
+def format_size(size):
+    """
+    Format a number of bytes in a compact form for the display, e.g. 1.2M
+    """
+    for unit in ('B', 'K', 'M'):
+        if size < 1024:
+            break
+        size /= 1024
+    else:
+        unit = 'G'
+    if unit == 'B' or size >= 10:
+        return '{}{}'.format(int(round(size)), unit)
+    return '{:.1f}{}'.format(size, unit)
+
+
 def textdivide(text1, text2, width, split, ellipsis='', divider='/'):
     if split > width:
         split = width
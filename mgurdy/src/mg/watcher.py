@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+
+import prctl
+
+from mg.conf import settings
+from mg.inotify.api import INotify, lib
+from mg.sf2 import SoundFont, FILENAME_PATTERN
+from mg.signals import signals
+
+
+log = logging.getLogger('watcher')
+
+
+WATCH_MASK = (lib.IN_CLOSE_WRITE | lib.IN_MOVED_TO | lib.IN_MOVED_FROM |
+              lib.IN_DELETE | lib.IN_DELETE_SELF | lib.IN_MOVE_SELF | lib.IN_ONLYDIR)
+
+
+class SoundDirWatcher(threading.Thread):
+    """
+    Keeps the in-memory SoundFont cache in sync with the sound directory and
+    emits sound:added, sound:changed and sound:deleted signals for all changes,
+    including the ones not made through the web API (e.g. files copied over
+    ssh or via USB mass storage).
+
+    While the watcher is running, SoundFont.load_all() and SoundFont.by_id()
+    are served from memory without touching the filesystem.
+    """
+    def __init__(self, state):
+        super().__init__(name='mg-soundwatch')
+        self.daemon = True
+        self.state = state
+        self.sound_dir = settings.sound_dir
+        self.stopped = threading.Event()
+        self.inotify = INotify()
+
+        # add the watch before the initial scan, so that no change can
+        # fall between the two
+        self.inotify.add_watch(self.sound_dir, WATCH_MASK)
+        SoundFont.scan()
+        SoundFont.WATCHED_DIR = self.sound_dir
+
+    def run(self):
+        prctl.set_name(self.name)
+        try:
+            while not self.stopped.is_set():
+                for event in self.inotify.read(timeout=1):
+                    try:
+                        self.handle_event(event)
+                    except Exception:
+                        log.exception('Error handling event for {}'.format(event.name))
+        finally:
+            SoundFont.WATCHED_DIR = None
+            self.inotify.close()
+
+    def stop(self):
+        self.stopped.set()
+
+    def handle_event(self, event):
+        if event.mask & lib.IN_Q_OVERFLOW:
+            log.warning('Event queue overflow, rescanning {}'.format(self.sound_dir))
+            self.rescan()
+        elif event.mask & (lib.IN_DELETE_SELF | lib.IN_MOVE_SELF):
+            log.error('Sound directory {} has disappeared'.format(self.sound_dir))
+            self.stop()
+        elif event.name and FILENAME_PATTERN.search(event.name):
+            self.refresh(event.name)
+
+    def rescan(self):
+        filenames = set(f for f in os.listdir(self.sound_dir) if FILENAME_PATTERN.search(f))
+        with SoundFont.CACHE_LOCK:
+            filenames.update(sf.filename for sf in SoundFont.FILE_CACHE.values())
+        for filename in sorted(filenames):
+            self.refresh(filename)
+
+    def refresh(self, filename):
+        change = SoundFont.refresh(filename)
+        if change == 'added':
+            signals.emit('sound:added', {'id': filename})
+        elif change:
+            with self.state.lock('Loading...', goto_home=True):
+                signals.emit('sound:{}'.format(change), {'id': filename})